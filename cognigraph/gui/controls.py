@@ -145,6 +145,9 @@ class SourceControls(MyGroupParameter):
         ('File data',
          NodeControlClasses(source_nodes.FileSource,
                             source_controls.FileSourceControls)),
+        ('Recorded outputs',
+         NodeControlClasses(source_nodes.HDF5Source,
+                            source_controls.HDF5SourceControls)),
     ))
 
     SOURCE_TYPE_COMBO_NAME = 'Source type: '
@@ -182,8 +182,7 @@ class EnvelopeExtractorControls(ProcessorNodeControls):
 
     def _create_parameters(self):
 
-        method_values = ['Exponential smoothing']
-        # TODO: change once we support more methods
+        method_values = self.PROCESSOR_CLASS.SUPPORTED_METHODS
         method_value = self._processor_node.method
         methods_combo = parameterTypes.ListParameter(
             name=self.METHODS_COMBO_NAME, values=method_values,
@@ -198,8 +197,8 @@ class EnvelopeExtractorControls(ProcessorNodeControls):
         factor_spin_box.sigValueChanged.connect(self._on_factor_changed)
         self.factor_spin_box = self.addChild(factor_spin_box)
 
-    def _on_method_changed(self):
-        pass  # TODO: implement
+    def _on_method_changed(self, param, value):
+        self._processor_node.method = value
 
     def _on_factor_changed(self):
         pass  # TODO: implement
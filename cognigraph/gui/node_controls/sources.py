@@ -3,7 +3,7 @@ from PyQt5 import QtGui
 import pylsl
 
 from ...utils.pyqtgraph import MyGroupParameter
-from ...nodes.sources import LSLStreamSource, FileSource
+from ...nodes.sources import LSLStreamSource, FileSource, HDF5Source
 
 
 class SourceControls(MyGroupParameter):
@@ -118,3 +118,7 @@ class FileSourceControls(SourceControls):
 
     def _on_file_path_changed(self, param, value):
         self._pipeline.source.file_path = value
+
+
+class HDF5SourceControls(FileSourceControls):
+    SOURCE_CLASS = HDF5Source
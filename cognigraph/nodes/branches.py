@@ -0,0 +1,436 @@
+"""Nodes that run their subtree outside of the main update loop"""
+import os
+import tempfile
+import threading
+import traceback
+import multiprocessing
+from collections import deque
+
+import numpy as np
+
+from .node import Node, SourceNode, ProcessorNode
+from .. import TIME_AXIS
+from ..utils.matrix_functions import (make_time_dimension_second,
+                                      put_time_dimension_back_from_second)
+
+
+class ThreadedBranch(ProcessorNode):
+    """
+    Runs its subtree in a worker thread fed through a bounded queue.
+
+    Put the node between a fast part of the tree (e.g. the source) and a
+    heavy one: its update only copies the chunk into the queue and returns,
+    while the worker takes the chunks out one by one and updates the
+    children with each of them. The node is transparent otherwise:
+    its children see the output of its parent and the mne_info upstream.
+
+    Parameters
+    ----------
+    max_queue_size: int
+        Maximum number of chunks waiting to be processed
+    overflow_policy: str
+        What to do with a new chunk when the queue is full.
+        'block' waits until the worker frees a place, stalling the
+        update of the whole tree above.
+        'drop-oldest' throws away the oldest chunk in the queue.
+        'coalesce' appends the new chunk to the newest chunk in the queue
+        along the time axis, so that no data is lost but the worker gets
+        fewer, longer chunks.
+
+    Notes
+    -----
+    Resets coming from upstream are run under the same lock as the worker
+    updates. Attributes of the nodes in the branch should be changed under
+    the lock too::
+
+        with branch.lock:
+            beamformer.reg = 0.1
+
+    An exception raised in the worker by a node of the branch is raised
+    again by the next update of the branch.
+
+    """
+    UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ()
+    CHANGES_IN_THESE_REQUIRE_RESET = ('max_queue_size', 'overflow_policy')
+    SUPPORTED_OVERFLOW_POLICIES = ('block', 'drop-oldest', 'coalesce')
+    UPDATES_CHILDREN_ITSELF = True
+
+    # How often the worker checks whether it should stop, in seconds
+    WORKER_POLL_INTERVAL = 0.1
+
+    def __init__(self, max_queue_size=10, overflow_policy='drop-oldest'):
+        ProcessorNode.__init__(self)
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+
+        self.lock = threading.RLock()
+        self._queue = deque()
+        self._queue_changed = threading.Condition()
+        self._worker = None  # type: threading.Thread
+        self._should_stop = False
+
+        self.dropped_chunk_count = 0
+        self.coalesced_chunk_count = 0
+        self.error = None  # type: Exception
+
+    @property
+    def queue_size(self):
+        return len(self._queue)
+
+    def _initialize(self):
+        self._clear_queue()
+        self.error = None
+        if self._worker is None or not self._worker.is_alive():
+            self._should_stop = False
+            self._worker = threading.Thread(
+                target=self._work, name='{} worker'.format(self), daemon=True)
+            self._worker.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the worker thread once it has processed the queued chunks;
+        initialize starts it again
+
+        """
+        with self._queue_changed:
+            self._should_stop = True
+            self._queue_changed.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def update_self(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        if self.disabled is True:
+            # Pass the chunk through and update the subtree in the calling
+            # thread as a plain node would. Chunks still queued are dropped
+            # so that the children do not get them out of order.
+            self._clear_queue()
+            ProcessorNode.update_self(self)
+            with self.lock:
+                for child in self._children:
+                    child.update()
+            return
+        chunk = self.parent.output
+        if chunk is None or chunk.size == 0:
+            return
+        # The parent may reuse its output buffer on the next update
+        self._put((np.array(chunk, copy=True), self.parent.timestamps,
+                   self.parent.sample_indices))
+
+    def _update(self):
+        pass
+
+    def _put(self, item):
+        """Queue (chunk, timestamps, sample_indices) tuple"""
+        with self._queue_changed:
+            if len(self._queue) >= self.max_queue_size:
+                if self.overflow_policy == 'block':
+                    while (len(self._queue) >= self.max_queue_size and
+                           not self._should_stop):
+                        self._queue_changed.wait(self.WORKER_POLL_INTERVAL)
+                elif self.overflow_policy == 'drop-oldest':
+                    self._queue.popleft()
+                    self.dropped_chunk_count += 1
+                elif self.overflow_policy == 'coalesce':
+                    self._queue[-1] = self._concatenate(self._queue[-1], item)
+                    self.coalesced_chunk_count += 1
+                    return
+            self._queue.append(item)
+            self._queue_changed.notify_all()
+
+    @staticmethod
+    def _concatenate(older_item, newer_item):
+        chunk = np.concatenate((older_item[0], newer_item[0]), axis=TIME_AXIS)
+        if older_item[1] is None or newer_item[1] is None:
+            return chunk, None, None
+        return (chunk, np.concatenate((older_item[1], newer_item[1])),
+                np.concatenate((older_item[2], newer_item[2])))
+
+    def _get(self):
+        """
+        Next queued item or None if the worker should stop and the queue
+        is empty
+
+        """
+        with self._queue_changed:
+            while not self._queue and not self._should_stop:
+                self._queue_changed.wait(self.WORKER_POLL_INTERVAL)
+            if not self._queue:
+                return None
+            item = self._queue.popleft()
+            self._queue_changed.notify_all()
+            return item
+
+    def _clear_queue(self):
+        with self._queue_changed:
+            self._queue.clear()
+            self._queue_changed.notify_all()
+
+    def _work(self):
+        while True:
+            item = self._get()
+            if item is None:
+                return
+            with self.lock:
+                try:
+                    self.output, self.timestamps, self.sample_indices = item
+                    for child in self._children:
+                        child.update()
+                except Exception as e:
+                    self.error = e
+                    self.logger.exception(
+                        'Error while updating the branch')
+
+    def reset(self, is_input_hist_invalid, is_local_attr_changed=False):
+        with self.lock:
+            Node.reset(self, is_input_hist_invalid, is_local_attr_changed)
+
+    def _reset(self):
+        self._clear_queue()
+        output_history_is_no_longer_valid = False
+        return output_history_is_no_longer_valid
+
+    def _on_input_history_invalidation(self):
+        # Queued chunks are continuous with the invalid history
+        self._clear_queue()
+
+    def _check_value(self, key, value):
+        if key == 'overflow_policy':
+            if value not in self.SUPPORTED_OVERFLOW_POLICIES:
+                raise ValueError(
+                    'Overflow policy {} is not supported.'.format(value) +
+                    ' Use one of: {}'.format(
+                        self.SUPPORTED_OVERFLOW_POLICIES))
+
+        if key == 'max_queue_size':
+            if value < 1:
+                raise ValueError('max_queue_size must be a positive integer')
+
+
+def _create_shared_buffer(shape):
+    """
+    Array backed by a file in shared memory (if there is /dev/shm)
+    that other processes can open by its path
+
+    """
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else None
+    file_descriptor, path = tempfile.mkstemp(
+        prefix='cognigraph_', suffix='.buffer', dir=directory)
+    os.close(file_descriptor)
+    return np.memmap(path, dtype=np.float64, mode='w+', shape=shape), path
+
+
+def _open_shared_buffer(path, shape):
+    return np.memmap(path, dtype=np.float64, mode='r+', shape=shape)
+
+
+class _SharedBufferSource(SourceNode):
+    """Stand-in for the upstream of a ProcessBranch in the branch process"""
+    CHANGES_IN_THESE_REQUIRE_RESET = ()
+    # Branches of source-space nodes get misc channels
+    SENSOR_CHANNEL_TYPES_REQUIRED = False
+
+    def __init__(self, mne_info, buffer):
+        SourceNode.__init__(self)
+        self._mne_info = mne_info
+        self._buffer = buffer
+        self.samples_in_chunk = 0
+
+    def _initialize(self):
+        self.mne_info = self._mne_info
+
+    def _update(self):
+        self.output = put_time_dimension_back_from_second(
+            self._buffer[:, :self.samples_in_chunk])
+
+    def _check_value(self, key, value):
+        pass
+
+    def _on_input_history_invalidation(self):
+        pass
+
+
+def _run_branch_process(subtree_factory, mne_info, input_path, input_shape,
+                        connection, export_attributes):
+    """Main function of the ProcessBranch process"""
+    output_path = None
+    try:
+        input_buffer = _open_shared_buffer(input_path, input_shape)
+        source = _SharedBufferSource(mne_info, input_buffer)
+        nodes = subtree_factory()
+        nodes[0].parent = source
+        for previous_node, node in zip(nodes, nodes[1:]):
+            if node.parent is None:
+                node.parent = previous_node
+        last_node = nodes[-1]
+        source.chain_initialize()
+
+        output_mne_info = (getattr(last_node, 'mne_info', None) or
+                           last_node.traverse_back_and_find('mne_info'))
+        output_shape = (output_mne_info['nchan'], input_shape[1])
+        output_buffer, output_path = _create_shared_buffer(output_shape)
+        connection.send(('ready', output_mne_info, output_path, output_shape,
+                         _get_attributes(last_node, export_attributes)))
+
+        while True:
+            message = connection.recv()
+            if message[0] == 'chunk':
+                source.samples_in_chunk = message[1]
+                source.update()
+                output = last_node.output
+                if output is None:
+                    samples_in_output = 0
+                else:
+                    output = make_time_dimension_second(output)
+                    samples_in_output = output.shape[1]
+                    output_buffer[:, :samples_in_output] = output
+                connection.send(('done', samples_in_output,
+                                 _get_attributes(last_node,
+                                                 export_attributes)))
+            elif message[0] == 'invalidate':
+                for node in nodes:
+                    node._on_input_history_invalidation()
+                connection.send(('done', ))
+            elif message[0] == 'stop':
+                return
+    except Exception:
+        connection.send(('error', traceback.format_exc()))
+    finally:
+        if output_path is not None:
+            os.remove(output_path)
+
+
+def _get_attributes(node, names):
+    return {name: getattr(node, name) for name in names}
+
+
+class ProcessBranch(ProcessorNode):
+    """
+    Runs a chain of processors in a separate process.
+
+    The processors are created in that process by subtree_factory which
+    must return a list of new nodes; the first one gets attached to a
+    stand-in for this node's parent and the output of the last one
+    becomes the output of this node. Chunks travel both ways through
+    arrays in shared memory; only short control messages are pickled.
+
+    update blocks until the chunk has been processed. To let the rest
+    of the tree run in the meantime, put the ProcessBranch under a
+    ThreadedBranch: its worker thread waits for the process with the GIL
+    released.
+
+    Parameters
+    ----------
+    subtree_factory: callable
+        Picklable (i.e. defined at the module level) function with no
+        arguments returning a list of nodes. Nodes without a parent are
+        attached to the previous node in the list.
+    max_samples_in_chunk: int
+        Size of the shared buffers; longer chunks are sent in pieces
+    export_attributes: tuple of str
+        Attributes of the last node to copy to self.exported_state after
+        initialization and after each chunk. Their values are pickled,
+        so they should be small.
+    timeout: float
+        Seconds to wait for the process to initialize or answer
+
+    """
+    UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ('mne_info', )
+    CHANGES_IN_THESE_REQUIRE_RESET = ('subtree_factory',
+                                      'max_samples_in_chunk',
+                                      'export_attributes')
+    SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {
+        'mne_info': lambda info: (info['sfreq'], tuple(info['ch_names']))}
+
+    def __init__(self, subtree_factory, max_samples_in_chunk=1024,
+                 export_attributes=(), timeout=60):
+        ProcessorNode.__init__(self)
+        self.subtree_factory = subtree_factory
+        self.max_samples_in_chunk = max_samples_in_chunk
+        self.export_attributes = export_attributes
+        self.timeout = timeout
+
+        self.mne_info = None
+        self.exported_state = {}
+        self._process = None  # type: multiprocessing.Process
+        self._connection = None
+        self._input_buffer = None  # type: np.memmap
+        self._input_path = None  # type: str
+        self._output_buffer = None  # type: np.memmap
+
+    def _initialize(self):
+        self.stop()
+        mne_info = self.traverse_back_and_find('mne_info')
+
+        input_shape = (mne_info['nchan'], self.max_samples_in_chunk)
+        self._input_buffer, self._input_path = _create_shared_buffer(
+            input_shape)
+        # Spawning does not copy the threads and Qt state of this process
+        context = multiprocessing.get_context('spawn')
+        self._connection, child_connection = context.Pipe()
+        self._process = context.Process(
+            target=_run_branch_process, name='{} process'.format(self),
+            args=(self.subtree_factory, mne_info, self._input_path,
+                  input_shape, child_connection, self.export_attributes),
+            daemon=True)
+        self._process.start()
+
+        (self.mne_info, output_path, output_shape,
+         self.exported_state) = self._receive('ready')
+        self._output_buffer = _open_shared_buffer(output_path, output_shape)
+
+    def _update(self):
+        input_array = make_time_dimension_second(self.parent.output)
+        outputs = []
+        for start in range(0, input_array.shape[1],
+                           self.max_samples_in_chunk):
+            piece = input_array[:, start: start + self.max_samples_in_chunk]
+            self._input_buffer[:, :piece.shape[1]] = piece
+            self._connection.send(('chunk', piece.shape[1]))
+            samples_in_output, self.exported_state = self._receive('done')
+            # Copy since the buffer is overwritten by the next chunk
+            outputs.append(np.array(
+                self._output_buffer[:, :samples_in_output]))
+        self.output = put_time_dimension_back_from_second(
+            np.concatenate(outputs, axis=1))
+
+    def _receive(self, expected):
+        if not self._connection.poll(self.timeout):
+            raise RuntimeError('{} process did not answer in {} s'.format(
+                self, self.timeout))
+        message = self._connection.recv()
+        if message[0] == 'error':
+            raise RuntimeError(
+                'Error in the {} process:\n{}'.format(self, message[1]))
+        assert message[0] == expected
+        return message[1:]
+
+    def stop(self):
+        """Stop the process and free the shared buffers"""
+        if self._process is not None:
+            if self._process.is_alive():
+                self._connection.send(('stop', ))
+                self._process.join(self.timeout)
+            self._process = None
+        if self._input_path is not None:
+            os.remove(self._input_path)
+            self._input_path = None
+
+    def _reset(self):
+        self._should_reinitialize = True
+        self.initialize()
+        output_history_is_no_longer_valid = True
+        return output_history_is_no_longer_valid
+
+    def _on_input_history_invalidation(self):
+        if self._process is not None:
+            self._connection.send(('invalidate', ))
+            self._receive('done')
+
+    def _check_value(self, key, value):
+        if key == 'max_samples_in_chunk':
+            if value < 1:
+                raise ValueError(
+                    'max_samples_in_chunk must be a positive integer')
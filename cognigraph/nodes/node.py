@@ -5,7 +5,9 @@ from contextlib import contextmanager
 import numpy as np
 from mne.io.pick import channel_type
 
+from .. import TIME_AXIS
 from ..utils.misc import class_name_of
+from ..utils.latency import LatencyTracker, local_clock, match_chunk_times
 import logging
 
 from PyQt5.QtCore import pyqtSignal, QObject, pyqtSlot
@@ -77,6 +79,10 @@ class Node(object):
 
     SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = dict()
 
+    # Nodes that update their children on their own (e.g. in another thread)
+    # set this to True so that neither update nor PipelineRunner do it
+    UPDATES_CHILDREN_ITSELF = False
+
     def __init__(self):
         self.initialized = False
 
@@ -85,6 +91,18 @@ class Node(object):
         self._root = self
         self.output = None  # type: np.ndarray
 
+        # Chunk metadata: per-sample acquisition times in local_clock()
+        # seconds and indices of the samples since the source started
+        self.timestamps = None  # type: np.ndarray
+        self.sample_indices = None  # type: np.ndarray
+        # When the last update started and finished, in local_clock() seconds
+        self.enter_time = None  # type: float
+        self.exit_time = None  # type: float
+        # 'update': from acquisition of the newest sample to the exit time;
+        # 'processing': from the enter time to the exit time
+        self.latency_trackers = {'update': LatencyTracker(),
+                                 'processing': LatencyTracker()}
+
         self._saved_from_upstream = None  # type: dict
         self.logger = logging.getLogger(type(self).__name__)
 
@@ -126,20 +144,56 @@ class Node(object):
         """
         raise NotImplementedError('_initialize should be implemented')
 
+    def stop(self):
+        """
+        Release the threads, processes and files the node holds.
+        Called when the pipeline stops running; initialize acquires them
+        again. Does nothing by default.
+
+        """
+        pass
+
     def update(self) -> None:
-        t1 = time.time()
-        self.output = None  # Reset output in case update does not succeed
+        """Update this node and then the whole subtree below it"""
+        self.update_self()
+        if not self.UPDATES_CHILDREN_ITSELF:
+            for child in self._children:
+                child.update()
+
+    def update_self(self) -> None:
+        """Update this node only; children are left to the caller"""
+        t1 = self.enter_time = local_clock()
+        # Reset output in case update does not succeed
+        self.output = self.timestamps = self.sample_indices = None
         self._update()
+        self._set_chunk_times()
 
-        t2 = time.time()
+        t2 = self.exit_time = local_clock()
+        self.latency_trackers['processing'].add(t2 - t1)
+        if self.timestamps is not None and len(self.timestamps) > 0:
+            self.latency_trackers['update'].add(t2 - self.timestamps[-1])
         self.logger.debug('Updated in {:.1f} ms'.format((t2 - t1) * 1000))
 
-        for child in self._children:
-            child.update()
-
     def _update(self):
         raise NotImplementedError('_update should be implemented')
 
+    def _set_chunk_times(self):
+        """
+        Set timestamps and sample_indices if _update has not.
+        By default they are taken from the parent and stretched
+        onto the output if the number of samples has changed.
+
+        """
+        if self.timestamps is not None:
+            return
+        timestamps = self.parent.timestamps
+        sample_indices = self.parent.sample_indices
+        if timestamps is None or self.output is None:
+            self.timestamps, self.sample_indices = timestamps, sample_indices
+        else:
+            self.timestamps, self.sample_indices = match_chunk_times(
+                timestamps, sample_indices, self.output.shape[TIME_AXIS])
+
     def reset(self, is_input_hist_invalid, is_local_attr_changed=False):
         """Take care of reinitialization and parameters reset"""
         if self._is_critical_upstream_change():
@@ -171,6 +225,24 @@ class Node(object):
         """
         raise NotImplementedError('_reset should be implemented')
 
+    def _get_state(self) -> dict:
+        """
+        What the node has learnt from its input so far (statistics, filter
+        states, ...) as a dict of numpy arrays and numbers. Pipeline.save_state
+        collects these so that a restarted pipeline can skip the warm-up.
+        Nodes without such state return an empty dict.
+
+        """
+        return dict()
+
+    def _set_state(self, state: dict):
+        """
+        Restore what _get_state returned. Called on an initialized node with
+        the same parameters and upstream as the one the state was taken from.
+
+        """
+        pass
+
     def add_child(self, child, initialize=False):
         """Add child node to nodes tree"""
         child.parent = self
@@ -312,14 +384,20 @@ class SourceNode(Node):
 
     # There is no 'upstream' for the sources
     UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ()
+    # Sources that can output source-space data set this to False
+    SENSOR_CHANNEL_TYPES_REQUIRED = True
 
     def __init__(self):
         Node.__init__(self)
         self.mne_info = None  # type: mne.Info
         self.reciever = Reciever(self)
+        # Sources that can run out of data set this to False when they do
+        self.is_alive = True
+        self._samples_produced = 0
 
     def initialize(self):
         self.mne_info = None
+        self._samples_produced = 0
         Node.initialize(self)
         try:
             self._check_mne_info()
@@ -343,7 +421,8 @@ class SourceNode(Node):
         channel_types = {
             channel_type(self.mne_info, i) for i in np.arange(channel_count)}
         required_channel_types = {'grad', 'mag', 'eeg'}
-        if len(channel_types.intersection(required_channel_types)) == 0:
+        if (self.SENSOR_CHANNEL_TYPES_REQUIRED and
+                len(channel_types.intersection(required_channel_types)) == 0):
             raise ValueError('{} has no channels of types {}'.format(
                 class_name, required_channel_types) + error_hint)
 
@@ -354,6 +433,23 @@ class SourceNode(Node):
                                  'self-consistent'.format(class_name_of(self)))
             raise Exception(exception_message) from e
 
+    def _set_chunk_times(self):
+        """
+        Number the samples and, if _update has not set the timestamps,
+        assume the newest sample has just been acquired
+
+        """
+        if self.output is None:
+            return
+        n_samples = self.output.shape[TIME_AXIS]
+        if self.sample_indices is None:
+            self.sample_indices = np.arange(
+                self._samples_produced, self._samples_produced + n_samples)
+        self._samples_produced += n_samples
+        if self.timestamps is None:
+            self.timestamps = self.enter_time - (
+                np.arange(n_samples)[::-1] / self.mne_info['sfreq'])
+
     def _reset(self):
         # There is nothing to reset. Just go ahead and initialize
         self._should_reinitialize = True
@@ -362,8 +458,8 @@ class SourceNode(Node):
         return is_output_hist_invalid
 
     def _on_input_history_invalidation(self):
-        raise NotImplementedError
-        # super()._on_input_history_invalidation()
+        # Sources have no input history, so there is nothing to forget
+        pass
 
     def _remap(self, montage_mapping):
         mne.rename_channels(self.mne_info, montage_mapping)
@@ -393,16 +489,18 @@ class ProcessorNode(Node):
         self.sender = Communicate()
         self.sender = Communicate()
 
-    def update(self):
+    def update_self(self):
         if self.disabled is True:
             self.output = self.parent.output
+            self.timestamps = self.parent.timestamps
+            self.sample_indices = self.parent.sample_indices
             return
         if (self.parent.output is None or
                 self.parent.output.size == 0):
-            self.output = None
+            self.output = self.timestamps = self.sample_indices = None
             return
         else:
-            Node.update(self)
+            Node.update_self(self)
 
 
 class OutputNode(Node):
@@ -412,9 +510,9 @@ class OutputNode(Node):
     Now handles empty inputs.
 
     """
-    def update(self):
+    def update_self(self):
         if (self.parent.output is None or
                 self.parent.output.size == 0):
             return
         else:
-            Node.update(self)
+            Node.update_self(self)
@@ -1,5 +1,8 @@
 import os
 import time
+import queue
+import threading
+from collections import deque
 from types import SimpleNamespace
 
 import tables
@@ -14,10 +17,11 @@ from ..utils.pysurfer.smoothing_matrix import smoothing_matrix, mesh_edges
 from .node import OutputNode
 from .. import CHANNEL_AXIS, TIME_AXIS, PYNFB_TIME_AXIS
 from ..utils.lsl import (convert_numpy_format_to_lsl,
-                         convert_numpy_array_to_lsl_chunk,
-                         create_lsl_outlet)
+                         copy_numpy_array_to_lsl_buffer,
+                         create_lsl_outlet, NUMERIC_LSL_FORMATS_TO_NUMPY)
 from ..utils.matrix_functions import last_sample, make_time_dimension_second
 from ..utils.ring_buffer import RingBuffer
+from ..utils.latency import LatencyTracker, local_clock
 from ..utils.channels import read_channel_types, channel_labels_saver
 from ..utils.inverse_model import get_mesh_data_from_forward_solution
 from ..utils.brain_visualization import get_mesh_data_from_surfaces_dir
@@ -99,11 +103,15 @@ class LSLStreamOutput(OutputNode):
         self._should_reinitialize = True
         self.initialize()
 
+    # Initial length of the push buffer; it grows to fit longer chunks
+    BUFFER_SAMPLE_COUNT = 1024
+
     def __init__(self, stream_name=None):
         super().__init__()
         self._provided_stream_name = stream_name
         self.stream_name = None
         self._outlet = None
+        self._buffer = None  # type: np.ndarray
 
     def _initialize(self):
         # If no name was supplied we will use a modified
@@ -124,11 +132,24 @@ class LSLStreamOutput(OutputNode):
             name=self.stream_name, frequency=frequency,
             channel_format=channel_format, channel_labels=channel_labels,
             channel_types=channel_types)
+        # Chunks are copied to a time-major buffer of the outlet dtype that
+        # liblsl reads directly instead of being converted to python lists
+        self._buffer = np.empty(
+            (self.BUFFER_SAMPLE_COUNT, len(channel_labels)),
+            dtype=NUMERIC_LSL_FORMATS_TO_NUMPY[channel_format])
 
     def _update(self):
         chunk = self.parent.output
-        lsl_chunk = convert_numpy_array_to_lsl_chunk(chunk)
-        self._outlet.push_chunk(lsl_chunk)
+        sample_count = chunk.shape[TIME_AXIS]
+        if sample_count > self._buffer.shape[0]:
+            self._buffer = np.empty((sample_count, self._buffer.shape[1]),
+                                    dtype=self._buffer.dtype)
+        lsl_chunk = copy_numpy_array_to_lsl_buffer(chunk, self._buffer)
+        # Stamp the chunk with the acquisition time of its newest sample
+        # (0.0 makes LSL use the current time)
+        timestamps = self.parent.timestamps
+        timestamp = timestamps[-1] if timestamps is not None else 0.0
+        self._outlet.push_chunk(lsl_chunk, timestamp=timestamp)
 
 
 class BrainViewer(WidgetOutput):
@@ -171,6 +192,11 @@ class BrainViewer(WidgetOutput):
         self.signal_sender.screenshot_sig.connect(self._append_screenshot)
         # ------------------------------ #
 
+        # From acquisition of the newest sample of a chunk to its drawing.
+        # Acquisition times of the chunks emitted but not drawn yet:
+        self.latency_trackers['draw'] = LatencyTracker()
+        self._timestamps_to_draw = deque()
+
     def _initialize(self):
         mne_forward_model_file_path = self.traverse_back_and_find(
             'mne_forward_model_file_path')
@@ -211,6 +237,9 @@ class BrainViewer(WidgetOutput):
             sources = np.abs(sources)
         self._update_colormap_limits(sources)
         normalized_sources = self._normalize_sources(last_sample(sources))
+        timestamps = self.parent.timestamps
+        self._timestamps_to_draw.append(
+            timestamps[-1] if timestamps is not None else None)
         self.signal_sender.draw_sig.emit(normalized_sources)
 
         if self.is_recording:
@@ -261,6 +290,10 @@ class BrainViewer(WidgetOutput):
                                        to_overlay=1)
 
         self.mesh_data.update()
+        if self._timestamps_to_draw:
+            timestamp = self._timestamps_to_draw.popleft()
+            if timestamp is not None:
+                self.latency_trackers['draw'].add(local_clock() - timestamp)
         if self.logger.getEffectiveLevel() == 20:  # INFO level
             self.canvas.measure_fps(
                 window=10,
@@ -390,44 +423,179 @@ class SignalViewer(WidgetOutput):
 
 
 class FileOutput(OutputNode):
-
-    CHANGES_IN_THESE_REQUIRE_RESET = ('stream_name', )
+    """
+    Records the output of its parent to an HDF5 file that HDF5Source can
+    play back.
+
+    Chunks are put into a bounded queue and written by a background
+    thread, so that disk I/O does not hold up the pipeline unless the
+    writer falls more than max_queue_size chunks behind. In that case
+    update waits for a place in the queue: no data is dropped. backlog is
+    the number of chunks waiting to be written.
+
+    Parameters
+    ----------
+    output_fname: str
+    dtype: str
+        One of SUPPORTED_DTYPES. float32 halves the size of the file.
+    compression_level: int
+        Blosc compression level from 0 (no compression) to 9
+    max_queue_size: int
+        Maximum number of chunks waiting to be written
+    flush_interval: float
+        How often the file is flushed to disk, in seconds
+
+    """
+    CHANGES_IN_THESE_REQUIRE_RESET = ('output_fname', 'dtype',
+                                      'compression_level', 'max_queue_size')
 
     UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ('mne_info', )
     SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {'mne_info':
                                            lambda info: (info['sfreq'], ) +
                                            channel_labels_saver(info)}
 
+    SUPPORTED_DTYPES = ('float32', 'float64')
+    # HDF5 chunks of about this size are both fast to compress and to read
+    TARGET_CHUNK_BYTES = 2 ** 20
+    # How often a blocked update checks whether the writer has failed
+    QUEUE_POLL_INTERVAL = 0.1
+
     def _on_input_history_invalidation(self):
         pass
 
     def _check_value(self, key, value):
-        pass  # TODO: check that value as a string usable as a stream name
+        if key == 'dtype':
+            if value not in self.SUPPORTED_DTYPES:
+                raise ValueError(
+                    'dtype {} is not supported.'.format(value) +
+                    ' Use one of: {}'.format(self.SUPPORTED_DTYPES))
+
+        if key == 'compression_level':
+            if value not in range(10):
+                raise ValueError('compression_level must be from 0 to 9')
+
+        if key == 'max_queue_size':
+            if value < 1:
+                raise ValueError('max_queue_size must be a positive integer')
+
+        if key == 'flush_interval':
+            if value <= 0:
+                raise ValueError('flush_interval must be positive')
 
     def _reset(self):
         self._should_reinitialize = True
         self.initialize()
 
-    def __init__(self, output_fname='output.h5'):
+    def __init__(self, output_fname='output.h5', dtype='float32',
+                 compression_level=5, max_queue_size=100, flush_interval=1):
         super().__init__()
         self.output_fname = output_fname
+        self.dtype = dtype
+        self.compression_level = compression_level
+        self.max_queue_size = max_queue_size
+        self.flush_interval = flush_interval
         self.out_file = None
+        self.output_array = None  # type: tables.EArray
+        self.error = None  # type: Exception
+
+        self._queue = None  # type: queue.Queue
+        self._writer = None  # type: threading.Thread
+        self._reported_falling_behind = False
+
+    @property
+    def backlog(self):
+        """Number of chunks waiting to be written"""
+        return 0 if self._queue is None else self._queue.qsize()
 
     def _initialize(self):
-        if self.out_file:  # for resets
-            self.out_file.close()
+        self.stop()  # for resets
 
         info = self.traverse_back_and_find('mne_info')
         col_size = info['nchan']
         self.out_file = tables.open_file(self.output_fname, mode='w')
-        atom = tables.Float64Atom()
+        atom = tables.Atom.from_dtype(np.dtype(self.dtype))
+        if self.compression_level > 0:
+            filters = tables.Filters(complevel=self.compression_level,
+                                     complib='blosc', shuffle=True)
+        else:
+            filters = None
+        # Chunks span all the channels as HDF5Source reads time slices
+        samples_in_hdf5_chunk = max(
+            self.TARGET_CHUNK_BYTES // (col_size * atom.itemsize), 1)
 
         self.output_array = self.out_file.create_earray(
-            self.out_file.root, 'data', atom, (col_size, 0))
+            self.out_file.root, 'data', atom, (col_size, 0),
+            filters=filters, chunkshape=(col_size, samples_in_hdf5_chunk))
+        # HDF5Source assembles mne_info from these. Labels are stored as
+        # arrays: attributes are limited to 64 KiB, which the labels of
+        # a source space exceed
+        for name, labels in (('ch_names', info['ch_names']),
+                             ('ch_types', read_channel_types(info))):
+            self.out_file.create_array(
+                self.out_file.root, name,
+                np.array([label.encode('utf-8') for label in labels],
+                         dtype='S'))
+        self.output_array.attrs.sfreq = info['sfreq']
+
+        self.error = None
+        self._reported_falling_behind = False
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._writer = threading.Thread(
+            target=self._write, args=(self._queue, self.output_array),
+            name='{} writer'.format(self), daemon=True)
+        self._writer.start()
+
+    def stop(self, timeout=None):
+        """Write the queued chunks and close the file"""
+        if self._writer is not None:
+            if self._writer.is_alive():
+                self._queue.put(None)
+            self._writer.join(timeout)
+            self._writer = None
+        if self.out_file is not None:
+            self.out_file.close()
+            self.out_file = None
 
     def _update(self):
-        chunk = self.parent.output
-        self.output_array.append(chunk)
+        if self.error is not None:
+            raise self.error
+        if self._queue.full() and not self._reported_falling_behind:
+            self.logger.warning(
+                'Writing to {} falls behind: '.format(self.output_fname) +
+                'waiting for the writer to free a place in the queue')
+            self._reported_falling_behind = True
+        # Converting makes a copy, so the parent is free to reuse its output
+        chunk = np.array(make_time_dimension_second(self.parent.output),
+                         dtype=self.dtype)
+        while True:
+            try:
+                self._queue.put(chunk, timeout=self.QUEUE_POLL_INTERVAL)
+                return
+            except queue.Full:
+                # The writer will never free a place if it has failed
+                if self.error is not None:
+                    raise self.error
+
+    def _write(self, chunk_queue, output_array):
+        time_of_the_last_flush = time.time()
+        try:
+            while True:
+                try:
+                    chunk = chunk_queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    pass
+                else:
+                    if chunk is None:
+                        break
+                    output_array.append(chunk)
+                if time.time() - time_of_the_last_flush >= self.flush_interval:
+                    output_array.flush()
+                    time_of_the_last_flush = time.time()
+            output_array.flush()
+        except Exception as e:
+            self.error = e
+            self.logger.exception(
+                'Error while writing to {}'.format(self.output_fname))
 
 
 class TorchOutput(OutputNode):
@@ -1,46 +1,85 @@
 import time
-import scipy as sc
+from concurrent.futures import ThreadPoolExecutor
 
 import math
+from fractions import Fraction
 
 from vendor.nfb.pynfb.protocols.ssd.topomap_selector_ica import ICADialog
 
 import numpy as np
 import mne
 from numpy.linalg import svd
-from scipy.optimize import linprog
 from sklearn.preprocessing import normalize
 from mne.preprocessing import find_outliers
 from mne.minimum_norm import apply_inverse_raw  # , make_inverse_operator
 from mne.minimum_norm import make_inverse_operator as mne_make_inverse_operator
 from mne.minimum_norm import prepare_inverse_operator
-from mne.beamformer import apply_lcmv_raw
-from ..utils.make_lcmv import make_lcmv
+from ..utils.make_lcmv import (make_lcmv, compute_lcmv_weights,
+                               prepare_lcmv_input)
 
 from .node import ProcessorNode
 from ..utils.matrix_functions import (make_time_dimension_second,
-                                      put_time_dimension_back_from_second)
+                                      put_time_dimension_back_from_second,
+                                      get_a_subset_of_channels,
+                                      woodbury_update)
 from ..utils.inverse_model import (get_default_forward_file,
                                    get_clean_forward,
                                    make_inverse_operator,
-                                   get_mesh_data_from_forward_solution)
+                                   get_mesh_data_from_forward_solution,
+                                   get_inverse_kernel,
+                                   apply_inverse_kernel)
 
+from ..utils.mce import MCESolver
+from ..utils.channel_quality import ChannelQualityTracker
 from ..utils.pynfb import (pynfb_ndarray_function_wrapper,
-                           ExponentialMatrixSmoother)
-from ..utils.channels import channel_labels_saver
-from ..utils.aux_tools import nostdout
+                           get_filter_state, set_filter_state,
+                           ExponentialMatrixSmoother,
+                           StreamingResampler,
+                           SOSFilterBank,
+                           StreamingHilbert)
+from ..utils.channels import (channel_labels_saver,
+                              channel_labels_and_sfreq_saver,
+                              read_channel_types)
 from .. import TIME_AXIS
 from vendor.nfb.pynfb.signal_processing import filters
 
 
 class Preprocessing(ProcessorNode):
+    """
+    Bad channels detection and optional downsampling
+
+    Parameters
+    ----------
+    collect_for_x_seconds: int
+        Duration of the data used to find bad channels initially
+    track_bad_channels: bool
+        If True, quality of the EEG channels is tracked continuously
+        with ChannelQualityTracker over a window of
+        bad_channels_window_seconds and the channels it flags are put
+        into mne_info['bads']. Downstream nodes compare bads with what
+        they saw last time and rebuild their operators in the background
+        instead of being reinitialized.
+    bad_channels_window_seconds: float
+        Duration of the window used for tracking channel quality
+    dsamp_freq: float | None
+        If lower than the input sampling frequency, the data is
+        resampled to it with a streaming polyphase filter and mne_info
+        with the new sfreq is passed downstream. The actual frequency
+        is the closest one that is a rational fraction of the input
+        frequency with a denominator no greater than 1000.
+
+    """
     CHANGES_IN_THESE_REQUIRE_RESET = ('collect_for_x_seconds', )
     UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ('mne_info', )
-    SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {'mne_info': channel_labels_saver}
+    SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {
+        'mne_info': channel_labels_and_sfreq_saver}
 
-    def __init__(self, collect_for_x_seconds=60, dsamp_freq=None):
+    def __init__(self, collect_for_x_seconds=60, dsamp_freq=None,
+                 track_bad_channels=True, bad_channels_window_seconds=5):
         ProcessorNode.__init__(self)
         self.collect_for_x_seconds = collect_for_x_seconds  # type: int
+        self.track_bad_channels = track_bad_channels  # type: bool
+        self.bad_channels_window_seconds = bad_channels_window_seconds
 
         self._samples_collected = None  # type: int
         self._samples_to_be_collected = None  # type: int
@@ -50,15 +89,43 @@ class Preprocessing(ProcessorNode):
         self._bad_channel_indices = None  # type: list[int]
         self._interpolation_matrix = None  # type: np.ndarray
         self._dsamp_freq = dsamp_freq
+        self._resampler = None  # type: StreamingResampler
+        self._eeg_picks = None  # type: np.ndarray
+        self._channel_quality = None  # type: ChannelQualityTracker
+        # Bads that were put into mne_info by this node
+        self._pushed_bads = None  # type: list
 
         self._reset_statistics()
 
     def _initialize(self):
-        self.mne_info = self.traverse_back_and_find('mne_info')
-        frequency = self.mne_info['sfreq']
+        mne_info = self.traverse_back_and_find('mne_info')
+        frequency = mne_info['sfreq']
         self._samples_to_be_collected = int(math.ceil(
             self.collect_for_x_seconds * frequency))
 
+        if self._dsamp_freq and self._dsamp_freq < frequency:
+            ratio = (Fraction(str(self._dsamp_freq)) /
+                     Fraction(str(frequency))).limit_denominator(1000)
+            self._resampler = StreamingResampler(
+                up=ratio.numerator, down=ratio.denominator,
+                n_channels=mne_info['nchan'])
+            self._resampler.apply = pynfb_ndarray_function_wrapper(
+                self._resampler.apply)
+        else:
+            self._resampler = None
+
+        # Copy so that the upstream info is left untouched
+        self.mne_info = mne_info.copy()
+        if self._resampler is not None:
+            self.mne_info['sfreq'] = frequency * ratio
+
+        self._eeg_picks = mne.pick_types(
+            mne_info, eeg=True, meg=False, exclude=[])
+        self._channel_quality = ChannelQualityTracker(
+            n_channels=len(self._eeg_picks),
+            window_size=int(self.bad_channels_window_seconds * frequency))
+        self._pushed_bads = []
+
     def _update(self):
         # Have we collected enough samples without the new input?
         enough_collected = self._samples_collected >=\
@@ -71,27 +138,48 @@ class Preprocessing(ProcessorNode):
         elif not self._enough_collected:  # We just got enough samples
             self._enough_collected = True
             standard_deviations = self._calculate_standard_deviations()
-            self._bad_channel_indices = find_outliers(standard_deviations)
-            if any(self._bad_channel_indices):
-                # message = Message(there_has_been_a_change=True,
-                #                   output_history_is_no_longer_valid=True)
-                # self._deliver_a_message_to_receivers(message)
-                # self.mne_info['bads'].append(self._bad_channel_indices)
-                # self.mne_info['bads'] = self._bad_channel_indices
-
-                # TODO: handle emergent bad channels on the go
-                pass
-        if self._dsamp_freq and self._dsamp_freq < self.mne_info['sfreq']:
-            raw = mne.io.RawArray(self.parent.output, self.mne_info)
-            raw.resample(self._dsamp_freq)
-            self.output = raw.get_data()
-            self.mne_info = raw.mne_info
-
+            self._bad_channel_indices = find_outliers(
+                standard_deviations[self._eeg_picks])
+            if (self.track_bad_channels and
+                    len(self._bad_channel_indices) > 0):
+                self._channel_quality.mark_bad(self._bad_channel_indices)
+                self._push_bad_channels()
+
+        if self.track_bad_channels:
+            eeg_data = get_a_subset_of_channels(
+                self.parent.output, self._eeg_picks)
+            if self._channel_quality.update(
+                    make_time_dimension_second(eeg_data)):
+                self._push_bad_channels()
+
+        if self._resampler is not None:
+            self.output = self._resampler.apply(self.parent.output)
         else:
             self.output = self.parent.output
 
+    def _push_bad_channels(self):
+        """
+        Replace the bads this node has put into mne_info before with
+        the currently flagged ones keeping the bads that came from elsewhere.
+        mne_info['bads'] gets a new list, so nodes that saved the old one
+        can see the difference.
+
+        """
+        ch_names = self.mne_info['ch_names']
+        flagged = [ch_names[self._eeg_picks[i]] for i in
+                   np.flatnonzero(self._channel_quality.is_bad)]
+        kept = [ch_name for ch_name in self.mne_info['bads']
+                if ch_name not in self._pushed_bads]
+        self.mne_info['bads'] = kept + [ch_name for ch_name in flagged
+                                        if ch_name not in kept]
+        self._pushed_bads = flagged
+        self.logger.info(
+            'Bad channels are now {}'.format(self.mne_info['bads']))
+
     def _reset(self) -> bool:
         self._reset_statistics()
+        if self._resampler is not None:
+            self._resampler.reset()
         self._input_history_is_no_longer_valid = True
         return self._input_history_is_no_longer_valid
 
@@ -123,21 +211,74 @@ class Preprocessing(ProcessorNode):
 
     def _on_input_history_invalidation(self):
         self._reset_statistics()
+        if self._resampler is not None:
+            self._resampler.reset()
+        if self._channel_quality is not None:
+            self._channel_quality.reset()
+
+    def _get_state(self):
+        state = {'samples_collected': self._samples_collected,
+                 'means': self._means,
+                 'mean_sums_of_squares': self._mean_sums_of_squares,
+                 'is_bad': self._channel_quality.is_bad}
+        if self._resampler is not None:
+            for key, value in get_filter_state(self._resampler).items():
+                state['resampler' + key] = value  # e.g. resampler_history
+        return state
+
+    def _set_state(self, state):
+        if state['is_bad'].shape != self._channel_quality.is_bad.shape:
+            raise ValueError('Saved state is for a different number of '
+                             'EEG channels')
+        # Bad channels are found again from the restored statistics
+        # on the next update if enough samples have been collected
+        self._reset_statistics()
+        self._samples_collected = int(state['samples_collected'])
+        self._means = state['means']
+        self._mean_sums_of_squares = state['mean_sums_of_squares']
+
+        self._channel_quality.is_bad[:] = state['is_bad']
+        if self.track_bad_channels and any(self._channel_quality.is_bad):
+            self._push_bad_channels()
+
+        if self._resampler is not None:
+            set_filter_state(self._resampler, {
+                key[len('resampler'):]: value
+                for key, value in state.items()
+                if key.startswith('resampler')})
 
     def _check_value(self, key, value):
         pass
 
 
 class InverseModel(ProcessorNode):
+    """
+    Minimum-norm inverse solution
+
+    Parameters
+    ----------
+    precompute_kernel: bool (default True)
+        If True, the VERTICES x CHANNELS kernel is computed once on
+        initialization and applied with a single matrix product per chunk.
+        If False, each chunk goes through mne.minimum_norm.apply_inverse_raw.
+        Both give the same result.
+
+    Notes
+    -----
+    When bad channels change upstream, the inverse operator is rebuilt in
+    a worker thread. Until it is ready, chunks are processed with the old
+    operator; the new one is swapped in between two chunks.
+
+    """
     SUPPORTED_METHODS = ['MNE', 'dSPM', 'sLORETA']
     UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ('mne_info', )
     CHANGES_IN_THESE_REQUIRE_RESET = ('mne_inverse_model_file_path',
                                       'mne_forward_model_file_path',
-                                      'snr', 'method')
+                                      'snr', 'method', 'precompute_kernel')
     SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {'mne_info': channel_labels_saver}
 
     def __init__(self, forward_model_path=None, snr=1.0, method='MNE',
-                 depth=None, loose=1, fixed=False):
+                 depth=None, loose=1, fixed=False, precompute_kernel=True):
         ProcessorNode.__init__(self)
 
         self.snr = snr
@@ -151,10 +292,23 @@ class InverseModel(ProcessorNode):
         self.loose = loose
         self.depth = depth
         self.fixed = fixed
+        self.precompute_kernel = precompute_kernel
+
+        self._kernel = None  # type: np.ndarray
+        self._noise_norm = None  # type: np.ndarray
+        self._channel_picks = None  # type: np.ndarray
+        self._is_free_ori = None  # type: bool
+        self._inverse_mne_info = None  # type: mne.Info
+
+        # Inverse operator updates on bad channels change
+        self._rebuild_executor = None  # type: ThreadPoolExecutor
+        self._inverse_rebuild = None  # type: concurrent.futures.Future
 
     def _initialize(self):
         mne_info = self.traverse_back_and_find('mne_info')
-        self._bad_channels = mne_info['bads']
+        # Rebuilds started before reinitialization are stale
+        self._shutdown_rebuild_executor()
+        self._rebuild_executor = ThreadPoolExecutor(max_workers=1)
 
         if self._user_provided_forward_model_file_path is None:
             self._default_forward_model_file_path =\
@@ -175,18 +329,9 @@ class InverseModel(ProcessorNode):
             else:
                 raise Exception('BAD FORWARD + DATA COMBINATION!')
         if is_ok:
-            self.inverse_operator = make_inverse_operator(self.fwd,
-                                                          mne_info,
-                                                          depth=self.depth,
-                                                          loose=self.loose,
-                                                          fixed=self.fixed)
+            self._bad_channels = list(mne_info['bads'])
             self.lambda2 = 1.0 / self.snr ** 2
-            self.inverse_operator = prepare_inverse_operator(
-                self.inverse_operator, nave=100,
-                lambda2=self.lambda2, method=self.method)
-            # self._inverse_model_matrix = matrix_from_inverse_operator(
-            #     inverse_operator=self.inverse_operator, mne_info=mne_info,
-            #     snr=self.snr, method=self.method)
+            self._set_inverse(self._build_inverse(mne_info.copy()))
 
             frequency = mne_info['sfreq']
             # channel_count = self._inverse_model_matrix.shape[0]
@@ -198,29 +343,84 @@ class InverseModel(ProcessorNode):
     def _update(self):
         mne_info = self.traverse_back_and_find('mne_info')
         bads = mne_info['bads']
-        if bads != self._bad_channels:
+        if bads != self._bad_channels and self._inverse_rebuild is None:
+            # Rebuilding the operator takes seconds, so it is done in the
+            # background while we keep using the old one. The old operator
+            # picks its channels by itself and stays valid meanwhile.
             self.logger.info('Found new bad channels {};'.format(bads) +
-                             'updating inverse operator')
-            # self.inverse_operator = make_inverse_operator(self.fwd, mne_info)
-            self.inverse_operator = make_inverse_operator(self.fwd,
-                                                          mne_info,
-                                                          depth=self.depth,
-                                                          loose=self.loose,
-                                                          fixed=self.fixed)
-            self.inverse_operator = prepare_inverse_operator(
-                self.inverse_operator, nave=100,
-                lambda2=self.lambda2, method=self.method)
-            self._bad_channels = bads
+                             'updating inverse operator in the background')
+            self._bad_channels = list(bads)
+            self._inverse_rebuild = self._rebuild_executor.submit(
+                self._build_inverse, mne_info.copy())
+
+        if (self._inverse_rebuild is not None and
+                self._inverse_rebuild.done()):
+            # Swap at the chunk boundary; raises if the rebuild failed
+            self._set_inverse(self._inverse_rebuild.result())
+            self._inverse_rebuild = None
+            self.logger.info('Switched to the updated inverse operator')
 
         input_array = self.parent.output
-        raw_array = mne.io.RawArray(input_array, mne_info, verbose='ERROR')
+        if self.precompute_kernel:
+            self.output = self._apply_inverse_kernel(input_array)
+        else:
+            self.output = self._apply_inverse_mne(input_array)
+
+    def _build_inverse(self, mne_info):
+        """
+        Make and prepare the inverse operator for good channels of mne_info.
+        Does not touch the node so that it can run in a worker thread.
+
+        """
+        t1 = time.time()
+        inverse_operator = make_inverse_operator(self.fwd, mne_info,
+                                                 depth=self.depth,
+                                                 loose=self.loose,
+                                                 fixed=self.fixed)
+        inverse_operator = prepare_inverse_operator(
+            inverse_operator, nave=100,
+            lambda2=self.lambda2, method=self.method)
+        kernel = get_inverse_kernel(inverse_operator, mne_info, self.method)
+        t2 = time.time()
+        self.logger.debug('Assembled inverse operator in {:.1f} ms'.format(
+            (t2 - t1) * 1000))
+        return inverse_operator, kernel, mne_info
+
+    def _shutdown_rebuild_executor(self):
+        if self._inverse_rebuild is not None:
+            # A rebuild that has already started cannot be cancelled, but
+            # its result is never used and the worker exits after it
+            self._inverse_rebuild.cancel()
+            self._inverse_rebuild = None
+        if self._rebuild_executor is not None:
+            self._rebuild_executor.shutdown(wait=False)
+            self._rebuild_executor = None
+
+    def stop(self):
+        self._shutdown_rebuild_executor()
+
+    def _set_inverse(self, inverse):
+        self.inverse_operator, kernel, self._inverse_mne_info = inverse
+        (self._kernel, self._noise_norm,
+         self._channel_picks, self._is_free_ori) = kernel
+
+    def _apply_inverse_kernel(self, input_array: np.ndarray):
+        data = make_time_dimension_second(
+            get_a_subset_of_channels(input_array, self._channel_picks))
+        output_array = apply_inverse_kernel(
+            self._kernel, self._noise_norm, self._is_free_ori, data)
+        return put_time_dimension_back_from_second(output_array)
+
+    def _apply_inverse_mne(self, input_array: np.ndarray):
+        # Use the info the operator was built for: bads upstream might
+        # have already changed while the new operator is being built
+        raw_array = mne.io.RawArray(
+            input_array, self._inverse_mne_info, verbose='ERROR')
         raw_array.pick_types(eeg=True, meg=False, stim=False, exclude='bads')
-        # data = raw_array.get_data()
-        # self.output = self._apply_inverse_model_matrix(data)
         stc = apply_inverse_raw(raw_array, self.inverse_operator,
                                 lambda2=self.lambda2, method=self.method,
                                 prepared=True)
-        self.output = stc.data
+        return stc.data
 
     def _on_input_history_invalidation(self):
         # The methods implemented in this node do not rely on past inputs
@@ -263,8 +463,8 @@ class InverseModel(ProcessorNode):
 class LinearFilter(ProcessorNode):
     UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ('mne_info', )
     CHANGES_IN_THESE_REQUIRE_RESET = ('lower_cutoff', 'upper_cutoff')
-    SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {'mne_info':
-                                           lambda info: (info['nchan'], )}
+    SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {
+        'mne_info': lambda info: (info['nchan'], info['sfreq'])}
 
     def __init__(self, lower_cutoff, upper_cutoff):
         ProcessorNode.__init__(self)
@@ -320,6 +520,144 @@ class LinearFilter(ProcessorNode):
         if self._linear_filter is not None:
             self._linear_filter.reset()
 
+    def _get_state(self):
+        if self._linear_filter is None:
+            return dict()
+        return get_filter_state(self._linear_filter)
+
+    def _set_state(self, state):
+        if self._linear_filter is not None:
+            set_filter_state(self._linear_filter, state)
+
+    def _reset(self):
+        self._should_reinitialize = True
+        self.initialize()
+        output_history_is_no_longer_valid = True
+        return output_history_is_no_longer_valid
+
+
+class FilterBank(ProcessorNode):
+    """
+    Several band filters applied to the same input in one pass
+
+    Output rows are grouped by band: channels of the first band, then
+    of the second one, etc., labeled '<channel>_<band name>'.
+    Attach BandSelector to get a single band with the original mne_info.
+
+    Parameters
+    ----------
+    bands: dict
+        Band name -> (lower cutoff, upper cutoff). Either cutoff can be
+        None as in LinearFilter.
+    order: int
+        Order of the Butterworth filters
+
+    """
+    UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ('mne_info', )
+    CHANGES_IN_THESE_REQUIRE_RESET = ('bands', 'order')
+    SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {
+        'mne_info': channel_labels_and_sfreq_saver}
+    DEFAULT_BANDS = {'alpha': (8, 12), 'beta': (13, 30), 'gamma': (30, 45)}
+
+    def __init__(self, bands=None, order=4):
+        ProcessorNode.__init__(self)
+        self.bands = bands or dict(self.DEFAULT_BANDS)
+        self.order = order
+        self.band_names = None  # type: tuple
+        self.band_mne_info = None  # type: mne.Info
+        self._filter_bank = None  # type: SOSFilterBank
+
+    def _initialize(self):
+        mne_info = self.traverse_back_and_find('mne_info')
+        self.band_names = tuple(self.bands.keys())
+        self._filter_bank = SOSFilterBank(
+            [self.bands[name] for name in self.band_names],
+            fs=mne_info['sfreq'], n_channels=mne_info['nchan'],
+            order=self.order)
+        self._filter_bank.apply = pynfb_ndarray_function_wrapper(
+            self._filter_bank.apply)
+
+        self.band_mne_info = mne_info.copy()
+        channel_labels = ['{}_{}'.format(ch_name, band_name)
+                          for band_name in self.band_names
+                          for ch_name in mne_info['ch_names']]
+        self.mne_info = mne.create_info(
+            channel_labels, mne_info['sfreq'],
+            ch_types=read_channel_types(mne_info) * len(self.band_names))
+
+    def _update(self):
+        self.output = self._filter_bank.apply(self.parent.output)
+
+    def _check_value(self, key, value):
+        if key == 'bands':
+            for low, high in value.values():
+                if low is not None and high is not None and low > high:
+                    raise ValueError('Lower cutoff can`t be set higher'
+                                     ' that the upper cutoff')
+                if (low is not None and low < 0 or
+                        high is not None and high < 0):
+                    raise ValueError('Cutoffs must be positive numbers')
+                if low is None and high is None:
+                    raise ValueError('At least one cutoff must be set')
+
+        if key == 'order':
+            if value < 1:
+                raise ValueError('Order must be a positive integer')
+
+    def _on_input_history_invalidation(self):
+        if self._filter_bank is not None:
+            self._filter_bank.reset()
+
+    def _get_state(self):
+        return get_filter_state(self._filter_bank)
+
+    def _set_state(self, state):
+        set_filter_state(self._filter_bank, state)
+
+    def _reset(self):
+        self._should_reinitialize = True
+        self.initialize()
+        output_history_is_no_longer_valid = True
+        return output_history_is_no_longer_valid
+
+
+class BandSelector(ProcessorNode):
+    """
+    Passes a single band of the upstream FilterBank output without
+    copying, with the mne_info of the FilterBank input
+
+    """
+    UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ('mne_info', )
+    CHANGES_IN_THESE_REQUIRE_RESET = ('band', )
+    SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {'mne_info': channel_labels_saver}
+
+    def __init__(self, band):
+        ProcessorNode.__init__(self)
+        self.band = band
+        self._channel_slice = None  # type: slice
+
+    def _initialize(self):
+        band_names = self.traverse_back_and_find('band_names')
+        if self.band not in band_names:
+            raise ValueError('Band {} is not in the upstream filter bank.'
+                             .format(self.band) +
+                             ' Use one of: {}'.format(band_names))
+        self.mne_info = self.traverse_back_and_find('band_mne_info').copy()
+        channel_count = self.mne_info['nchan']
+        band_index = band_names.index(self.band)
+        self._channel_slice = slice(band_index * channel_count,
+                                    (band_index + 1) * channel_count)
+
+    def _update(self):
+        self.output = get_a_subset_of_channels(
+            self.parent.output, self._channel_slice)
+
+    def _check_value(self, key, value):
+        pass
+
+    def _on_input_history_invalidation(self):
+        pass
+
     def _reset(self):
         self._should_reinitialize = True
         self.initialize()
@@ -328,33 +666,66 @@ class LinearFilter(ProcessorNode):
 
 
 class EnvelopeExtractor(ProcessorNode):
-    def __init__(self, factor=0.9):
+    """
+    Amplitude envelope of narrow-band signals
+
+    Parameters
+    ----------
+    factor: float
+        Smoothing factor for the 'Exponential smoothing' method
+    method: str
+        'Exponential smoothing' smooths the absolute value of the signal.
+        'hilbert' takes the absolute value of the analytic signal computed
+        with StreamingHilbert; the envelope lags by 2 / lowest_frequency
+        seconds.
+    lowest_frequency: float
+        Lowest frequency of the signal in Hz for the 'hilbert' method.
+        Lower frequencies need a longer Hilbert transformer.
+
+    """
+    def __init__(self, factor=0.9, method='Exponential smoothing',
+                 lowest_frequency=8):
         ProcessorNode.__init__(self)
-        self.method = 'Exponential smoothing'
+        self.method = method
         self.factor = factor
+        self.lowest_frequency = lowest_frequency
         self._envelope_extractor = None  # type: ExponentialMatrixSmoother
 
     def _initialize(self):
-        channel_count = self.traverse_back_and_find('mne_info')['nchan']
-        self._envelope_extractor = ExponentialMatrixSmoother(
-            factor=self.factor, column_count=channel_count)
+        mne_info = self.traverse_back_and_find('mne_info')
+        channel_count = mne_info['nchan']
+        if self.method == 'hilbert':
+            self._envelope_extractor = StreamingHilbert(
+                n_channels=channel_count,
+                n_taps=StreamingHilbert.n_taps_for(mne_info['sfreq'],
+                                                   self.lowest_frequency))
+        else:
+            self._envelope_extractor = ExponentialMatrixSmoother(
+                factor=self.factor, column_count=channel_count)
         self._envelope_extractor.apply = pynfb_ndarray_function_wrapper(
             self._envelope_extractor.apply)
 
     def _update(self):
         input_data = self.parent.output
-        self.output = self._envelope_extractor.apply(np.abs(input_data))
+        if self.method == 'hilbert':
+            self.output = np.abs(self._envelope_extractor.apply(input_data))
+        else:
+            self.output = self._envelope_extractor.apply(np.abs(input_data))
 
     def _check_value(self, key, value):
         if key == 'factor':
             if value <= 0 or value >= 1:
                 raise ValueError('Factor must be a number between 0 and 1')
 
+        if key == 'lowest_frequency':
+            if value <= 0:
+                raise ValueError('lowest_frequency must be positive')
+
         if key == 'method':
             if value not in self.SUPPORTED_METHODS:
                 raise ValueError(
-                    'Method {} is not supported.' +
-                    ' Use one of: {}'.format(value, self.SUPPORTED_METHODS))
+                    'Method {} is not supported.'.format(value) +
+                    ' Use one of: {}'.format(self.SUPPORTED_METHODS))
 
     def _reset(self):
         self._should_reinitialize = True
@@ -365,28 +736,80 @@ class EnvelopeExtractor(ProcessorNode):
     def _on_input_history_invalidation(self):
         self._envelope_extractor.reset()
 
+    def _get_state(self):
+        return get_filter_state(self._envelope_extractor)
+
+    def _set_state(self, state):
+        set_filter_state(self._envelope_extractor, state)
+
     UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ('mne_info', )
-    CHANGES_IN_THESE_REQUIRE_RESET = ('method', 'factor')
-    SUPPORTED_METHODS = ('Exponential smoothing', )
-    SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {'mne_info':
-                                           lambda info: (info['nchan'],)}
+    CHANGES_IN_THESE_REQUIRE_RESET = ('method', 'factor', 'lowest_frequency')
+    SUPPORTED_METHODS = ('Exponential smoothing', 'hilbert')
+    SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {
+        'mne_info': lambda info: (info['nchan'], info['sfreq'])}
 
 
 class Beamformer(ProcessorNode):
+    """
+    LCMV beamformer
+
+    Parameters
+    ----------
+    is_adaptive: bool
+        If True, the data covariance is tracked with the forgetting factor
+        and the weights are recomputed from it on the go.
+    forgetting_factor_per_second: float
+        How much of the covariance is kept after one second of data
+    update_weights_every_x_chunks: int
+        Cadence of the adaptive weights recomputation in chunks
+    update_weights_every_x_ms: float | None
+        Cadence of the adaptive weights recomputation in milliseconds;
+        takes precedence over update_weights_every_x_chunks if set.
+    parallel_weights: bool
+        If True, the per-source part of the weights computation runs on
+        all cores with numba instead of a single batched numpy solve.
+        Pays off for big source spaces; the weights are the same.
+
+    Notes
+    -----
+    In the adaptive mode the inverse of the regularized whitened data
+    covariance is updated with a rank-k Sherman-Morrison-Woodbury update on
+    each chunk, so no matrix is inverted in the real-time loop. The update
+    scales the diagonal loading down with the rest of the covariance, so
+    the inverse is recomputed directly whenever the loading it holds is
+    more than MAX_LOADING_ERROR off the one reg gives. The tracked
+    covariance starts from the leadfield covariance.
+
+    When bad channels change upstream, the spatial filter is rebuilt in
+    a worker thread. Until it is ready, chunks are processed with the old
+    filter; the new one is swapped in between two chunks. In the adaptive
+    mode the tracked covariance is carried over to the new good channels.
+
+    """
 
     SUPPORTED_OUTPUT_TYPES = ('power', 'activation')
     UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ('mne_info',)
     CHANGES_IN_THESE_REQUIRE_RESET = ('reg', 'output_type', 'is_adaptive',
                                       'fixed_orientation',
-                                      'mne_forward_model_file_path')
+                                      'mne_forward_model_file_path',
+                                      'update_weights_every_x_chunks',
+                                      'update_weights_every_x_ms')
 
-    SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {'mne_info': channel_labels_saver}
+    SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {
+        'mne_info': channel_labels_and_sfreq_saver}
+
+    # Woodbury updates accumulate rounding errors, so every so often the
+    # inverse is recomputed directly
+    RESYNC_EVERY_X_COVARIANCE_UPDATES = 1000
+    # Relative error of the diagonal loading that triggers the same
+    MAX_LOADING_ERROR = 0.01
 
     def __init__(self, output_type='power',
                  is_adaptive=False, fixed_orientation=True,
                  forward_model_path=None,
                  forgetting_factor_per_second=0.99,
-                 reg=0.05):
+                 reg=0.05, update_weights_every_x_chunks=10,
+                 update_weights_every_x_ms=None, parallel_weights=False):
         ProcessorNode.__init__(self)
 
         self._user_provided_forward_model_file_path = forward_model_path
@@ -401,13 +824,43 @@ class Beamformer(ProcessorNode):
 
         self._channel_indices = None  # type: list
         self._gain_matrix = None  # type: np.ndarray
-        self._Rxx = None  # type: np.ndarray
         self.forgetting_factor_per_second = forgetting_factor_per_second
         self._forgetting_factor_per_sample = None  # type: float
         self.reg = reg
 
+        self.update_weights_every_x_chunks = update_weights_every_x_chunks
+        self.update_weights_every_x_ms = update_weights_every_x_ms
+        self.parallel_weights = parallel_weights
+
+        # Precomputed on initialization: (whitener x) SSP x good channels
+        # picking matrix and the full data-to-sources operator
+        self._sensor_transform = None  # type: np.ndarray
+        self._spatial_filter = None  # type: np.ndarray
+
+        # Adaptive beamformer state; all in whitened sensor space
+        self._Rxx = None  # type: np.ndarray
+        self._Rxx_inv = None  # type: np.ndarray
+        # Diagonal loading that _Rxx_inv holds
+        self._loading = None  # type: float
+        self._covariance_updates = None  # type: int
+        self._lcmv_G = None  # type: np.ndarray
+        self._n_orient = None  # type: int
+        self._samples = None  # type: np.ndarray
+        self._outer_product = None  # type: np.ndarray
+        self._chunks_since_weights_update = None  # type: int
+        self._time_of_weights_update = None  # type: float
+
+        # Spatial filter updates on bad channels change
+        self._data_cov = None  # type: mne.Covariance
+        self._bad_channels = None  # type: list
+        self._rebuild_executor = None  # type: ThreadPoolExecutor
+        self._filters_rebuild = None  # type: concurrent.futures.Future
+
     def _initialize(self):
         mne_info = self.traverse_back_and_find('mne_info')
+        # Rebuilds started before reinitialization are stale
+        self._shutdown_rebuild_executor()
+        self._rebuild_executor = ThreadPoolExecutor(max_workers=1)
 
         if self._user_provided_forward_model_file_path is None:
             self._default_forward_model_file_path = get_default_forward_file(
@@ -428,24 +881,22 @@ class Beamformer(ProcessorNode):
                 raise Exception('BAD FORWARD + DATA COMBINATION!')
         if is_ok:
             mne_info['bads'] = list(set(mne_info['bads'] + missing_ch_names))
+            self._bad_channels = list(mne_info['bads'])
             self._gain_matrix = fwd['sol']['data']
             G = self._gain_matrix
-            if self.is_adaptive is False:
-                Rxx = G.dot(G.T)
-            elif self.is_adaptive is True:
-                Rxx = np.zeros([G.shape[0], G.shape[0]])  # G.dot(G.T)
+            Rxx = G.dot(G.T)
 
             goods = mne.pick_types(
                 mne_info, eeg=True, meg=False, exclude='bads')
             ch_names = [mne_info['ch_names'][i] for i in goods]
 
-            self._Rxx = mne.Covariance(Rxx, ch_names, mne_info['bads'],
-                                       mne_info['projs'], nfree=1)
+            # make_lcmv drops the channels that go bad later from both
+            self._data_cov = mne.Covariance(
+                Rxx, ch_names, mne_info['bads'], mne_info['projs'], nfree=1)
 
             self.noise_cov = mne.Covariance(
                 G.dot(G.T), ch_names, mne_info['bads'],
                 mne_info['projs'], nfree=1)
-            self._mne_info = mne_info
 
             frequency = mne_info['sfreq']
             self._forgetting_factor_per_sample = np.power(
@@ -460,53 +911,158 @@ class Beamformer(ProcessorNode):
 
             self.fwd_surf = mne.convert_forward_solution(
                         fwd, surf_ori=True, force_fixed=False)
-            if not self.is_adaptive:
-                self._filters = make_lcmv(
-                        info=self._mne_info, forward=self.fwd_surf,
-                        data_cov=self._Rxx, reg=self.reg, pick_ori='max-power',
-                        weight_norm='unit-noise-gain', reduce_rank=False)
-            else:
-                self._filters = None
+            self._set_filters(self._build_filters(mne_info.copy()))
+            if self.is_adaptive:
+                self._initialize_adaptive_state()
+
+    def _build_filters(self, mne_info, sensor_transform=None):
+        """
+        Make the spatial filter for good channels of mne_info. If the
+        sensor_transform the covariance is tracked with is given, also get
+        the matrix that takes the covariance to the new whitened space.
+        Does not touch the node so that it can run in a worker thread.
+
+        """
+        t1 = time.time()
+        is_adaptive = self._initialized_as_adaptive
+        filters = make_lcmv(
+                info=mne_info, forward=self.fwd_surf,
+                data_cov=self._data_cov, reg=self.reg,
+                noise_cov=self.noise_cov if is_adaptive else None,
+                pick_ori='max-power', weight_norm='unit-noise-gain',
+                reduce_rank=False, parallel=self.parallel_weights)
+        new_sensor_transform = self._get_sensor_transform(filters, mne_info)
+
+        lcmv_G, n_orient, covariance_map = None, None, None
+        if is_adaptive:
+            lcmv_G, _, _, n_orient = prepare_lcmv_input(
+                info=mne_info, forward=self.fwd_surf,
+                noise_cov=self.noise_cov, pick_ori='max-power')
+            if sensor_transform is not None:
+                covariance_map = new_sensor_transform.dot(
+                    np.linalg.pinv(sensor_transform))
+        t2 = time.time()
+        self.logger.debug('Made spatial filter in {:.1f} ms'.format(
+            (t2 - t1) * 1000))
+        return (filters, new_sensor_transform, lcmv_G, n_orient,
+                covariance_map, mne_info)
+
+    def _set_filters(self, filters):
+        (self._filters, self._sensor_transform, self._lcmv_G,
+         self._n_orient, covariance_map, self._mne_info) = filters
+        if covariance_map is not None:
+            # Keep what has been learnt about the data instead of starting
+            # over from the leadfield covariance
+            self._Rxx = covariance_map.dot(self._Rxx).dot(covariance_map.T)
+            self._outer_product = np.empty_like(self._Rxx)
+            self._samples = np.empty([len(self._Rxx), 0])
+            self._resync_inverse_covariance()
+            self._update_weights()
+        else:
+            self._update_spatial_filter()
+
+    def _shutdown_rebuild_executor(self):
+        if self._filters_rebuild is not None:
+            # A rebuild that has already started cannot be cancelled, but
+            # its result is never used and the worker exits after it
+            self._filters_rebuild.cancel()
+            self._filters_rebuild = None
+        if self._rebuild_executor is not None:
+            self._rebuild_executor.shutdown(wait=False)
+            self._rebuild_executor = None
+
+    def stop(self):
+        self._shutdown_rebuild_executor()
+
+    def _get_sensor_transform(self, filters, mne_info):
+        """
+        Matrix that does what apply_lcmv_raw does to the data before
+        weights are applied: picks good channels, applies SSPs (average
+        reference included) and whitens
+
+        """
+        channel_picks = [mne_info['ch_names'].index(ch_name)
+                         for ch_name in filters['ch_names']]
+        transform = filters['proj']
+        if filters['whitener'] is not None:
+            transform = filters['whitener'].dot(transform)
+        sensor_transform = np.zeros([transform.shape[0], mne_info['nchan']])
+        sensor_transform[:, channel_picks] = transform
+        return sensor_transform
+
+    def _update_spatial_filter(self):
+        self._spatial_filter = self._filters['weights'].dot(
+            self._sensor_transform)
+
+    def _update_weights(self):
+        self._filters['weights'] = compute_lcmv_weights(
+            self._lcmv_G, self._Rxx_inv, self._n_orient,
+            parallel=self.parallel_weights)
+        self._update_spatial_filter()
+
+    def _initialize_adaptive_state(self):
+        # Start from the leadfield covariance which is what the
+        # nonadaptive beamformer uses
+        self._Rxx = self._lcmv_G.dot(self._lcmv_G.T)
+        self._outer_product = np.empty_like(self._Rxx)
+        self._samples = np.empty([len(self._Rxx), 0])
+        self._resync_inverse_covariance()
+        self._chunks_since_weights_update = 0
+        self._time_of_weights_update = time.time()
+
+    def _get_loading(self):
+        """Diagonal loading that make_lcmv would use for _Rxx"""
+        return self.reg * np.trace(self._Rxx) / len(self._Rxx)
+
+    def _resync_inverse_covariance(self):
+        """Recompute regularized inverse directly as make_lcmv does"""
+        self._loading = self._get_loading()
+        Rxx = self._Rxx.copy()
+        Rxx.flat[::Rxx.shape[0] + 1] += self._loading
+        self._Rxx_inv = np.linalg.pinv(Rxx)
+        self._covariance_updates = 0
 
     def _update(self):
-        t1 = time.time()
-        input_array = self.parent.output
-        raw_array = mne.io.RawArray(
-            input_array, self._mne_info, verbose='ERROR')
+        mne_info = self.traverse_back_and_find('mne_info')
+        bads = mne_info['bads']
+        if bads != self._bad_channels and self._filters_rebuild is None:
+            # Making the filter takes long, so it is done in the background
+            # while we keep using the old one
+            self.logger.info('Found new bad channels {};'.format(bads) +
+                             'updating spatial filter in the background')
+            self._bad_channels = list(bads)
+            self._filters_rebuild = self._rebuild_executor.submit(
+                self._build_filters, mne_info.copy(), self._sensor_transform)
+
+        if (self._filters_rebuild is not None and
+                self._filters_rebuild.done()):
+            # Swap at the chunk boundary; raises if the rebuild failed
+            self._set_filters(self._filters_rebuild.result())
+            self._filters_rebuild = None
+            self.logger.info('Switched to the updated spatial filter')
 
-        raw_array.pick_types(eeg=True, meg=False, stim=False, exclude='bads')
-        raw_array.set_eeg_reference(ref_channels='average', projection=True)
-        t2 = time.time()
-        self.logger.debug('Prepare arrays in {:.1f} ms'.format(
-                    (t2 - t1) * 1000))
+        input_array = self.parent.output
 
         if self.is_adaptive:
             self._update_covariance_matrix(input_array)
-            t1 = time.time()
-            self._filters = make_lcmv(info=self._mne_info,
-                                      forward=self.fwd_surf,
-                                      data_cov=self._Rxx, reg=self.reg,
-                                      noise_cov=self.noise_cov,
-                                      pick_ori='max-power',
-                                      weight_norm='unit-noise-gain',
-                                      reduce_rank=False)
-            t2 = time.time()
-            self.logger.debug('Assembled lcmv instance in {:.1f} ms'.format(
-                        (t2 - t1) * 1000))
-
-        self._filters['source_nn'] = []
+            if self._is_time_to_update_weights():
+                t1 = time.time()
+                self._update_weights()
+                t2 = time.time()
+                self.logger.debug('Recomputed weights in {:.1f} ms'.format(
+                            (t2 - t1) * 1000))
+
         t1 = time.time()
-        stc = apply_lcmv_raw(raw=raw_array, filters=self._filters,
-                             max_ori_out='signed')
+        output = self._spatial_filter.dot(
+            make_time_dimension_second(input_array))
         t2 = time.time()
         self.logger.debug('Applied lcmv inverse in {:.1f} ms'.format(
                     (t2 - t1) * 1000))
 
-        output = stc.data
         t1 = time.time()
         if self.fixed_orientation is True:
             if self.output_type == 'power':
-                output = output ** 2
+                np.square(output, out=output)
         else:
             vertex_count = self.fwd_surf['nsource']
             output = np.sum(
@@ -514,12 +1070,26 @@ class Beamformer(ProcessorNode):
             if self.output_type == 'activation':
                 output = np.sqrt(output)
 
-        self.output = output
+        self.output = put_time_dimension_back_from_second(output)
         t2 = time.time()
         self.logger.debug(
                 'Finalized in {:.1f} ms'.format(
                     (t2 - t1) * 1000))
 
+    def _is_time_to_update_weights(self):
+        self._chunks_since_weights_update += 1
+        if self.update_weights_every_x_ms is not None:
+            ms_since_weights_update = (
+                time.time() - self._time_of_weights_update) * 1000
+            is_time = ms_since_weights_update >= self.update_weights_every_x_ms
+        else:
+            is_time = (self._chunks_since_weights_update >=
+                       self.update_weights_every_x_chunks)
+        if is_time:
+            self._chunks_since_weights_update = 0
+            self._time_of_weights_update = time.time()
+        return is_time
+
     @property
     def mne_forward_model_file_path(self):
         # TODO: fix this
@@ -548,6 +1118,22 @@ class Beamformer(ProcessorNode):
             self._should_reinitialize = True
             self.initialize()
 
+    def _get_state(self):
+        # Only adaptive version relies on history
+        if self._initialized_as_adaptive is not True:
+            return dict()
+        return {'Rxx': self._Rxx}
+
+    def _set_state(self, state):
+        if self._initialized_as_adaptive is not True or 'Rxx' not in state:
+            return
+        if state['Rxx'].shape != self._Rxx.shape:
+            raise ValueError('Saved covariance is for a different number of '
+                             'channels')
+        self._Rxx[:] = state['Rxx']
+        self._resync_inverse_covariance()
+        self._update_weights()
+
     def _check_value(self, key, value):
         if key == 'output_type':
             if value not in self.SUPPORTED_OUTPUT_TYPES:
@@ -566,36 +1152,55 @@ class Beamformer(ProcessorNode):
                 raise ValueError(
                     'Beamformer type (adaptive vs nonadaptive) is not set')
 
+        if key == 'update_weights_every_x_chunks':
+            if value < 1:
+                raise ValueError('Weights can be updated at most once per'
+                                 ' chunk')
+
+        if key == 'update_weights_every_x_ms':
+            if value is not None and value < 0:
+                raise ValueError('Weights update interval must be positive')
+
     def _update_covariance_matrix(self, input_array):
         t1 = time.time()
-        alpha = self._forgetting_factor_per_sample
         sample_count = input_array.shape[TIME_AXIS]
         self.logger.debug('Number of samples: {}'.format(sample_count))
-        new_Rxx_data = self._Rxx.data
 
-        raw_array = mne.io.RawArray(
-            input_array, self._mne_info, verbose='ERROR')
-        raw_array.pick_types(eeg=True, meg=False, stim=False, exclude='bads')
-        raw_array.set_eeg_reference(ref_channels='average', projection=True)
-        input_array_nobads = raw_array.get_data()
+        # Exponential forgetting with per-second rate regardless of how
+        # many samples came in the chunk
+        alpha = np.power(self._forgetting_factor_per_sample, sample_count)
+        beta = (1 - alpha) / sample_count
 
+        if self._samples.shape[1] != sample_count:
+            self._samples = np.empty([len(self._Rxx), sample_count])
+        samples = self._samples
+        np.dot(self._sensor_transform,
+               make_time_dimension_second(input_array), out=samples)
         t2 = time.time()
         self.logger.debug(
             'Prepared covariance update in {:.2f} ms'.format((t2 - t1) * 1000))
-        samples = make_time_dimension_second(input_array_nobads).T
-        new_Rxx_data = (alpha * new_Rxx_data +
-                        (1 - alpha) * samples.T.dot(samples))
+
+        np.dot(samples, samples.T, out=self._outer_product)
+        self._outer_product *= beta
+        self._Rxx *= alpha
+        self._Rxx += self._outer_product
+        self._covariance_updates += 1
+        # The low-rank update scales the loading too
+        self._loading *= alpha
+        loading = self._get_loading()
+        if (sample_count >= len(self._Rxx) or self._covariance_updates >=
+                self.RESYNC_EVERY_X_COVARIANCE_UPDATES or
+                abs(self._loading - loading) >
+                self.MAX_LOADING_ERROR * loading):
+            # Low-rank update is no cheaper than inversion in the first case
+            self._resync_inverse_covariance()
+        else:
+            self._Rxx_inv = woodbury_update(
+                self._Rxx_inv, samples, alpha, beta)
         t3 = time.time()
         self.logger.debug(
             'Updated matrix data in {:.2f} ms'.format((t3 - t2) * 1000))
 
-        self._Rxx = mne.Covariance(new_Rxx_data, self._Rxx.ch_names,
-                                   raw_array.info['bads'],
-                                   raw_array.info['projs'], nfree=1)
-        t4 = time.time()
-        self.logger.debug('Created instance of covariance' +
-                          ' in {:.2f} ms'.format((t4 - t4) * 1000))
-
 
 # TODO: implement this function
 def pynfb_filter_based_processor_class(pynfb_filter_class):
@@ -650,106 +1255,192 @@ def pynfb_filter_based_processor_class(pynfb_filter_class):
 
 
 class MCE(ProcessorNode):
-    UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ()
-    CHANGES_IN_THESE_REQUIRE_RESET = ('mne_forward_model_file_path', 'snr')
+    """
+    Minimum current estimate
+
+    Parameters
+    ----------
+    snr: float
+        Signal-to-noise ratio
+    forward_model_path: str
+        Path to the forward model file
+    n_comp: int
+        Number of singular components of the gain matrix to keep
+    solver: str
+        'interior-point' (default) solves the nonnegative linear program;
+        'irls' is a faster warm-started approximation that solves the
+        signed problem and returns absolute values. See MCESolver.
+    samples_per_solve: int | None
+        Length of the windows the chunk is split into; one problem is
+        solved per window mean. If None, the whole chunk is one window.
+
+    Notes
+    -----
+    Source orientations are taken from the MNE solution for the chunk mean
+    and are shared by all the windows in the chunk.
+
+    When bad channels change upstream, the truncated SVD and the MNE
+    operator are rebuilt in a worker thread. Until they are ready, chunks
+    are processed with the old ones; the new ones are swapped in between
+    two chunks.
+
+    """
+    UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ('mne_info', )
+    CHANGES_IN_THESE_REQUIRE_RESET = ('mne_forward_model_file_path', 'snr',
+                                      'solver', 'samples_per_solve')
+    SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {'mne_info': channel_labels_saver}
 
-    def __init__(self, snr=1.0, forward_model_path=None, n_comp=40):
+    def __init__(self, snr=1.0, forward_model_path=None, n_comp=40,
+                 solver='interior-point', samples_per_solve=None):
         ProcessorNode.__init__(self)
         self.snr = snr
         self.mne_forward_model_file_path = forward_model_path
         self.n_comp = n_comp
+        self.solver = solver
+        self.samples_per_solve = samples_per_solve
         self.mne_info = None
         self.input_data = []
         self.output = []
-        # pass
+        self._mce_solver = None  # type: MCESolver
+        self._fwd_fix = None
+
+        # Operator updates on bad channels change
+        self._bad_channels = None  # type: list
+        self._rebuild_executor = None  # type: ThreadPoolExecutor
+        self._operators_rebuild = None  # type: concurrent.futures.Future
 
     def _initialize(self):
         mne_info = self.traverse_back_and_find('mne_info')
+        # Rebuilds started before reinitialization are stale
+        self._shutdown_rebuild_executor()
+        self._rebuild_executor = ThreadPoolExecutor(max_workers=1)
+
         # mne_info['custom_ref_applied'] = True
-        # -------- truncated svd for fwd_opr operator -------- #
         fwd, missing_ch_names = get_clean_forward(
             self.mne_forward_model_file_path, mne_info)
         mne_info['bads'] = list(set(mne_info['bads'] + missing_ch_names))
-        fwd_fix = mne.convert_forward_solution(
+        self._bad_channels = list(mne_info['bads'])
+        self._fwd_fix = mne.convert_forward_solution(
                 fwd, surf_ori=True, force_fixed=False)
 
-        self._gain_matrix = fwd_fix['sol']['data']
+        self._set_operators(self._build_operators(mne_info.copy()))
 
-        self.logger.info('Computing SVD of the forward operator')
-        U, S, V = svd(self._gain_matrix)
+        channel_count = fwd['nsource']
+        channel_labels = ['vertex #{}'.format(i + 1)
+                          for i in range(channel_count)]
+        self.mne_info = mne.create_info(channel_labels, mne_info['sfreq'])
 
-        Sn = np.zeros([self.n_comp, V.shape[0]])
-        Sn[:self.n_comp, :self.n_comp] = np.diag(S[:self.n_comp])
+    def _build_operators(self, mne_info):
+        """
+        Make the truncated SVD of the gain matrix and the MNE operator for
+        good channels of mne_info. Does not touch the node so that it can
+        run in a worker thread.
 
-        self.Un = U[:, :self.n_comp]
-        self.A_non_ori = Sn @ V
-        # ---------------------------------------------------- #
+        """
+        fwd_fix = self._fwd_fix
+        # -------- truncated svd for fwd_opr operator -------- #
+        row_names = fwd_fix['sol']['row_names']
+        rows = [i for i, ch_name in enumerate(row_names)
+                if ch_name not in mne_info['bads']]
+        gain_matrix = fwd_fix['sol']['data'][rows]
+        good_channel_picks = np.array(
+            [mne_info['ch_names'].index(row_names[i]) for i in rows])
 
-        # -------- leadfield dims -------- #
-        N_SEN = self._gain_matrix.shape[0]
-        # -------------------------------- #
+        self.logger.info('Computing SVD of the forward operator')
+        U, S, V = svd(gain_matrix, full_matrices=False)
+
+        Un = U[:, :self.n_comp]
+        A_non_ori = S[:self.n_comp, np.newaxis] * V[:self.n_comp]
+        # ---------------------------------------------------- #
 
         # ------------------------ noise-covariance ------------------------ #
-        cov_data = np.identity(N_SEN)
-        ch_names = np.array(mne_info['ch_names'])[mne.pick_types(mne_info,
-                                                                 eeg=True,
-                                                                 meg=False)]
-        ch_names = list(ch_names)
+        # Bad channels are dropped by the inverse operator
+        cov_data = np.identity(len(row_names))
         noise_cov = mne.Covariance(
-                cov_data, ch_names, mne_info['bads'],
+                cov_data, row_names, mne_info['bads'],
                 mne_info['projs'], nfree=1)
         # ------------------------------------------------------------------ #
 
-        self.mne_inv = mne_make_inverse_operator(
+        mne_inv = mne_make_inverse_operator(
                 mne_info, fwd_fix, noise_cov, depth=0.8,
                 loose=1, fixed=False, verbose='ERROR')
-        self._mne_info = mne_info
-        self.Sn = Sn
-        self.V = V
-        channel_count = fwd['nsource']
-        channel_labels = ['vertex #{}'.format(i + 1)
-                          for i in range(channel_count)]
-        self.mne_info = mne.create_info(channel_labels, mne_info['sfreq'])
+        # MNE solution is only used to get the orientations
+        inverse_operator = prepare_inverse_operator(
+            mne_inv, nave=1, lambda2=1, method='MNE')
+        kernel, _, kernel_picks, _ = get_inverse_kernel(
+            inverse_operator, mne_info, 'MNE')
+
+        mce_solver = MCESolver(A_non_ori, solver=self.solver)
+        return (gain_matrix, Un, A_non_ori, good_channel_picks, mne_inv,
+                kernel, kernel_picks, mce_solver, mne_info)
+
+    def _set_operators(self, operators):
+        (self._gain_matrix, self.Un, self.A_non_ori,
+         self._good_channel_picks, self.mne_inv, self._kernel,
+         self._kernel_picks, self._mce_solver, self._mne_info) = operators
+
+    def _shutdown_rebuild_executor(self):
+        if self._operators_rebuild is not None:
+            # A rebuild that has already started cannot be cancelled, but
+            # its result is never used and the worker exits after it
+            self._operators_rebuild.cancel()
+            self._operators_rebuild = None
+        if self._rebuild_executor is not None:
+            self._rebuild_executor.shutdown(wait=False)
+            self._rebuild_executor = None
+
+    def stop(self):
+        self._shutdown_rebuild_executor()
 
     def _update(self):
-        input_array = self.parent.output
-        # last_slice = last_sample(input_array)
-        last_slice = np.mean(input_array, axis=1)
-        n_src = self.mne_inv['nsource']
+        mne_info = self.traverse_back_and_find('mne_info')
+        bads = mne_info['bads']
+        if bads != self._bad_channels and self._operators_rebuild is None:
+            # The old operators pick their channels by themselves and stay
+            # valid until the new ones are ready
+            self.logger.info('Found new bad channels {};'.format(bads) +
+                             'updating MCE operators in the background')
+            self._bad_channels = list(bads)
+            self._operators_rebuild = self._rebuild_executor.submit(
+                self._build_operators, mne_info.copy())
+
+        if (self._operators_rebuild is not None and
+                self._operators_rebuild.done()):
+            # Swap at the chunk boundary; raises if the rebuild failed
+            self._set_operators(self._operators_rebuild.result())
+            self._operators_rebuild = None
+            self.logger.info('Switched to the updated MCE operators')
+
+        input_array = make_time_dimension_second(self.parent.output)
         n_times = input_array.shape[1]
-        output_mce = np.empty([n_src, n_times])
 
-        raw_slice = mne.io.RawArray(np.expand_dims(last_slice, axis=1),
-                                    self._mne_info, verbose='ERROR')
-        raw_slice.pick_types(eeg=True, meg=False, stim=False, exclude='bads')
-        raw_slice.set_eeg_reference(ref_channels='average', projection=True)
+        # ---------------------- split into windows ------------------------ #
+        if self.samples_per_solve is None:
+            window_starts = np.array([0])
+        else:
+            window_starts = np.arange(0, n_times, self.samples_per_solve)
+        window_lengths = np.diff(np.r_[window_starts, n_times])
+        window_means = (np.add.reduceat(input_array, window_starts, axis=1) /
+                        window_lengths)
+        # ----------------------------------------------------------------- #
 
         # ------------------- get dipole orientations --------------------- #
-        stc_slice = apply_inverse_raw(raw_slice, self.mne_inv,
-                                      pick_ori='vector',
-                                      method='MNE', lambda2=1, verbose='ERROR')
-        Q = normalize(stc_slice.data[:, :, 0])  # dipole orientations
+        chunk_mean = np.mean(input_array, axis=1)
+        sources = self._kernel.dot(chunk_mean[self._kernel_picks])
+        Q = normalize(sources.reshape([-1, 3]))  # dipole orientations
+        self._mce_solver.set_orientations(Q)
         # ----------------------------------------------------------------- #
 
-        # -------- setup linprog params -------- #
-        n_sen = self.A_non_ori.shape[0]
-        A_eq = np.empty([n_sen, n_src])
-        for i in range(n_src):
-            A_eq[:, i] = self.A_non_ori[:, i * 3: (i + 1) * 3] @ Q[i, :].T
-        data_slice = raw_slice.get_data()[:, 0]
-        b_eq = self.Un.T @ data_slice
-        c = np.ones(A_eq.shape[1])
-        # -------------------------------------- #
-
-        with nostdout():
-            sol = linprog(c, A_eq=A_eq, b_eq=b_eq,
-                          method='interior-point', bounds=(0, None),
-                          options={'disp': False})
-        output_mce[:, :] = sol.x[:, np.newaxis]
-
-        self.output = output_mce
-        self.sol = sol
-        return Q, A_eq, data_slice, b_eq, c
+        t1 = time.time()
+        b_eq = self.Un.T.dot(window_means[self._good_channel_picks])
+        solution = self._mce_solver.solve(b_eq)
+        t2 = time.time()
+        self.logger.debug(
+            'Solved {} MCE problems in {:.1f} ms'.format(
+                b_eq.shape[1], (t2 - t1) * 1000))
+
+        self.output = put_time_dimension_back_from_second(
+            np.repeat(solution, window_lengths, axis=1))
 
     def _on_input_history_invalidation(self):
         # The methods implemented in this node do not rely on past inputs
@@ -767,6 +1458,17 @@ class MCE(ProcessorNode):
                 raise ValueError(
                     'snr (signal-to-noise ratio) must be a positive number.')
 
+        if key == 'solver':
+            if value not in MCESolver.SUPPORTED_SOLVERS:
+                raise ValueError(
+                    'Solver {} is not supported.'.format(value) +
+                    ' Use one of: {}'.format(MCESolver.SUPPORTED_SOLVERS))
+
+        if key == 'samples_per_solve':
+            if value is not None and value < 1:
+                raise ValueError(
+                    'samples_per_solve must be a positive integer or None.')
+
 
 class ICARejection(ProcessorNode):
 
@@ -819,6 +1521,21 @@ class ICARejection(ProcessorNode):
         self._samples_collected = 0
         self._enough_collected = False
 
+    def _get_state(self):
+        # Collected data are of no use until the ICA has been fitted
+        if self._ica_rejector is None:
+            return dict()
+        return {'ica_rejector': self._ica_rejector}
+
+    def _set_state(self, state):
+        n_good_channels = len(self._good_ch_inds)
+        if state['ica_rejector'].shape != (n_good_channels, n_good_channels):
+            raise ValueError('Saved ICA is for a different number of '
+                             'channels')
+        self._ica_rejector = state['ica_rejector']
+        self._samples_collected = self._samples_to_be_collected
+        self._enough_collected = True
+
     def _update(self):
         # Have we collected enough samples without the new input?
         self.output = self.parent.output
@@ -1108,22 +1825,36 @@ class Coherence(ProcessorNode):
         Connectivity method
     seed: int (default None)
         Seed index
+    lowest_frequency: float (default 8)
+        Lowest frequency of the signals in Hz. Lower frequencies need
+        a longer Hilbert transformer, which lags by 2 / lowest_frequency
+        seconds.
 
     """
-    CHANGES_IN_THESE_REQUIRE_RESET = ()
-    UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ()
+    CHANGES_IN_THESE_REQUIRE_RESET = ('lowest_frequency', )
+    UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ('mne_info', )
+    SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {
+        'mne_info': lambda info: (info['nchan'], info['sfreq'])}
 
-    def __init__(self, method='imcoh', seed=None):
+    def __init__(self, method='imcoh', seed=None, lowest_frequency=8):
         ProcessorNode.__init__(self)
         self.method = method
         self.seed = seed
+        self.lowest_frequency = lowest_frequency
+        self._hilbert = None  # type: StreamingHilbert
 
     def _initialize(self):
-        pass
+        mne_info = self.traverse_back_and_find('mne_info')
+        self._hilbert = StreamingHilbert(
+            n_channels=mne_info['nchan'],
+            n_taps=StreamingHilbert.n_taps_for(mne_info['sfreq'],
+                                               self.lowest_frequency))
+        self._hilbert.apply = pynfb_ndarray_function_wrapper(
+            self._hilbert.apply)
 
     def _update(self):
         input_data = self.parent.output
-        hilbert = sc.signal.hilbert(input_data, axis=1)
+        hilbert = make_time_dimension_second(self._hilbert.apply(input_data))
         if self.seed is None:
             Cp = hilbert.dot(hilbert.conj().T)
             D = np.sqrt(np.diag(Cp))
@@ -1141,13 +1872,18 @@ class Coherence(ProcessorNode):
             self.output = np.abs(coh)
 
     def _reset(self):
-        pass
+        self._should_reinitialize = True
+        self.initialize()
+        output_history_is_no_longer_valid = True
+        return output_history_is_no_longer_valid
 
     def _on_input_history_invalidation(self):
-        pass
+        self._hilbert.reset()
 
     def _check_value(self, key, value):
-        pass
+        if key == 'lowest_frequency':
+            if value <= 0:
+                raise ValueError('lowest_frequency must be positive')
 
 
 class MneGcs(InverseModel):
@@ -1,17 +1,27 @@
 import os
 import time
+from types import SimpleNamespace
 
 import pylsl as lsl
 import numpy as np
 import mne
+import tables
 
-from cognigraph.utils.matrix_functions import get_a_time_slice
-from .. import TIME_AXIS, DTYPE
+from cognigraph.utils.matrix_functions import (
+    get_a_time_slice, interpolate_in_time, make_time_dimension_second,
+    put_time_dimension_back_from_second)
+from .. import TIME_AXIS, DTYPE, MISC_CHANNEL_TYPE
 from .node import SourceNode
-from ..utils.lsl import (convert_lsl_chunk_to_numpy_array,
+from ..utils.latency import local_clock
+from ..utils.lsl import (NUMERIC_LSL_FORMATS_TO_NUMPY, LSLInletReader,
+                         pull_lsl_chunk_into_buffer,
                          read_channel_labels_from_info)
 from ..utils.brainvision import (read_brain_vision_data, read_fif_data,
-                                 read_edf_data)
+                                 read_edf_data, open_brain_vision_raw,
+                                 open_fif_raw, open_edf_raw, LazyRawData)
+from ..utils.recording_cache import RecordingCache
+from ..utils.synthetic import (SyntheticSignalGenerator, create_synthetic_info,
+                               read_fixed_orientation_gain)
 
 
 class FixedStreamInfo(lsl.StreamInfo):
@@ -29,20 +39,78 @@ class FixedStreamInlet(lsl.StreamInlet):
         return FixedStreamInfo(handle=result)  # StreamInfo(handle=result)
 
 
-class LSLStreamSource(SourceNode):
-    """ Class for reading data from an LSL stream defined by its name """
+def resolve_lsl_stream(stream_name, timeout) -> lsl.StreamInfo:
+    """Info of the only numeric LSL stream with the name"""
+    stream_infos = lsl.resolve_byprop('name', stream_name, timeout=timeout)
+    if len(stream_infos) == 0:
+        raise ValueError(
+            'Cannot find LSL stream with name {}'.format(stream_name))
+    elif len(stream_infos) > 1:
+        raise ValueError(
+            'Multiple LSL streams with name {}.'.format(stream_name))
+    info = stream_infos[0]
+    if info.channel_format() not in NUMERIC_LSL_FORMATS_TO_NUMPY:
+        raise ValueError(
+            'LSL stream {} is not numeric.'.format(stream_name))
+    return info
+
 
-    CHANGES_IN_THESE_REQUIRE_RESET = ('source_name',)
+class LSLStreamSource(SourceNode):
+    """
+    Class for reading data from an LSL stream defined by its name
+
+    Parameters
+    ----------
+    stream_name: str
+    use_reader_thread: bool
+        If False, the inlet is pulled in _update and chunk sizes depend on
+        how long the pipeline took since the last update.
+        If True, an LSLInletReader drains the inlet continuously in a
+        background thread and the timestamps of regularly sampled streams
+        are dejittered.
+    block_size: int | None
+        Only used with the reader thread. If set, each update outputs
+        all the whole blocks of block_size samples read so far or nothing
+        if fewer than block_size samples have been read. If None, all the
+        samples read since the last update are output.
+    buffer_seconds: float
+        Capacity of the reader ring buffer. Samples older than that which
+        have not been output are dropped and counted in
+        overrun_sample_count.
+
+    """
+
+    CHANGES_IN_THESE_REQUIRE_RESET = ('source_name', 'use_reader_thread',
+                                      'buffer_seconds')
 
     def _check_value(self, key, value):
-        pass
+        if key == 'block_size':
+            if value is not None and value <= 0:
+                raise ValueError('block_size must be positive or None')
+        elif key == 'buffer_seconds':
+            if value <= 0:
+                raise ValueError('buffer_seconds must be positive')
 
     SECONDS_TO_WAIT_FOR_THE_STREAM = 0.5
+    # The offset between the clocks of the stream and ours drifts slowly
+    SECONDS_BETWEEN_TIME_CORRECTIONS = 5
+    SECONDS_TO_WAIT_FOR_TIME_CORRECTION = 0.1
+
+    MAX_SAMPLES_IN_CHUNK = 1024
 
-    def __init__(self, stream_name=None):
+    def __init__(self, stream_name=None, use_reader_thread=False,
+                 block_size=None, buffer_seconds=10):
         super().__init__()
         self.source_name = stream_name
+        self.use_reader_thread = use_reader_thread
+        self.block_size = block_size
+        self.buffer_seconds = buffer_seconds
         self._inlet = None  # type: lsl.StreamInlet
+        self._buffer = None  # type: np.ndarray
+        self._reader = None  # type: LSLInletReader
+        self._reported_overrun_sample_count = 0
+        self._time_correction = 0.0
+        self._time_of_the_last_correction = None
 
     @property
     def stream_name(self):
@@ -56,54 +124,368 @@ class LSLStreamSource(SourceNode):
     def stream_name(self, stream_name):
         self.source_name = stream_name
 
+    @property
+    def overrun_sample_count(self):
+        """Number of samples dropped because the reader buffer overflowed"""
+        if self._reader is None:
+            return 0
+        return self._reader.overrun_sample_count
+
     def _initialize(self):
+        self.stop()
+        info = resolve_lsl_stream(
+            self.source_name, timeout=self.SECONDS_TO_WAIT_FOR_THE_STREAM)
+        # self._inlet = lsl.StreamInlet(info)
+        self._inlet = FixedStreamInlet(info)
+        self._inlet.open_stream()
+        frequency = info.nominal_srate()
+        self.dtype = DTYPE
+        channel_labels, channel_types = read_channel_labels_from_info(
+            self._inlet.info())
+        self.mne_info = mne.create_info(channel_labels, frequency,
+                                        ch_types=channel_types)
+        # liblsl writes the samples straight into this buffer
+        self._buffer = np.empty(
+            (self.MAX_SAMPLES_IN_CHUNK, info.channel_count()),
+            dtype=NUMERIC_LSL_FORMATS_TO_NUMPY[info.channel_format()])
+        self._time_correction = 0.0
+        self._time_of_the_last_correction = None
+        self._reported_overrun_sample_count = 0
+        if self.use_reader_thread:
+            self._reader = LSLInletReader(
+                self._inlet, info,
+                max_samples_in_chunk=self.MAX_SAMPLES_IN_CHUNK,
+                buffer_seconds=self.buffer_seconds, dejitter=True)
+            self._reader.start()
+
+    def stop(self):
+        """Stop the reader thread if there is one"""
+        if self._reader is not None:
+            self._reader.stop()
+            self._reader = None
 
-        stream_infos = lsl.resolve_byprop(
-            'name', self.source_name,
-            timeout=self.SECONDS_TO_WAIT_FOR_THE_STREAM)
-        if len(stream_infos) == 0:
-            raise ValueError(
-                'Cannot find LSL stream with name {}'.format(self.source_name))
-        elif len(stream_infos) > 1:
-            raise ValueError(
-                'Multiple LSL streams with name {}.'.format(self.source_name))
+    def _update(self):
+        if self._reader is not None:
+            self._update_from_reader()
+            return
+
+        # The output is a view of the buffer until the next update
+        chunk, timestamps = pull_lsl_chunk_into_buffer(self._inlet,
+                                                       self._buffer)
+        if chunk.dtype == self.dtype:
+            self.output = chunk
         else:
-            info = stream_infos[0]
-            # self._inlet = lsl.StreamInlet(info)
-            self._inlet = FixedStreamInlet(info)
-            self._inlet.open_stream()
-            frequency = info.nominal_srate()
-            self.dtype = DTYPE
-            channel_labels, channel_types = read_channel_labels_from_info(
-                self._inlet.info())
-            self.mne_info = mne.create_info(channel_labels, frequency,
-                                            ch_types=channel_types)
+            self.output = chunk.astype(self.dtype)
+        if len(timestamps) > 0:
+            # Map the stream clock onto ours
+            self.timestamps = (np.array(timestamps) +
+                               self._get_time_correction())
+
+    def _update_from_reader(self):
+        if self._reader.error is not None:
+            raise self._reader.error
+        chunk, timestamps = self._reader.take(self.block_size)
+        self.output = chunk.astype(self.dtype, copy=False)
+        if len(timestamps) > 0:
+            self.timestamps = timestamps
+
+        overrun_sample_count = self._reader.overrun_sample_count
+        if overrun_sample_count > self._reported_overrun_sample_count:
+            self.logger.warning(
+                'Reader buffer overrun: {} samples dropped, {} in total'
+                .format(overrun_sample_count -
+                        self._reported_overrun_sample_count,
+                        overrun_sample_count))
+            self._reported_overrun_sample_count = overrun_sample_count
+
+    def _get_time_correction(self):
+        now = lsl.local_clock()
+        if (self._time_of_the_last_correction is None or
+                now - self._time_of_the_last_correction >=
+                self.SECONDS_BETWEEN_TIME_CORRECTIONS):
+            try:
+                self._time_correction = self._inlet.time_correction(
+                    timeout=self.SECONDS_TO_WAIT_FOR_TIME_CORRECTION)
+                self._time_of_the_last_correction = now
+            # Older pylsl versions raise their own RuntimeError subclass
+            except (TimeoutError, RuntimeError):
+                self.logger.debug('Time correction timed out. '
+                                  'Using the previous value')
+        return self._time_correction
+
+
+class MultiStreamLSLSource(SourceNode):
+    """
+    Merges several LSL streams (e.g. EEG and EMG or an eye tracker) into one.
+
+    Each stream is pulled by an LSLInletReader in its own thread. The first
+    stream is the main one: the output has its sampling rate and timestamps
+    and the other streams are linearly interpolated onto those timestamps
+    after their clocks have been corrected to ours. Samples of the main
+    stream wait until every other stream has caught up with them but no
+    longer than MAX_SECONDS_TO_WAIT; after that the missing samples are
+    filled with the last ones received.
+
+    Channels of the main stream keep their types, those of the other
+    streams are typed after the stream type (e.g. 'EMG' -> 'emg') or
+    get MISC_CHANNEL_TYPE. Repeated channel names get the stream name
+    appended.
+
+    Parameters
+    ----------
+    stream_names: tuple of str
+        Names of the streams, the main one first
+
+    """
+    CHANGES_IN_THESE_REQUIRE_RESET = ('stream_names', )
+
+    SECONDS_TO_WAIT_FOR_THE_STREAM = 0.5
+    MAX_SECONDS_TO_WAIT = 0.5
+    MAX_SAMPLES_IN_CHUNK = 1024
+    CHANNEL_TYPES_BY_STREAM_TYPE = {'EEG': 'eeg', 'EMG': 'emg', 'EOG': 'eog',
+                                    'ECG': 'ecg', 'MEG': 'mag'}
+
+    def __init__(self, stream_names=()):
+        super().__init__()
+        self.stream_names = tuple(stream_names)
+        self._readers = []  # type: list[LSLInletReader]
+        # Samples read but not output yet: (CHANNELS x TIME, timestamps)
+        self._pending = []
+
+    @property
+    def source_name(self):
+        return '+'.join(self.stream_names)
+
+    @property
+    def frequency(self):
+        return self.mne_info['sfreq']
+
+    def _initialize(self):
+        self.stop()
+        if len(self.stream_names) == 0:
+            raise ValueError('No stream names were given')
+
+        self.dtype = DTYPE
+        channel_labels = []
+        channel_types = []
+        self._pending = []
+        for i, stream_name in enumerate(self.stream_names):
+            info = resolve_lsl_stream(
+                stream_name, timeout=self.SECONDS_TO_WAIT_FOR_THE_STREAM)
+            inlet = FixedStreamInlet(info)
+            inlet.open_stream()
+            self._readers.append(LSLInletReader(
+                inlet, info, max_samples_in_chunk=self.MAX_SAMPLES_IN_CHUNK))
+
+            labels, types = read_channel_labels_from_info(inlet.info())
+            if i == 0:
+                frequency = info.nominal_srate()
+            else:
+                types = [self.CHANNEL_TYPES_BY_STREAM_TYPE.get(
+                    info.type().upper(), MISC_CHANNEL_TYPE)] * len(labels)
+            channel_labels.extend(
+                label if label not in channel_labels
+                else '{} ({})'.format(label, stream_name) for label in labels)
+            channel_types.extend(types)
+            self._pending.append(
+                (np.empty((info.channel_count(), 0)), np.empty(0)))
+
+        self.mne_info = mne.create_info(channel_labels, frequency,
+                                        ch_types=channel_types)
+        for reader in self._readers:
+            reader.start()
+
+    def stop(self):
+        """Stop the reader threads"""
+        for reader in self._readers:
+            reader.stop()
+        self._readers = []
 
     def _update(self):
-        lsl_chunk, timestamps = self._inlet.pull_chunk()
-        self.output = convert_lsl_chunk_to_numpy_array(lsl_chunk,
-                                                       dtype=self.dtype)
+        # Main samples older than this are output now whatever the other
+        # streams have, so the other streams need not keep anything older
+        # except the sample used to interpolate onto the cutoff
+        cutoff = local_clock() - self.MAX_SECONDS_TO_WAIT
+        for i, reader in enumerate(self._readers):
+            if reader.error is not None:
+                raise reader.error
+            data, timestamps = reader.take()
+            pending_data, pending_timestamps = self._pending[i]
+            pending_data = np.concatenate(
+                (pending_data, make_time_dimension_second(data)), axis=1)
+            pending_timestamps = np.concatenate(
+                (pending_timestamps, timestamps))
+            if i > 0:
+                first_to_keep = max(
+                    np.searchsorted(pending_timestamps, cutoff) - 1, 0)
+                pending_data = pending_data[:, first_to_keep:]
+                pending_timestamps = pending_timestamps[first_to_keep:]
+            self._pending[i] = (pending_data, pending_timestamps)
+
+        main_data, main_timestamps = self._pending[0]
+        # Main samples are ready when all the streams have caught up
+        # with them or when they have waited for too long
+        caught_up_to = min(
+            [timestamps[-1] if len(timestamps) > 0 else -np.inf
+             for _, timestamps in self._pending[1:]] + [np.inf])
+        ready_up_to = max(caught_up_to, cutoff)
+        n_ready = np.searchsorted(main_timestamps, ready_up_to, side='right')
+        if n_ready == 0:
+            return
+
+        timestamps = main_timestamps[:n_ready]
+        merged = [main_data[:, :n_ready]]
+        self._pending[0] = (main_data[:, n_ready:],
+                            main_timestamps[n_ready:])
+        for i, (data, stream_timestamps) in enumerate(self._pending[1:], 1):
+            if len(stream_timestamps) == 0:
+                merged.append(np.zeros((data.shape[0], n_ready)))
+                continue
+            merged.append(interpolate_in_time(data, stream_timestamps,
+                                              timestamps))
+            # Keep the sample before the last timestamp for the next time
+            first_to_keep = max(np.searchsorted(
+                stream_timestamps, timestamps[-1]) - 1, 0)
+            self._pending[i] = (data[:, first_to_keep:],
+                                stream_timestamps[first_to_keep:])
+
+        self.output = put_time_dimension_back_from_second(
+            np.concatenate(merged).astype(self.dtype))
+        self.timestamps = timestamps
+
+    def _check_value(self, key, value):
+        pass
+
+
+class _TimedSourceNode(SourceNode):
+    """
+    Base class for sources that produce data at a pace of their own choice
+    rather than when it arrives. See FileSource for the replay modes.
+
+    """
+    MAX_SAMPLES_IN_CHUNK = 1024
+
+    REPLAY_MODES = SimpleNamespace(
+        REAL_TIME='Real time', ACCELERATED='Accelerated',
+        AS_FAST_AS_POSSIBLE='As fast as possible')
+
+    def __init__(self, replay_mode=REPLAY_MODES.REAL_TIME, speed=1,
+                 chunk_size=MAX_SAMPLES_IN_CHUNK):
+        super().__init__()
+        self.replay_mode = replay_mode
+        self.speed = speed
+        self.chunk_size = chunk_size
+
+        self._time_of_the_last_update = None
+        # Fraction of a sample left unread in the timed modes
+        self._samples_owed = 0
+
+    def _reset_timing(self):
+        self._time_of_the_last_update = None
+        self._samples_owed = 0
+
+    def _count_samples_to_read(self):
+        """Number of samples to output on this update, None at first"""
+        if self.replay_mode == self.REPLAY_MODES.AS_FAST_AS_POSSIBLE:
+            return self.chunk_size
+        return self._count_samples_recorded_since_last_update()
 
+    def _count_samples_recorded_since_last_update(self):
+        """Number of samples to read in the timed modes, None at first"""
+        current_time = time.time()
+        if self._time_of_the_last_update is None:
+            self._time_of_the_last_update = current_time
+            return None
+
+        seconds_since_last_update = (current_time -
+                                     self._time_of_the_last_update)
+        self._time_of_the_last_update = current_time
+        if self.replay_mode == self.REPLAY_MODES.ACCELERATED:
+            seconds_since_last_update *= self.speed
+        frequency = self.mne_info['sfreq']
+
+        # How many samples we would like to read. Fractions of a sample are
+        # carried over so that the playback does not lag behind the clock.
+        self._samples_owed += seconds_since_last_update * frequency
+        samples_to_read = int(self._samples_owed)
+        self._samples_owed -= samples_to_read
+        # Lower it to amount we can process in a reasonable amount of time
+        return min(samples_to_read, self.MAX_SAMPLES_IN_CHUNK)
 
-class FileSource(SourceNode):
+    def _check_value(self, key, value):
+        if key == 'replay_mode':
+            replay_modes = tuple(self.REPLAY_MODES.__dict__.values())
+            if value not in replay_modes:
+                raise ValueError(
+                    'Replay mode {} is not supported.'.format(value) +
+                    ' Use one of: {}'.format(replay_modes))
+
+        if key == 'speed':
+            if value <= 0:
+                raise ValueError('speed must be positive')
+
+        if key == 'chunk_size':
+            if value < 1:
+                raise ValueError('chunk_size must be a positive integer')
+
+
+class FileSource(_TimedSourceNode):
+    """
+    Plays a recording back.
+
+    Parameters
+    ----------
+    file_path: str
+        Path to a BrainVision, fif or EDF file
+    lazy: bool
+        If True, the file is not loaded into memory: each chunk is read
+        from the file when it is needed, so that the memory use does not
+        depend on the recording length. If False, the whole recording is
+        read at initialization.
+    replay_mode: str
+        One of REPLAY_MODES.
+        REAL_TIME reads as many samples as have been recorded since the
+        last update.
+        ACCELERATED does the same as if time ran speed times faster.
+        AS_FAST_AS_POSSIBLE reads chunk_size samples on every update
+        regardless of time, so that the chunks and thus the outputs of
+        the pipeline are the same for every run.
+        The first two read at most MAX_SAMPLES_IN_CHUNK samples at a time.
+    speed: float
+        How many times faster than real time ACCELERATED mode is
+    chunk_size: int
+        Number of samples in each chunk in AS_FAST_AS_POSSIBLE mode
+    use_cache: bool
+        If True, the decoded recording is saved to the RecordingCache
+        on the first initialization and memory-mapped from there on the
+        next ones instead of being parsed again. Filling the cache reads
+        the whole recording once, so it is off by default.
+
+    """
     SUPPORTED_EXTENSIONS = {'Brainvision': ('.vhdr', '.eeg', '.vmrk'),
                             'MNE-python': ('.fif',),
                             'European Data Format': ('.edf',)}
 
-    CHANGES_IN_THESE_REQUIRE_RESET = ('source_name', )
+    CHANGES_IN_THESE_REQUIRE_RESET = ('source_name', 'lazy', 'use_cache')
 
-    MAX_SAMPLES_IN_CHUNK = 1024
+    REPLAY_MODES = _TimedSourceNode.REPLAY_MODES
 
-    def __init__(self, file_path=None):
-        super().__init__()
+    def __init__(self, file_path=None, lazy=False,
+                 replay_mode=REPLAY_MODES.REAL_TIME, speed=1,
+                 chunk_size=_TimedSourceNode.MAX_SAMPLES_IN_CHUNK,
+                 use_cache=False):
+        super().__init__(replay_mode=replay_mode, speed=speed,
+                         chunk_size=chunk_size)
         self.source_name = None
         self._file_path = None
         self.file_path = file_path  # This will also populate self.source_name
+        self.lazy = lazy
+        self.use_cache = use_cache
+        self.cache = RecordingCache()
         self.data = None  # type: np.ndarray
         self.loop_the_file = False
         self.is_alive = True
 
-        self._time_of_the_last_update = None
         self._samples_already_read = None
 
     @property
@@ -132,24 +514,25 @@ class FileSource(SourceNode):
                 self.source_name = file_name
 
     def _initialize(self):
-        self._time_of_the_last_update = None
+        self._reset_timing()
         self._samples_already_read = 0
+        self.is_alive = True
 
         if self.file_path is not None:
             basename = os.path.basename(self.file_path)
             _, ext = os.path.splitext(basename)
 
             if ext in self.SUPPORTED_EXTENSIONS['Brainvision']:
-                self.data, self.mne_info = read_brain_vision_data(
-                        file_path=self.file_path, time_axis=TIME_AXIS)
+                read_data = read_brain_vision_data
+                open_raw = open_brain_vision_raw
 
             elif ext in self.SUPPORTED_EXTENSIONS['MNE-python']:
-                self.data, self.mne_info = read_fif_data(
-                        file_path=self.file_path, time_axis=TIME_AXIS)
+                read_data = read_fif_data
+                open_raw = open_fif_raw
 
             elif ext in self.SUPPORTED_EXTENSIONS['European Data Format']:
-                self.data, self.mne_info = read_edf_data(
-                        file_path=self.file_path, time_axis=TIME_AXIS)
+                read_data = read_edf_data
+                open_raw = open_edf_raw
 
             else:
                 raise ValueError(
@@ -158,48 +541,239 @@ class FileSource(SourceNode):
                             self.SUPPORTED_EXTENSIONS.values()))
 
             self.dtype = DTYPE
-            self.data = self.data.astype(self.dtype)
+            if self.use_cache:
+                self.data, self.mne_info = self.cache.load(
+                    self.file_path, time_axis=TIME_AXIS)
+                if self.data is not None and self.data.dtype == self.dtype:
+                    return
+
+            if self.lazy:
+                raw = open_raw(self.file_path, preload=False)
+                self.data = LazyRawData(raw, time_axis=TIME_AXIS,
+                                        dtype=self.dtype)
+                self.mne_info = raw.info.copy()
+            else:
+                self.data, self.mne_info = read_data(
+                    file_path=self.file_path, time_axis=TIME_AXIS)
+                self.data = self.data.astype(self.dtype)
+
+            if self.use_cache:
+                self.cache.save(self.file_path, self.data, self.mne_info,
+                                time_axis=TIME_AXIS)
 
     def _update(self):
         if self.data is None:
             return
 
-        current_time = time.time()
+        samples_to_read = self._count_samples_to_read()
+        if samples_to_read is None:
+            return
 
-        if self._time_of_the_last_update is not None:
+        # have to read samples_to_read samples unless we hit the end
+        samples_in_data = self.data.shape[TIME_AXIS]
+        stop_idx = self._samples_already_read + samples_to_read
+        self.output = get_a_time_slice(
+            self.data, start_idx=self._samples_already_read,
+            stop_idx=stop_idx)
+        actual_samples_in_chunk = self.output.shape[TIME_AXIS]
+        self._samples_already_read = (self._samples_already_read +
+                                      actual_samples_in_chunk)
+
+        # If we do hit the end we need to either start again or
+        # stop completely depending on loop_the_file
+        if self._samples_already_read == samples_in_data:
+            if self.loop_the_file is True:
+                self._samples_already_read = 0
+            else:
+                self.is_alive = False
+
+
+class SyntheticSource(_TimedSourceNode):
+    """
+    Generates deterministic synthetic data with SyntheticSignalGenerator,
+    e.g. to benchmark pipelines without a device or a recording.
+
+    Parameters
+    ----------
+    n_channels: int
+        Number of EEG channels. Ignored if forward_model_path is given.
+    sfreq: float
+    replay_mode, speed, chunk_size:
+        Pacing of the data as in FileSource. Use ACCELERATED to drive a
+        pipeline faster than real time.
+    forward_model_path: str | None
+        If given, the dipoles are picked from the source space of this
+        forward model and the channels are those of the model
+    n_dipoles: int
+    noise_std: float
+        Standard deviation of the sensor noise relative to the dipole
+        activity
+    seed: int
+        The same seed gives the same data on every initialization
+
+    """
+    CHANGES_IN_THESE_REQUIRE_RESET = ('n_channels', 'sfreq',
+                                      'forward_model_path', 'n_dipoles',
+                                      'noise_std', 'seed')
+
+    REPLAY_MODES = _TimedSourceNode.REPLAY_MODES
+
+    def __init__(self, n_channels=32, sfreq=500,
+                 replay_mode=REPLAY_MODES.REAL_TIME, speed=1,
+                 chunk_size=_TimedSourceNode.MAX_SAMPLES_IN_CHUNK,
+                 forward_model_path=None, n_dipoles=2, noise_std=1, seed=0):
+        super().__init__(replay_mode=replay_mode, speed=speed,
+                         chunk_size=chunk_size)
+        self.n_channels = n_channels
+        self.sfreq = sfreq
+        self.forward_model_path = forward_model_path
+        self.n_dipoles = n_dipoles
+        self.noise_std = noise_std
+        self.seed = seed
+        self.generator = None  # type: SyntheticSignalGenerator
 
-            seconds_since_last_update = (current_time -
-                                         self._time_of_the_last_update)
-            self._time_of_the_last_update = current_time
-            frequency = self.mne_info['sfreq']
-
-            # How many sample we would like to read
-            max_samples_in_chunk = np.int64(seconds_since_last_update *
-                                            frequency)
-            # Lower it to amount we can process in a reasonable amount of time
-            max_samples_in_chunk = min(max_samples_in_chunk,
-                                       self.MAX_SAMPLES_IN_CHUNK)
-
-            # have to read max_samples_in_chunk samples unless we hit the end
-            samples_in_data = self.data.shape[TIME_AXIS]
-            stop_idx = self._samples_already_read + max_samples_in_chunk
-            self.output = get_a_time_slice(
-                self.data, start_idx=self._samples_already_read,
-                stop_idx=stop_idx)
-            actual_samples_in_chunk = self.output.shape[TIME_AXIS]
-            self._samples_already_read = (self._samples_already_read +
-                                          actual_samples_in_chunk)
-
-            # If we do hit the end we need to either start again or
-            # stop completely depending on loop_the_file
-            if self._samples_already_read == samples_in_data:
-                if self.loop_the_file is True:
-                    self._samples_already_read = 0
-                else:
-                    self.is_alive = False
+    @property
+    def source_name(self):
+        return 'Synthetic'
 
+    def _initialize(self):
+        self._reset_timing()
+        self.dtype = DTYPE
+        if self.forward_model_path is not None:
+            gain, self.mne_info = read_fixed_orientation_gain(
+                self.forward_model_path, self.sfreq)
         else:
-            self._time_of_the_last_update = current_time
+            gain = None
+            self.mne_info = create_synthetic_info(self.n_channels,
+                                                  self.sfreq)
+        self.generator = SyntheticSignalGenerator(
+            self.n_channels, self.sfreq, gain=gain, n_dipoles=self.n_dipoles,
+            noise_std=self.noise_std, seed=self.seed)
+
+    def _update(self):
+        samples_to_read = self._count_samples_to_read()
+        if samples_to_read is None:
+            return
+        self.output = self.generator.generate(samples_to_read)
 
     def _check_value(self, key, value):
-        pass
+        super()._check_value(key, value)
+
+        if key in ('n_channels', 'n_dipoles'):
+            if value < 1:
+                raise ValueError('{} must be a positive integer'.format(key))
+
+        if key == 'sfreq':
+            if value <= 0:
+                raise ValueError('sfreq must be positive')
+
+
+class HDF5Source(_TimedSourceNode):
+    """
+    Plays back a recording made with FileOutput, e.g. to feed recorded
+    sensor-space or source-space outputs to other nodes without
+    recomputing them.
+
+    Chunks are read from the file when they are needed, so that the memory
+    use does not depend on the recording length. mne_info is assembled from
+    the channel names and types that FileOutput stores in arrays next to
+    the data and from the sampling rate in the attributes of the data.
+
+    Parameters
+    ----------
+    file_path: str
+        Path to a file written by FileOutput
+    replay_mode, speed, chunk_size:
+        Pacing of the playback as in FileSource
+
+    """
+    SUPPORTED_EXTENSIONS = {'HDF5': ('.h5', '.hdf5')}
+
+    CHANGES_IN_THESE_REQUIRE_RESET = ('file_path', )
+    # Source-space recordings have no sensor channels
+    SENSOR_CHANNEL_TYPES_REQUIRED = False
+
+    REPLAY_MODES = _TimedSourceNode.REPLAY_MODES
+
+    def __init__(self, file_path=None, replay_mode=REPLAY_MODES.REAL_TIME,
+                 speed=1, chunk_size=_TimedSourceNode.MAX_SAMPLES_IN_CHUNK):
+        super().__init__(replay_mode=replay_mode, speed=speed,
+                         chunk_size=chunk_size)
+        self.file_path = file_path
+        self.data = None  # type: tables.EArray
+        self.loop_the_file = False
+        self._file = None  # type: tables.File
+        self._samples_already_read = None
+
+    @property
+    def source_name(self):
+        if self.file_path in (None, ''):
+            return None
+        return os.path.splitext(os.path.basename(self.file_path))[0]
+
+    def _initialize(self):
+        self._reset_timing()
+        self._samples_already_read = 0
+        self.is_alive = True
+        self.close()
+
+        if self.file_path in (None, ''):
+            return
+        self._file = tables.open_file(self.file_path, mode='r')
+        self.data = self._file.root.data  # CHANNELS x TIME
+        root = self._file.root
+        if ('sfreq' not in self.data.attrs or 'ch_names' not in root or
+                'ch_types' not in root):
+            raise ValueError(
+                '{} has no channel metadata. '.format(self.file_path) +
+                'It was written by an older version of FileOutput.')
+        self.dtype = DTYPE
+        ch_names, ch_types = (
+            [label.decode('utf-8') for label in array.read()]
+            for array in (root.ch_names, root.ch_types))
+        self.mne_info = mne.create_info(
+            ch_names, float(self.data.attrs.sfreq), ch_types=ch_types)
+
+    def close(self):
+        """Close the file if it is open"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self.data = None
+
+    def stop(self):
+        self.close()
+
+    def _update(self):
+        if self.data is None:
+            return
+
+        samples_to_read = self._count_samples_to_read()
+        if samples_to_read is None:
+            return
+
+        samples_in_data = self.data.shape[1]
+        stop_idx = min(self._samples_already_read + samples_to_read,
+                       samples_in_data)
+        # Only this slice is read from the file
+        chunk = self.data[:, self._samples_already_read:stop_idx]
+        self.output = put_time_dimension_back_from_second(
+            chunk.astype(self.dtype))
+        self._samples_already_read = stop_idx
+
+        if self._samples_already_read == samples_in_data:
+            if self.loop_the_file is True:
+                self._samples_already_read = 0
+            else:
+                self.is_alive = False
+
+    def _check_value(self, key, value):
+        super()._check_value(key, value)
+
+        if key == 'file_path' and value not in (None, ''):
+            extension = os.path.splitext(value)[1]
+            if extension not in self.SUPPORTED_EXTENSIONS['HDF5']:
+                raise ValueError(
+                    'Cannot read {}. '.format(os.path.basename(value)) +
+                    'Extension must be one of: {}'.format(
+                        self.SUPPORTED_EXTENSIONS['HDF5']))
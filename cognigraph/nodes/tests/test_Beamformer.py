@@ -52,4 +52,105 @@ def test_update(beamformer):
 
 def test_check_value(beamformer):
     with pytest.raises(ValueError):
-        beamformer.reg = -1 # noqa
\ No newline at end of file
+        beamformer.reg = -1 # noqa
+
+
+def test_adaptive_weights_cadence(beamformer):
+    beamformer.update_weights_every_x_chunks = 2
+    beamformer.initialize()
+    n_chan = beamformer.parent.mne_info['nchan']
+    weights_before = beamformer._filters['weights'].copy()
+
+    beamformer.parent.output = np.random.rand(n_chan, 10)
+    beamformer.update()
+    assert np.array_equal(beamformer._filters['weights'], weights_before)
+
+    beamformer.parent.output = np.random.rand(n_chan, 10)
+    beamformer.update()
+    assert not np.array_equal(beamformer._filters['weights'], weights_before)
+    assert np.all(np.isfinite(beamformer.output))
+
+
+def test_spatial_filter_matches_mne(beamformer):
+    from mne.beamformer import apply_lcmv_raw
+    import mne
+    beamformer.is_adaptive = False
+    beamformer.initialize()
+    beam_info = beamformer._mne_info
+    data = np.random.rand(beam_info['nchan'], 10)
+    beamformer.parent.output = data
+    beamformer.update()
+
+    raw = mne.io.RawArray(data, beam_info, verbose='ERROR')
+    raw.pick_types(eeg=True, meg=False, stim=False, exclude='bads')
+    beamformer._filters['source_nn'] = []
+    stc = apply_lcmv_raw(raw=raw, filters=beamformer._filters,
+                         max_ori_out='signed')
+    np.testing.assert_allclose(beamformer.output, stc.data ** 2, rtol=1e-4)
+
+
+def forbid_reading_forward(*args, **kwargs):
+    raise AssertionError('Forward model was read again')
+
+
+def test_bads_change_keeps_covariance_and_forward(beamformer, monkeypatch):
+    beamformer.initialize()
+    n_chan = beamformer.parent.mne_info['nchan']
+    for _ in range(3):
+        beamformer.parent.output = np.random.rand(n_chan, 10)
+        beamformer.update()
+    fwd_surf = beamformer.fwd_surf
+    monkeypatch.setattr('cognigraph.nodes.processors.get_clean_forward',
+                        forbid_reading_forward)
+
+    mne_info = beamformer.traverse_back_and_find('mne_info')
+    new_bad = beamformer._filters['ch_names'][0]
+    mne_info['bads'] = mne_info['bads'] + [new_bad]
+    Rxx = beamformer._Rxx
+    beamformer.update()  # starts the rebuild and keeps the old filter
+    assert beamformer._Rxx is Rxx
+    covariance_map = beamformer._filters_rebuild.result()[4]
+
+    Rxx = Rxx.copy()
+    beamformer.parent.output = np.zeros([n_chan, 10])
+    beamformer.update()  # swaps the filter
+    assert beamformer._filters_rebuild is None
+    assert beamformer.fwd_surf is fwd_surf
+    assert new_bad not in beamformer._filters['ch_names']
+    # Tracked covariance is carried over, only forgetting is applied
+    alpha = beamformer._forgetting_factor_per_sample ** 10
+    np.testing.assert_allclose(
+        beamformer._Rxx,
+        alpha * covariance_map.dot(Rxx).dot(covariance_map.T))
+    assert np.all(np.isfinite(beamformer.output))
+
+
+def adaptive_beamformer_without_forward(n_channels, sfreq):
+    """Adaptive state as _initialize_adaptive_state leaves it"""
+    beamformer = Beamformer(is_adaptive=True, forgetting_factor_per_second=0.9)
+    beamformer._forgetting_factor_per_sample = 0.9 ** (1 / sfreq)
+    beamformer._sensor_transform = np.eye(n_channels)
+    G = np.random.RandomState(0).randn(n_channels, 3 * n_channels)
+    beamformer._Rxx = G.dot(G.T)
+    beamformer._outer_product = np.empty_like(beamformer._Rxx)
+    beamformer._samples = np.empty([n_channels, 0])
+    beamformer._resync_inverse_covariance()
+    return beamformer
+
+
+def test_woodbury_updates_keep_the_loading():
+    n_channels, sfreq = 20, 500
+    beamformer = adaptive_beamformer_without_forward(n_channels, sfreq)
+    rng = np.random.RandomState(1)
+    # Fewer updates than RESYNC_EVERY_X_COVARIANCE_UPDATES
+    for i in range(900):
+        scale = 1 if i < 450 else 5
+        beamformer._update_covariance_matrix(
+            scale * rng.randn(n_channels, 5))
+
+    Rxx = beamformer._Rxx.copy()
+    loading = beamformer.reg * np.trace(Rxx) / n_channels
+    Rxx.flat[::n_channels + 1] += loading
+    expected = np.linalg.inv(Rxx)
+    error = np.linalg.norm(beamformer._Rxx_inv - expected)
+    assert error < beamformer.MAX_LOADING_ERROR * np.linalg.norm(expected)
@@ -0,0 +1,70 @@
+import numpy as np
+from numpy.testing import assert_allclose
+from mne import create_info
+
+import pytest
+from cognigraph.nodes.processors import Coherence
+from cognigraph.nodes.sources import FileSource
+
+
+SFREQ = 500
+
+
+def create_dummy_info(nchan):
+    ch_names = ['ch{}'.format(i) for i in range(nchan)]
+    return create_info(ch_names, SFREQ, ch_types='eeg')
+
+
+@pytest.fixture
+def coherence():
+    coherence = Coherence(method='coh')
+    parent = FileSource()
+    parent.mne_info = create_dummy_info(4)
+    parent.output = np.random.randn(4, 100)
+    coherence.parent = parent
+    return coherence
+
+
+def test_coherence_of_shifted_sinusoids(coherence):
+    coherence.initialize()
+    t = np.arange(2 * SFREQ) / SFREQ
+    phases = np.array([0, 0.5, 1, 2])[:, np.newaxis]
+    data = np.sin(2 * np.pi * 20 * t + phases)
+    # The first chunk warms up the Hilbert transformer
+    coherence.parent.output = data[:, :SFREQ]
+    coherence.update()
+    coherence.parent.output = data[:, SFREQ:]
+    coherence.update()
+    assert coherence.output.shape == (4, 4)
+    assert_allclose(coherence.output, 1, atol=1e-3)
+
+    coherence.method = 'imcoh'
+    coherence.parent.output = data[:, SFREQ:]
+    coherence.update()
+    assert_allclose(np.diag(coherence.output), 0, atol=1e-10)
+    assert coherence.output[0, 2] != 0
+
+
+def test_hilbert_length_follows_sfreq_and_lowest_frequency(coherence):
+    coherence.initialize()
+    assert coherence._hilbert.n_taps == 4 * SFREQ // 8 + 1
+
+    coherence.lowest_frequency = 4
+    assert coherence._hilbert.n_taps == 4 * SFREQ // 4 + 1
+
+    coherence.parent.mne_info = create_info(
+        coherence.parent.mne_info['ch_names'], 2 * SFREQ, ch_types='eeg')
+    coherence.reset(is_input_hist_invalid=False)
+    assert coherence._hilbert.n_taps == 4 * 2 * SFREQ // 4 + 1
+
+
+def test_reinitialization_on_channel_count_change(coherence):
+    coherence.initialize()
+    coherence.update()
+    assert coherence.output.shape == (4, 4)
+
+    coherence.parent.mne_info = create_dummy_info(6)
+    coherence.parent.output = np.random.randn(6, 100)
+    coherence.reset(is_input_hist_invalid=False)
+    coherence.update()
+    assert coherence.output.shape == (6, 6)
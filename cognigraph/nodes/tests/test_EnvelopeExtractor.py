@@ -0,0 +1,52 @@
+import numpy as np
+from numpy.testing import assert_allclose
+from mne import create_info
+
+import pytest
+from cognigraph.nodes.processors import EnvelopeExtractor
+from cognigraph.nodes.sources import FileSource
+
+
+N_CHANNELS = 3
+SFREQ = 500
+
+
+@pytest.fixture
+def envelope_extractor():
+    envelope_extractor = EnvelopeExtractor(method='hilbert')
+    parent = FileSource()
+    ch_names = ['ch{}'.format(i) for i in range(N_CHANNELS)]
+    parent.mne_info = create_info(ch_names, SFREQ, ch_types='eeg')
+    parent.output = np.random.randn(N_CHANNELS, 50)
+    envelope_extractor.parent = parent
+    return envelope_extractor
+
+
+def test_check_method(envelope_extractor):
+    with pytest.raises(ValueError):
+        envelope_extractor.method = 'fft'
+
+
+def test_check_lowest_frequency(envelope_extractor):
+    with pytest.raises(ValueError):
+        envelope_extractor.lowest_frequency = 0
+
+
+@pytest.mark.parametrize('sfreq, frequency', [(SFREQ, 20), (1000, 8),
+                                              (1000, 13)])
+def test_hilbert_envelope_of_sinusoid(envelope_extractor, sfreq, frequency):
+    envelope_extractor.parent.mne_info['sfreq'] = sfreq
+    envelope_extractor.initialize()
+    amplitudes = np.array([1, 2, 0.5])[:, np.newaxis]
+    t = np.arange(2 * sfreq) / sfreq
+    data = amplitudes * np.sin(2 * np.pi * frequency * t)
+
+    envelope = []
+    for start in range(0, data.shape[1], 40):
+        envelope_extractor.parent.output = data[:, start:start + 40]
+        envelope_extractor.update()
+        envelope.append(envelope_extractor.output)
+    envelope = np.concatenate(envelope, axis=1)
+
+    assert envelope.shape == data.shape
+    assert_allclose(envelope[:, sfreq:] / amplitudes, 1, atol=0.004)
@@ -0,0 +1,85 @@
+import numpy as np
+from numpy.testing import assert_allclose
+
+import pytest
+from mne import create_info
+from cognigraph import TIME_AXIS
+from cognigraph.pipeline import Pipeline
+from cognigraph.nodes.outputs import FileOutput
+from cognigraph.nodes.sources import SyntheticSource, HDF5Source, FileSource
+
+
+@pytest.fixture
+def source():
+    return SyntheticSource(
+        n_channels=16, sfreq=500, chunk_size=100,
+        replay_mode=SyntheticSource.REPLAY_MODES.AS_FAST_AS_POSSIBLE)
+
+
+def test_round_trip(source, tmpdir):
+    file_path = str(tmpdir.join('output.h5'))
+    file_output = FileOutput(file_path, dtype='float32')
+    file_output.parent = source
+    source.chain_initialize()
+
+    chunks = []
+    for _ in range(10):
+        source.update()
+        chunks.append(source.output.copy())
+    file_output.stop()
+    assert file_output.backlog == 0
+
+    hdf5_source = HDF5Source(
+        file_path, chunk_size=1000,
+        replay_mode=HDF5Source.REPLAY_MODES.AS_FAST_AS_POSSIBLE)
+    hdf5_source.initialize()
+    hdf5_source.update()
+    hdf5_source.close()
+    assert hdf5_source.mne_info['ch_names'] == source.mne_info['ch_names']
+    assert hdf5_source.mne_info['sfreq'] == source.mne_info['sfreq']
+    assert_allclose(hdf5_source.output,
+                    np.concatenate(chunks, axis=TIME_AXIS))
+
+
+def test_headless_run_writes_everything(source, tmpdir):
+    file_path = str(tmpdir.join('output.h5'))
+    pipeline = Pipeline()
+    pipeline.source = source
+    pipeline.add_output(FileOutput(file_path))
+    runner = pipeline.run(max_ticks=200, report_every_x_seconds=None)
+
+    hdf5_source = HDF5Source(file_path)
+    hdf5_source.initialize()
+    assert hdf5_source.data.shape[1] == runner.samples_processed == 200 * 100
+    hdf5_source.close()
+
+
+def test_round_trip_of_source_space_labels(tmpdir):
+    # Together the labels of ico-4 vertices take more than the 64 KiB
+    # allowed for an HDF5 attribute
+    n_vertices = 5124
+    ch_names = ['vertex #{}'.format(i) for i in range(n_vertices)]
+    parent = FileSource()
+    parent.mne_info = create_info(ch_names, 500, ch_types='misc')
+    parent.output = np.random.randn(n_vertices, 10)
+    file_path = str(tmpdir.join('sources.h5'))
+    file_output = FileOutput(file_path, dtype='float64')
+    file_output.parent = parent
+    file_output.initialize()
+    file_output.update()
+    file_output.stop()
+
+    hdf5_source = HDF5Source(
+        file_path, replay_mode=HDF5Source.REPLAY_MODES.AS_FAST_AS_POSSIBLE)
+    hdf5_source.initialize()
+    hdf5_source.update()
+    hdf5_source.close()
+    assert hdf5_source.mne_info['ch_names'] == ch_names
+    assert_allclose(hdf5_source.output, parent.output)
+
+
+def test_check_value():
+    with pytest.raises(ValueError):
+        FileOutput(dtype='int16')
+    with pytest.raises(ValueError):
+        FileOutput(compression_level=10)
@@ -0,0 +1,96 @@
+import numpy as np
+from numpy.testing import assert_array_equal
+
+import pytest
+from mne import create_info
+from mne.io import RawArray
+from cognigraph import TIME_AXIS
+from cognigraph.nodes.sources import FileSource
+from cognigraph.utils.recording_cache import RecordingCache
+
+
+N_CHAN = 8
+N_TIMES = 1000
+
+
+@pytest.fixture
+def fif_file_path(tmpdir):
+    info = create_info([str(i) for i in range(N_CHAN)], 500, ch_types='eeg')
+    raw = RawArray(np.random.randn(N_CHAN, N_TIMES) * 1e-6, info,
+                   verbose='ERROR')
+    file_path = str(tmpdir.join('test_raw.fif'))
+    raw.save(file_path, verbose='ERROR')
+    return file_path
+
+
+def read_all_chunks(source):
+    chunks = []
+    while source.is_alive:
+        source.update()
+        chunks.append(source.output)
+    return chunks
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_as_fast_as_possible(fif_file_path, lazy):
+    source = FileSource(
+        fif_file_path, lazy=lazy, chunk_size=300, use_cache=False,
+        replay_mode=FileSource.REPLAY_MODES.AS_FAST_AS_POSSIBLE)
+    source.initialize()
+    chunks = read_all_chunks(source)
+
+    assert [chunk.shape[TIME_AXIS] for chunk in chunks] == [300] * 3 + [100]
+    data = np.concatenate(chunks, axis=TIME_AXIS)
+    assert data.shape[TIME_AXIS] == N_TIMES
+
+    # Replaying again gives the same chunks
+    source.initialize()
+    assert source.is_alive
+    for chunk, same_chunk in zip(chunks, read_all_chunks(source)):
+        assert_array_equal(chunk, same_chunk)
+
+
+def test_accelerated(fif_file_path):
+    source = FileSource(fif_file_path,
+                        replay_mode=FileSource.REPLAY_MODES.ACCELERATED,
+                        speed=1000, use_cache=False)
+    source.initialize()
+    source.update()  # starts the clock
+    assert source.output is None
+    source._time_of_the_last_update -= 0.001
+    source.update()
+    # 1 ms at 1000x speed is 1 s of data
+    assert source.output.shape[TIME_AXIS] >= 500
+
+
+def test_cache_is_off_by_default(fif_file_path, tmpdir):
+    source = FileSource(fif_file_path)
+    source.cache = RecordingCache(str(tmpdir.join('cache')))
+    source.initialize()
+    assert not tmpdir.join('cache').check()
+
+
+def test_cache(fif_file_path, tmpdir):
+    source = FileSource(
+        fif_file_path, chunk_size=300,
+        replay_mode=FileSource.REPLAY_MODES.AS_FAST_AS_POSSIBLE,
+        use_cache=True)
+    source.cache = RecordingCache(str(tmpdir.join('cache')))
+    source.initialize()
+    assert not isinstance(source.data, np.memmap)
+    chunks = read_all_chunks(source)
+
+    source.initialize()
+    assert isinstance(source.data, np.memmap)
+    assert source.mne_info['ch_names'] == [str(i) for i in range(N_CHAN)]
+    for chunk, cached_chunk in zip(chunks, read_all_chunks(source)):
+        assert_array_equal(chunk, cached_chunk)
+
+
+def test_check_value():
+    with pytest.raises(ValueError):
+        FileSource(replay_mode='Backwards')
+    with pytest.raises(ValueError):
+        FileSource(speed=0)
+    with pytest.raises(ValueError):
+        FileSource(chunk_size=0)
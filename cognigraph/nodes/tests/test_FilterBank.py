@@ -0,0 +1,89 @@
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from mne import create_info
+
+import pytest
+from cognigraph.nodes.processors import FilterBank, BandSelector
+from cognigraph.nodes.sources import FileSource
+
+
+N_CHANNELS = 4
+SFREQ = 250
+BANDS = {'alpha': (8, 12), 'beta': (13, 30)}
+
+
+@pytest.fixture
+def filter_bank():
+    filter_bank = FilterBank(bands=dict(BANDS))
+    parent = FileSource()
+    ch_names = ['ch{}'.format(i) for i in range(N_CHANNELS)]
+    parent.mne_info = create_info(ch_names, SFREQ,
+                                  ch_types=['eeg'] * 3 + ['misc'])
+    parent.output = np.random.randn(N_CHANNELS, 50)
+    filter_bank.parent = parent
+    return filter_bank
+
+
+def test_output_labels(filter_bank):
+    filter_bank.initialize()
+    assert filter_bank.mne_info['ch_names'] == [
+        'ch0_alpha', 'ch1_alpha', 'ch2_alpha', 'ch3_alpha',
+        'ch0_beta', 'ch1_beta', 'ch2_beta', 'ch3_beta']
+    assert filter_bank.mne_info['sfreq'] == SFREQ
+
+    filter_bank.update()
+    assert filter_bank.output.shape == (2 * N_CHANNELS, 50)
+
+
+def test_check_value(filter_bank):
+    with pytest.raises(ValueError):
+        filter_bank.bands = {'alpha': (12, 8)}
+    with pytest.raises(ValueError):
+        filter_bank.bands = {'alpha': (None, None)}
+    with pytest.raises(ValueError):
+        filter_bank.order = 0
+
+
+@pytest.mark.parametrize('band', ['alpha', 'beta'])
+def test_band_selector(filter_bank, band):
+    band_selector = BandSelector(band)
+    filter_bank.add_child(band_selector)
+    filter_bank.initialize()
+    band_selector.initialize()
+
+    # Restores the mne_info of the filter bank input
+    upstream_info = filter_bank.parent.mne_info
+    assert band_selector.mne_info['ch_names'] == upstream_info['ch_names']
+    assert band_selector.mne_info['sfreq'] == SFREQ
+    assert band_selector.mne_info is not filter_bank.band_mne_info
+
+    filter_bank.update()
+    band_index = list(BANDS).index(band)
+    assert_array_equal(
+        band_selector.output,
+        filter_bank.output[band_index * N_CHANNELS:
+                           (band_index + 1) * N_CHANNELS])
+
+
+def test_band_selector_unknown_band(filter_bank):
+    band_selector = BandSelector('gamma')
+    filter_bank.add_child(band_selector)
+    filter_bank.initialize()
+    with pytest.raises(ValueError):
+        band_selector.initialize()
+
+
+def test_filter_bank_keeps_state_between_chunks(filter_bank):
+    filter_bank.initialize()
+    data = np.random.randn(N_CHANNELS, 500)
+    chunks = []
+    for start in range(0, 500, 23):
+        filter_bank.parent.output = data[:, start:start + 23]
+        filter_bank.update()
+        chunks.append(filter_bank.output)
+
+    filter_bank.initialize()
+    filter_bank.parent.output = data
+    filter_bank.update()
+    assert_allclose(np.concatenate(chunks, axis=1), filter_bank.output,
+                    atol=1e-10)
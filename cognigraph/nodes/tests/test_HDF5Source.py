@@ -0,0 +1,68 @@
+import numpy as np
+from numpy.testing import assert_allclose
+
+import pytest
+import tables
+from cognigraph import TIME_AXIS
+from cognigraph.nodes.sources import HDF5Source
+
+SFREQ = 100
+N_TIMES = 250
+
+
+def write_recording(file_path, data, ch_names, ch_types):
+    """Write data the way FileOutput does"""
+    with tables.open_file(file_path, mode='w') as out_file:
+        array = out_file.create_earray(
+            out_file.root, 'data', tables.Float64Atom(), (len(ch_names), 0))
+        out_file.create_array(out_file.root, 'ch_names',
+                              np.array(ch_names, dtype='S'))
+        out_file.create_array(out_file.root, 'ch_types',
+                              np.array(ch_types, dtype='S'))
+        array.attrs.sfreq = SFREQ
+        array.append(data)
+
+
+@pytest.fixture
+def data():
+    return np.random.RandomState(0).randn(3, N_TIMES)
+
+
+@pytest.fixture
+def source_space_path(tmpdir, data):
+    file_path = str(tmpdir.join('sources.h5'))
+    write_recording(file_path, data, ['v1', 'v2', 'v3'], ['misc'] * 3)
+    return file_path
+
+
+def test_replay(source_space_path, data):
+    source = HDF5Source(
+        source_space_path, chunk_size=100,
+        replay_mode=HDF5Source.REPLAY_MODES.AS_FAST_AS_POSSIBLE)
+    source.initialize()
+    assert source.mne_info['ch_names'] == ['v1', 'v2', 'v3']
+    assert source.mne_info['sfreq'] == SFREQ
+
+    chunks = []
+    while source.is_alive:
+        source.update()
+        chunks.append(source.output)
+    assert [chunk.shape[TIME_AXIS] for chunk in chunks] == [100, 100, 50]
+    assert_allclose(np.concatenate(chunks, axis=TIME_AXIS), data, rtol=1e-6)
+    source.close()
+
+
+def test_no_metadata(tmpdir, data):
+    file_path = str(tmpdir.join('old.h5'))
+    with tables.open_file(file_path, mode='w') as out_file:
+        out_file.create_earray(out_file.root, 'data', tables.Float64Atom(),
+                               (3, 0)).append(data)
+    source = HDF5Source(file_path)
+    with pytest.raises(ValueError):
+        source.initialize()
+    source.close()
+
+
+def test_check_value():
+    with pytest.raises(ValueError):
+        HDF5Source('recording.fif')
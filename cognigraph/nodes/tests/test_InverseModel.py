@@ -1,4 +1,5 @@
 import numpy as np
+from numpy.testing import assert_allclose
 
 import pytest
 from cognigraph.nodes.processors import InverseModel
@@ -55,3 +56,46 @@ def test_update(inv_model):
 def test_check_value(inv_model):
     with pytest.raises(ValueError):
         inv_model.snr = -1
+
+
+@pytest.mark.parametrize('method', InverseModel.SUPPORTED_METHODS)
+def test_kernel_matches_mne(inv_model, method):
+    with inv_model.not_triggering_reset():
+        inv_model.method = method
+    inv_model.initialize()
+    input_array = inv_model.parent.output
+    assert_allclose(inv_model._apply_inverse_kernel(input_array),
+                    inv_model._apply_inverse_mne(input_array),
+                    rtol=1e-6)
+
+
+def test_bads_change_is_handled_in_background(inv_model):
+    inv_model.initialize()
+    mne_info = inv_model.traverse_back_and_find('mne_info')
+    n_picks = len(inv_model._channel_picks)
+    new_bad = next(ch for ch in inv_model._inverse_mne_info['ch_names']
+                   if ch not in mne_info['bads'])
+    mne_info['bads'] = mne_info['bads'] + [new_bad]
+
+    inv_model.update()  # starts the rebuild and keeps the old operator
+    assert inv_model.output is not None
+    inv_model._inverse_rebuild.result()
+    inv_model.update()  # swaps the operator
+    assert inv_model._inverse_rebuild is None
+    assert len(inv_model._channel_picks) == n_picks - 1
+
+
+def test_reinitialization_drops_pending_rebuild(inv_model):
+    inv_model.initialize()
+    mne_info = inv_model.traverse_back_and_find('mne_info')
+    new_bad = next(ch for ch in inv_model._inverse_mne_info['ch_names']
+                   if ch not in mne_info['bads'])
+    mne_info['bads'] = mne_info['bads'] + [new_bad]
+
+    inv_model.update()
+    old_executor = inv_model._rebuild_executor
+    inv_model._reset()
+    assert inv_model._inverse_rebuild is None
+    assert inv_model._rebuild_executor is not old_executor
+    with pytest.raises(RuntimeError):
+        old_executor.submit(lambda: None)
@@ -0,0 +1,92 @@
+import time
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+import pytest
+import pylsl as lsl
+from cognigraph import TIME_AXIS
+from cognigraph.nodes.sources import LSLStreamSource
+from cognigraph.utils.lsl import create_lsl_outlet
+
+SFREQ = 500
+
+
+@pytest.fixture
+def outlet():
+    # read_channel_labels_from_info cuts 3 last characters off the labels
+    return create_lsl_outlet(
+        name='test-reader-thread', frequency=SFREQ,
+        channel_format=lsl.cf_float32, channel_labels=['Fz...', 'Cz...'],
+        channel_types=['eeg'] * 2)
+
+
+@pytest.fixture
+def source(outlet):
+    source = LSLStreamSource(stream_name='test-reader-thread',
+                             use_reader_thread=True, block_size=25,
+                             buffer_seconds=4)
+    source.initialize()
+    time.sleep(0.5)  # let the inlet connect
+    yield source
+    source.stop()
+
+
+def push_jittery_chunks(outlet, n_chunks, sample_start=0):
+    for i in range(n_chunks):
+        chunk = np.arange(sample_start + i * 10, sample_start + (i + 1) * 10)
+        # All the samples of a chunk are stamped at the same time
+        outlet.push_chunk(np.repeat(chunk[:, np.newaxis], 2, axis=1)
+                          .astype(np.float32).tolist(),
+                          lsl.local_clock() + np.random.uniform(0, 0.005))
+        time.sleep(0.02)
+
+
+def collect(source, n_samples):
+    chunks = []
+    timestamps = []
+    t1 = time.time()
+    while sum(chunk.shape[TIME_AXIS] for chunk in chunks) < n_samples:
+        assert time.time() - t1 < 5
+        source.update()
+        if source.output.shape[TIME_AXIS] > 0:
+            chunks.append(source.output)
+            timestamps.append(source.timestamps)
+        time.sleep(0.005)
+    return chunks, np.concatenate(timestamps)
+
+
+def test_fixed_blocks(source, outlet):
+    push_jittery_chunks(outlet, 10)
+    chunks, timestamps = collect(source, 100)
+
+    assert all(chunk.shape[TIME_AXIS] % 25 == 0 for chunk in chunks)
+    data = np.concatenate(chunks, axis=TIME_AXIS)
+    assert_allclose(data[0, :100], np.arange(100))
+    # Dejittered timestamps are evenly spaced at the nominal rate
+    assert_allclose(np.diff(timestamps), 1 / SFREQ, atol=1e-4)
+    assert source.overrun_sample_count == 0
+    # Samples are numbered although the source sets the timestamps
+    assert source._samples_produced == data.shape[TIME_AXIS]
+
+
+def test_all_whole_blocks_are_output(source, outlet):
+    push_jittery_chunks(outlet, 6)
+    time.sleep(0.2)
+    source.update()
+    assert_allclose(source.output[0], np.arange(50))
+
+    # The remaining 10 samples wait for the rest of their block
+    source.update()
+    assert source.output.shape[TIME_AXIS] == 0
+
+
+def test_overrun(source, outlet):
+    # 5 s worth of samples without any updates
+    for _ in range(5):
+        outlet.push_chunk(np.zeros((SFREQ, 2), dtype=np.float32).tolist())
+    time.sleep(0.5)
+    source.update()
+    assert source.overrun_sample_count == SFREQ
+    # Everything left in the buffer is output at once
+    assert source.output.shape[TIME_AXIS] == 4 * SFREQ
@@ -54,3 +54,53 @@ def test_update(mce):
 def test_check_value(mce):
     with pytest.raises(ValueError):
         mce.snr = -1
+
+
+def test_check_solver(mce):
+    with pytest.raises(ValueError):
+        mce.solver = 'simplex'
+
+
+@pytest.mark.parametrize('solver', ['irls', 'interior-point'])
+def test_samples_per_solve(mce, solver):
+    mce.solver = solver
+    mce.samples_per_solve = 4
+    mce.initialize()
+    n_chan = mce.parent.mne_info['nchan']
+    mce.parent.output = np.random.rand(n_chan, 10)
+    mce.update()
+    assert mce.output.shape[1] == 10
+    assert np.all(mce.output >= 0)
+    # Windows of 4, 4 and 2 samples get one solution each
+    assert np.array_equal(mce.output[:, 0], mce.output[:, 3])
+    assert np.array_equal(mce.output[:, 8], mce.output[:, 9])
+
+
+def test_default_solver_is_the_linear_program(mce_def):
+    assert mce_def.solver == 'interior-point'
+
+
+def forbid_reading_forward(*args, **kwargs):
+    raise AssertionError('Forward model was read again')
+
+
+def test_bads_change_is_handled_in_background(mce, monkeypatch):
+    mce.initialize()
+    fwd_fix = mce._fwd_fix
+    monkeypatch.setattr('cognigraph.nodes.processors.get_clean_forward',
+                        forbid_reading_forward)
+
+    mne_info = mce.traverse_back_and_find('mne_info')
+    n_picks = len(mce._good_channel_picks)
+    new_bad = mce._mne_info['ch_names'][mce._good_channel_picks[0]]
+    mne_info['bads'] = mne_info['bads'] + [new_bad]
+    Un = mce.Un
+    mce.update()  # starts the rebuild and keeps the old operators
+    assert mce.Un is Un
+    mce._operators_rebuild.result()
+    mce.update()  # swaps the operators
+    assert mce._operators_rebuild is None
+    assert mce._fwd_fix is fwd_fix
+    assert len(mce._good_channel_picks) == n_picks - 1
+    assert mce.Un.shape[0] == n_picks - 1
+    assert len(mce._kernel_picks) == n_picks - 1
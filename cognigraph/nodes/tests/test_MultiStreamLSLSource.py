@@ -0,0 +1,84 @@
+import time
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+import pytest
+import pylsl as lsl
+from cognigraph import TIME_AXIS
+from cognigraph.nodes.sources import MultiStreamLSLSource
+from cognigraph.utils.channels import read_channel_types
+from cognigraph.utils.latency import local_clock
+from cognigraph.utils.lsl import create_lsl_outlet
+
+
+def create_outlet(name, frequency, channel_labels, type=''):
+    return create_lsl_outlet(
+        name=name, frequency=frequency, channel_format=lsl.cf_float32,
+        channel_labels=channel_labels,
+        channel_types=['eeg'] * len(channel_labels), type=type)
+
+
+@pytest.fixture
+def outlets():
+    # read_channel_labels_from_info cuts 3 last characters off the labels
+    eeg = create_outlet('test-eeg', 500, ['Fz...', 'Cz...'], type='EEG')
+    emg = create_outlet('test-emg', 2000, ['Cz...'], type='EMG')
+    return eeg, emg
+
+
+@pytest.fixture
+def source(outlets):
+    source = MultiStreamLSLSource(stream_names=('test-eeg', 'test-emg'))
+    source.initialize()
+    yield source
+    source.stop()
+
+
+def test_mne_info(source):
+    assert source.mne_info['sfreq'] == 500
+    assert source.mne_info['ch_names'] == ['Fz', 'Cz', 'Cz (test-emg)']
+    assert read_channel_types(source.mne_info) == ['eeg', 'eeg', 'emg']
+
+
+def test_alignment(source, outlets):
+    eeg, emg = outlets
+    time.sleep(0.5)  # let the inlets connect
+    t0 = local_clock()
+    eeg_times = t0 + np.arange(50) / 500
+    emg_times = t0 + np.arange(220) / 2000
+    # Value of each sample is its time relative to t0
+    eeg.push_chunk(np.repeat(eeg_times[:, np.newaxis] - t0, 2, axis=1)
+                   .astype(np.float32).tolist(), eeg_times[-1])
+    emg.push_chunk((emg_times[:, np.newaxis] - t0).astype(np.float32)
+                   .tolist(), emg_times[-1])
+
+    chunks = []
+    t1 = time.time()
+    while sum(chunk.shape[TIME_AXIS] for chunk in chunks) < 50:
+        assert time.time() - t1 < 5
+        source.update()
+        if source.output is not None:
+            chunks.append(source.output)
+        time.sleep(0.01)
+
+    data = np.concatenate(chunks, axis=TIME_AXIS)
+    # EMG values interpolated onto the EEG timestamps match the EEG ones
+    assert_allclose(data[2], data[0], atol=1e-4)
+
+
+def test_other_streams_do_not_pile_up(source, outlets):
+    _, emg = outlets
+    time.sleep(0.5)  # let the inlets connect
+    # Only the EMG stream sends anything
+    for _ in range(5):
+        emg.push_chunk(np.zeros((600, 1), dtype=np.float32).tolist(),
+                       local_clock())
+        time.sleep(0.3)
+        cutoff = local_clock() - source.MAX_SECONDS_TO_WAIT
+        source.update()
+
+    _, emg_timestamps = source._pending[1]
+    assert len(emg_timestamps) > 0
+    # One sample before the cutoff is kept for the interpolation
+    assert np.sum(emg_timestamps < cutoff) <= 1
@@ -0,0 +1,140 @@
+import numpy as np
+from numpy.testing import assert_allclose
+from mne import create_info
+
+import pytest
+from cognigraph.nodes.node import ProcessorNode
+from cognigraph.nodes.processors import Preprocessing
+from cognigraph.nodes.sources import FileSource
+from cognigraph.utils.channels import channel_labels_saver
+from cognigraph.utils.pynfb import StreamingResampler
+
+
+N_CHANNELS = 32
+SFREQ = 500
+
+
+def create_dummy_info(nchan=N_CHANNELS, sfreq=SFREQ):
+    ch_names = [str(i).zfill(2) for i in range(nchan)]
+    return create_info(ch_names, sfreq, ch_types='eeg')
+
+
+class BadsWatchingNode(ProcessorNode):
+    """Counts reinitializations and keeps the bads seen on update"""
+    CHANGES_IN_THESE_REQUIRE_RESET = ()
+    UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ('mne_info', )
+    SAVERS_FOR_UPSTREAM_MUTABLE_OBJECTS = {'mne_info': channel_labels_saver}
+
+    def __init__(self):
+        ProcessorNode.__init__(self)
+        self.n_initializations = 0
+        self.seen_bads = None
+
+    def _initialize(self):
+        self.n_initializations += 1
+
+    def _update(self):
+        self.seen_bads = self.traverse_back_and_find('mne_info')['bads']
+        self.output = self.parent.output
+
+    def _reset(self):
+        return False
+
+    def _on_input_history_invalidation(self):
+        pass
+
+    def _check_value(self, key, value):
+        pass
+
+
+@pytest.fixture
+def preprocessing():
+    preprocessing = Preprocessing(collect_for_x_seconds=1)
+    parent = FileSource()
+    parent.mne_info = create_dummy_info()
+    parent.output = np.random.randn(N_CHANNELS, 50)
+    preprocessing.parent = parent
+    return preprocessing
+
+
+def test_no_resampling_by_default(preprocessing):
+    preprocessing.initialize()
+    preprocessing.update()
+    assert preprocessing.mne_info['sfreq'] == SFREQ
+    assert preprocessing.output is preprocessing.parent.output
+
+
+def test_resampling_updates_sfreq(preprocessing):
+    preprocessing._dsamp_freq = 200
+    preprocessing.initialize()
+    assert preprocessing.mne_info['sfreq'] == 200
+    # Upstream info is not touched
+    assert preprocessing.parent.mne_info['sfreq'] == SFREQ
+    assert preprocessing.mne_info is not preprocessing.parent.mne_info
+
+
+def test_resampled_output_matches_whole_signal(preprocessing):
+    preprocessing._dsamp_freq = 200
+    preprocessing.track_bad_channels = False
+    preprocessing.initialize()
+
+    data = np.random.randn(N_CHANNELS, 500)
+    chunks = []
+    for start in range(0, 500, 37):
+        preprocessing.parent.output = data[:, start:start + 37]
+        preprocessing.update()
+        chunks.append(preprocessing.output)
+
+    resampler = StreamingResampler(up=2, down=5, n_channels=N_CHANNELS)
+    assert_allclose(np.concatenate(chunks, axis=1),
+                    resampler.apply(data.T).T, atol=1e-12)
+
+
+def feed_until_statistics_are_collected(preprocessing, data):
+    for start in range(0, data.shape[1], 50):
+        preprocessing.parent.output = data[:, start:start + 50]
+        preprocessing.update()
+
+
+def test_first_channel_outlier_is_pushed(preprocessing):
+    preprocessing.initialize()
+    data = np.random.randn(N_CHANNELS, 2 * SFREQ)
+    data[0] *= 100
+    feed_until_statistics_are_collected(preprocessing, data)
+
+    assert preprocessing.mne_info['bads'] == ['00']
+    assert preprocessing.parent.mne_info['bads'] == []
+
+
+def test_pushed_bads_do_not_reinitialize_children(preprocessing):
+    child = BadsWatchingNode()
+    preprocessing.add_child(child)
+    preprocessing.initialize()
+    child.initialize()
+
+    data = np.random.randn(N_CHANNELS, 2 * SFREQ)
+    data[3] *= 100
+    for start in range(0, data.shape[1], 50):
+        preprocessing.parent.output = data[:, start:start + 50]
+        preprocessing.update()
+        child.update()
+
+    assert preprocessing.mne_info['bads'] == ['03']
+    assert child.seen_bads == ['03']
+    assert child.n_initializations == 1
+
+
+def test_tracked_bads_keep_bads_from_elsewhere(preprocessing):
+    preprocessing.collect_for_x_seconds = 100  # only the tracker marks
+    preprocessing.bad_channels_window_seconds = 1
+    preprocessing.initialize()
+    preprocessing.mne_info['bads'] = ['07']
+
+    data = np.random.randn(N_CHANNELS, 2 * SFREQ)
+    data[1] = 0  # flat
+    feed_until_statistics_are_collected(preprocessing, data)
+    assert sorted(preprocessing.mne_info['bads']) == ['01', '07']
+
+    data = np.random.randn(N_CHANNELS, 2 * SFREQ)
+    feed_until_statistics_are_collected(preprocessing, data)
+    assert preprocessing.mne_info['bads'] == ['07']
@@ -0,0 +1,62 @@
+import time
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+import pytest
+from cognigraph import TIME_AXIS
+from cognigraph.nodes.sources import SyntheticSource
+
+
+def read_samples(source, chunk_sizes):
+    chunks = []
+    for chunk_size in chunk_sizes:
+        source.chunk_size = chunk_size
+        source.update()
+        chunks.append(source.output)
+    return np.concatenate(chunks, axis=TIME_AXIS)
+
+
+@pytest.fixture
+def source():
+    source = SyntheticSource(
+        n_channels=8, sfreq=500,
+        replay_mode=SyntheticSource.REPLAY_MODES.AS_FAST_AS_POSSIBLE)
+    source.initialize()
+    return source
+
+
+def test_mne_info(source):
+    assert source.mne_info['nchan'] == 8
+    assert source.mne_info['sfreq'] == 500
+
+
+def test_deterministic(source):
+    data = read_samples(source, [100, 100])
+    assert data.shape[TIME_AXIS] == 200
+
+    # The data do not depend on the chunking
+    source.initialize()
+    assert_array_equal(read_samples(source, [30, 150, 20]), data)
+
+    source.seed = 1  # resets the source
+    assert not np.array_equal(read_samples(source, [200]), data)
+
+
+def test_accelerated():
+    source = SyntheticSource(
+        n_channels=8, sfreq=500,
+        replay_mode=SyntheticSource.REPLAY_MODES.ACCELERATED, speed=10)
+    source.initialize()
+    source.update()  # starts the clock
+    time.sleep(0.1)
+    source.update()
+    # 0.1 s at 10x real time
+    assert abs(source.output.shape[TIME_AXIS] - 500) < 100
+
+
+def test_check_value(source):
+    with pytest.raises(ValueError):
+        source.n_channels = 0
+    with pytest.raises(ValueError):
+        source.sfreq = -1
@@ -1,7 +1,11 @@
 import time
+from collections import OrderedDict, defaultdict
 from typing import List
 
+import numpy as np
+
 from .nodes.node import Node, SourceNode, ProcessorNode, OutputNode
+from .runner import PipelineRunner
 from .utils.decorators import accepts
 from .utils.misc import class_name_of
 
@@ -29,6 +33,9 @@ class Pipeline(object):
     pipeline.initialize_all_nodes()
     """
 
+    # Separates node names from their state keys in save_state files
+    STATE_KEY_SEPARATOR = '/'
+
     def __init__(self):
         self._source = None  # type: SourceNode
         self._processors = list()  # type: List[ProcessorNode]
@@ -99,6 +106,18 @@ class Pipeline(object):
         self.logger.info(
                 'Finish initialization in {:.1f} ms'.format((t2 - t1) * 1000))
 
+    def stop_all_nodes(self):
+        """
+        Stop every node in the tree: reader and worker threads end, branch
+        processes exit and files are closed. The nodes have to be
+        initialized again before the next update.
+
+        """
+        self.logger.info('Stop')
+        for node in self._nodes_by_name().values():
+            node.stop()
+            node.initialized = False
+
     def update_all_nodes(self):
         self.logger.debug('Start update ' + '>' * 6)
         t1 = time.time()
@@ -106,10 +125,102 @@ class Pipeline(object):
         t2 = time.time()
         self.logger.debug('Finish in {:.1f} ms'.format((t2 - t1) * 1000))
 
-    def run(self):
-        while self.source.is_alive:  # TODO: also stop if all outputs are dead
-            for node in self.all_nodes:
-                node.update()
+    def run(self, duration=None, max_ticks=None, **kwargs):
+        """
+        Update the nodes until the source dies and stop them. duration and
+        max_ticks are passed to PipelineRunner.run, the rest to the
+        PipelineRunner.
+
+        """
+        # TODO: also stop if all outputs are dead
+        runner = PipelineRunner(self, **kwargs)
+        runner.run(duration=duration, max_ticks=max_ticks)
+        return runner
+
+    def latency_report(self, percentiles=(50, 95, 99)) -> dict:
+        """
+        Latency statistics of every node in the tree that has processed
+        any chunks, e.g.::
+
+            {'LSLStreamOutput': {'update': {'count': 1000, 'mean_ms': 12.1,
+                                            'max_ms': 30.5, 'p50_ms': 11.8,
+                                            ...},
+                                 'processing': {...}},
+             ...}
+
+        'update' is measured from acquisition of the newest sample in a chunk
+        to the end of the node update (for LSLStreamOutput - to the push),
+        'processing' - from the start to the end of the update and
+        BrainViewer's 'draw' - from acquisition to drawing.
+        Nodes of the same class are numbered: 'LinearFilter #2'.
+
+        """
+        report = {
+            name: {kind: tracker.report(percentiles)
+                   for kind, tracker in node.latency_trackers.items()
+                   if len(tracker) > 0}
+            for name, node in self._nodes_by_name().items()}
+        return {name: node_report for name, node_report in report.items()
+                if node_report}
+
+    def save_state(self, file_path):
+        """
+        Save what the nodes have learnt from the data so far (bad channel
+        statistics, filter states, adaptive beamformer covariance, ...)
+        to an npz file, so that load_state can warm-start the pipeline
+        after a restart. '.npz' is appended to file_path if it has no
+        such extension.
+
+        Nodes are identified by their names as in latency_report.
+
+        """
+        arrays = dict()
+        for name, node in self._nodes_by_name().items():
+            for key, value in node._get_state().items():
+                arrays[name + self.STATE_KEY_SEPARATOR + key] = value
+        np.savez(file_path, **arrays)
+
+    def load_state(self, file_path):
+        """
+        Restore the state saved with save_state into the nodes of an
+        initialized pipeline with the same structure and parameters.
+        Nodes without saved state are left as they are.
+
+        """
+        states = defaultdict(dict)
+        with np.load(file_path) as saved:
+            for key in saved.files:
+                name, state_key = key.split(self.STATE_KEY_SEPARATOR, 1)
+                states[name][state_key] = saved[key]
+
+        nodes = self._nodes_by_name()
+        missing_names = [name for name in states if name not in nodes]
+        if missing_names:
+            raise ValueError(
+                'The pipeline has no nodes {} '.format(missing_names) +
+                'that there is state saved for')
+        for name, state in states.items():
+            nodes[name]._set_state(state)
+            self.logger.info('Restored the state of {}'.format(name))
+
+    def _nodes_by_name(self) -> OrderedDict:
+        """
+        All the nodes in the tree breadth-first by their names.
+        Nodes of the same class are numbered: 'LinearFilter #2'.
+
+        """
+        nodes_by_name = OrderedDict()
+        nodes = [self.source]
+        for node in nodes:  # nodes grows while we iterate
+            nodes.extend(node._children)
+
+            name = str(node)
+            copy_number = 1
+            while name in nodes_by_name:
+                copy_number += 1
+                name = '{} #{}'.format(node, copy_number)
+            nodes_by_name[name] = node
+        return nodes_by_name
 
     def _reconnect_outputs_to_last_node(self):
         """
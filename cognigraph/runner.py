@@ -0,0 +1,162 @@
+"""Running a pipeline without a GUI"""
+import time
+import logging
+from collections import deque
+from typing import List
+
+import numpy as np
+
+from . import TIME_AXIS
+from .nodes.node import Node
+
+
+class PipelineRunner(object):
+    """
+    Updates the nodes of a pipeline in a loop until the source dies.
+
+    On each tick the source is updated first. If it has produced no data,
+    the runner sleeps for idle_sleep seconds; otherwise every other node
+    is updated exactly once in topological (breadth-first) order.
+    The order is recomputed on every tick, so nodes can be added and
+    removed on the fly.
+
+    Parameters
+    ----------
+    pipeline: Pipeline
+        Pipeline with the source set
+    idle_sleep: float
+        Seconds to wait before polling a source that had no data
+    report_every_x_seconds: float | None
+        How often to log throughput and latency; never if None
+    latency_history_length: int
+        Number of the last ticks the latency statistics are computed over
+
+    """
+    def __init__(self, pipeline, idle_sleep=0.001, report_every_x_seconds=10,
+                 latency_history_length=1000):
+        self.pipeline = pipeline
+        self.idle_sleep = idle_sleep
+        self.report_every_x_seconds = report_every_x_seconds
+        self.logger = logging.getLogger(type(self).__name__)
+
+        self.tick_count = 0
+        self.idle_tick_count = 0
+        self.samples_processed = 0
+        self._tick_durations = deque(maxlen=latency_history_length)
+        self._start_time = None  # type: float
+        self._time_of_last_report = None  # type: float
+        self._should_stop = False
+
+    @property
+    def source(self):
+        return self.pipeline.source
+
+    def nodes_in_order(self) -> List[Node]:
+        """
+        Nodes of the tree with each parent before its children. Subtrees of
+        nodes that update their children themselves are left out.
+
+        """
+        nodes = [self.source]
+        for node in nodes:  # nodes grows while we iterate
+            if not node.UPDATES_CHILDREN_ITSELF:
+                nodes.extend(node._children)
+        return nodes
+
+    def tick(self) -> bool:
+        """
+        Update the source and, if it produced data, all the other nodes.
+
+        Returns
+        -------
+        had_data: bool
+            Whether the source produced any data
+
+        """
+        t1 = time.time()
+        nodes = self.nodes_in_order()
+        source = nodes[0]
+        source.update_self()
+
+        if source.output is None or source.output.size == 0:
+            self.idle_tick_count += 1
+            return False
+
+        for node in nodes[1:]:
+            node.update_self()
+
+        t2 = time.time()
+        self.tick_count += 1
+        self.samples_processed += source.output.shape[TIME_AXIS]
+        self._tick_durations.append(t2 - t1)
+        return True
+
+    def run(self, duration=None, max_ticks=None):
+        """
+        Tick until the source dies, stop is called, duration seconds
+        pass or max_ticks ticks with data are made.
+        Initializes the pipeline if that has not been done yet and stops
+        all its nodes when done, so that the queued chunks are written
+        and the threads and processes of the nodes end.
+
+        """
+        if not self.source.initialized:
+            self.pipeline.initialize_all_nodes()
+
+        self._should_stop = False
+        self._start_time = time.time()
+        self._time_of_last_report = self._start_time
+        try:
+            while self.source.is_alive and not self._should_stop:
+                if not self.tick():
+                    time.sleep(self.idle_sleep)
+
+                now = time.time()
+                if duration is not None and now - self._start_time >= duration:
+                    break
+                if max_ticks is not None and self.tick_count >= max_ticks:
+                    break
+                if (self.report_every_x_seconds is not None and
+                        now - self._time_of_last_report >=
+                        self.report_every_x_seconds):
+                    self._log_report()
+                    self._time_of_last_report = now
+        except KeyboardInterrupt:
+            self.logger.info('Interrupted')
+        finally:
+            self.pipeline.stop_all_nodes()
+
+        if not self.source.is_alive:
+            self.logger.info('Source is exhausted')
+        self._log_report()
+
+    def stop(self):
+        """Make run return after the current tick"""
+        self._should_stop = True
+
+    def report(self) -> dict:
+        """Throughput and per-tick processing latency statistics"""
+        elapsed = time.time() - self._start_time if self._start_time else 0
+        durations = np.array(self._tick_durations) * 1000
+        has_durations = len(durations) > 0
+        return {
+            'ticks': self.tick_count,
+            'idle_ticks': self.idle_tick_count,
+            'elapsed_s': elapsed,
+            'ticks_per_s': self.tick_count / elapsed if elapsed else 0.0,
+            'samples_per_s': (self.samples_processed / elapsed
+                              if elapsed else 0.0),
+            'latency_mean_ms': (np.mean(durations)
+                                if has_durations else np.nan),
+            'latency_p95_ms': (np.percentile(durations, 95)
+                               if has_durations else np.nan),
+            'latency_max_ms': (np.max(durations)
+                               if has_durations else np.nan),
+        }
+
+    def _log_report(self):
+        self.logger.info(
+            '{ticks} ticks in {elapsed_s:.1f} s: {ticks_per_s:.1f} ticks/s, '
+            '{samples_per_s:.1f} samples/s; latency mean {latency_mean_ms:.1f}'
+            ' ms, 95% {latency_p95_ms:.1f} ms, max {latency_max_ms:.1f} ms'
+            .format(**self.report()))
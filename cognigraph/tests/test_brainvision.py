@@ -0,0 +1,43 @@
+"""Tests for reading recordings from files"""
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+from mne import create_info
+from mne.io import RawArray
+
+from cognigraph.utils.brainvision import (read_fif_data, open_fif_raw,
+                                          LazyRawData)
+
+
+@pytest.fixture
+def fif_file_path(tmpdir):
+    nchan, n_times = 8, 1000
+    info = create_info([str(i) for i in range(nchan)], 500, ch_types='eeg')
+    raw = RawArray(np.random.randn(nchan, n_times) * 1e-6, info,
+                   verbose='ERROR')
+    file_path = str(tmpdir.join('test_raw.fif'))
+    raw.save(file_path, verbose='ERROR')
+    return file_path
+
+
+@pytest.mark.parametrize('time_axis', [0, 1])
+def test_lazy_raw_data(fif_file_path, time_axis):
+    data, _ = read_fif_data(fif_file_path, time_axis=time_axis)
+    data = data.astype(np.float32)
+    lazy_data = LazyRawData(open_fif_raw(fif_file_path),
+                            time_axis=time_axis, dtype=np.float32)
+
+    assert lazy_data.shape == data.shape
+    if time_axis == 1:
+        assert_array_equal(lazy_data[:, 100:300], data[:, 100:300])
+        assert_array_equal(lazy_data[2:4, 900:], data[2:4, 900:])
+        assert lazy_data[:, 1000:1024].shape == (8, 0)
+        with pytest.raises(IndexError):
+            lazy_data[:, ::2]
+    else:
+        assert_array_equal(lazy_data[100:300], data[100:300])
+        assert_array_equal(lazy_data[900:, 2:4], data[900:, 2:4])
+        assert lazy_data[1000:1024].shape == (0, 8)
+        with pytest.raises(IndexError):
+            lazy_data[::2]
+    assert lazy_data[:, :].dtype == np.float32
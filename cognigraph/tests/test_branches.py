@@ -0,0 +1,159 @@
+"""Tests for ThreadedBranch and ProcessBranch classes"""
+import time
+
+import pytest
+import numpy as np
+from mne import create_info
+
+from cognigraph.nodes.branches import ThreadedBranch, ProcessBranch
+from cognigraph.runner import PipelineRunner
+from cognigraph.tests.test_pipeline import (pipeline,  # noqa
+                                            ConcreteProcessor)
+
+
+def wait_for(condition, timeout=5):
+    t1 = time.time()
+    while not condition() and time.time() - t1 < timeout:
+        time.sleep(0.001)
+    return condition()
+
+
+@pytest.fixture  # noqa
+def branched_pipeline(pipeline):  # noqa
+    # source -> branch -> processor -> output
+    processor = pipeline._processors[0]
+    branch = ThreadedBranch(max_queue_size=2)
+    branch.parent = pipeline.source
+    processor.parent = branch
+    pipeline.initialize_all_nodes()
+    yield pipeline, branch
+    branch.stop(timeout=1)
+
+
+def test_branch_runs_children_in_worker(branched_pipeline):
+    pipe, branch = branched_pipeline
+    branch.overflow_policy = 'block'
+    processor = pipe._processors[0]
+    runner = PipelineRunner(pipe, report_every_x_seconds=None)
+    assert processor not in runner.nodes_in_order()
+
+    runner.run(max_ticks=3)
+    assert wait_for(lambda: processor.n_updates == 3)
+    # Chunks go through in order
+    assert np.all(processor.output == 2 + processor.increment * 3)
+
+
+def test_drop_oldest(branched_pipeline):
+    pipe, branch = branched_pipeline
+    processor = pipe._processors[0]
+    with branch.lock:  # stall the worker
+        for i in range(5):
+            pipe.update_all_nodes()
+        # One chunk may have been taken by the worker before the stall
+        assert branch.dropped_chunk_count >= 2
+    assert wait_for(lambda: branch.queue_size == 0)
+    assert processor.n_updates <= 3
+
+
+def test_coalesce(branched_pipeline):
+    pipe, branch = branched_pipeline
+    branch.overflow_policy = 'coalesce'
+    processor = pipe._processors[0]
+    nsamp = pipe.source.nsamp
+    with branch.lock:
+        for i in range(5):
+            pipe.update_all_nodes()
+    assert wait_for(lambda: branch.queue_size == 0)
+    assert branch.dropped_chunk_count == 0
+    assert branch.coalesced_chunk_count >= 2
+    assert wait_for(lambda: processor.n_updates >= 1)
+    assert processor.output.shape[1] > nsamp
+
+
+def test_disabled_branch_updates_children_in_place(branched_pipeline):
+    pipe, branch = branched_pipeline
+    processor = pipe._processors[0]
+    branch.disabled = True
+    pipe.update_all_nodes()
+    # No waiting: the processor has been updated by the calling thread
+    assert processor.n_updates == 1
+    assert branch.output is pipe.source.output
+    assert branch.queue_size == 0
+
+
+def test_worker_error_is_raised_by_the_next_update(branched_pipeline):
+    pipe, branch = branched_pipeline
+    pipe._processors[0]._update = None  # fails on update
+    pipe.update_all_nodes()
+    assert wait_for(lambda: branch.error is not None)
+
+    with pytest.raises(TypeError):
+        pipe.update_all_nodes()
+    assert branch.error is None
+
+
+def test_check_value():
+    with pytest.raises(ValueError):
+        ThreadedBranch(overflow_policy='ignore')
+    with pytest.raises(ValueError):
+        ProcessBranch(make_processors, max_samples_in_chunk=0)
+
+
+def make_processors():
+    return [ConcreteProcessor(increment=1), ConcreteProcessor(increment=10)]
+
+
+def make_broken_processors():
+    processor = ConcreteProcessor()
+    processor._update = None  # fails on update
+    return [processor]
+
+
+@pytest.fixture  # noqa
+def process_pipeline(pipeline):  # noqa
+    # source -> process branch -> output
+    output = pipeline._outputs[0]
+    branch = ProcessBranch(make_processors, max_samples_in_chunk=20,
+                           export_attributes=('n_updates', ))
+    branch.parent = pipeline.source
+    output.parent = branch
+    pipeline._processors[0] = branch
+    yield pipeline, branch
+    branch.stop()
+
+
+def test_process_branch(process_pipeline):
+    pipe, branch = process_pipeline
+    pipe.initialize_all_nodes()
+    assert branch.mne_info['ch_names'] == pipe.source.mne_info['ch_names']
+    assert branch.exported_state == {'n_updates': 0}
+
+    pipe.update_all_nodes()
+    nchan, nsamp = pipe.source.output.shape
+    assert branch.output.shape == (nchan, nsamp)
+    # The chunk of 50 samples is sent in 3 pieces, each updating the chain
+    assert branch.exported_state == {'n_updates': 3}
+    assert np.all(branch.output[:, :20] == 1 + 10)
+    assert np.all(branch.output[:, 40:] == 3 + 30)
+
+
+def test_process_branch_error(process_pipeline):
+    pipe, branch = process_pipeline
+    branch.subtree_factory = make_broken_processors
+    pipe.initialize_all_nodes()
+    with pytest.raises(RuntimeError, match='TypeError'):
+        pipe.update_all_nodes()
+
+
+def test_process_branch_with_source_space_input(process_pipeline):
+    pipe, branch = process_pipeline
+    source = pipe.source
+    # Like the output of InverseModel, Beamformer or MCE
+    source._mne_info = create_info(['vertex #{}'.format(i) for i in range(8)],
+                                   500, ch_types='misc')
+    source.SENSOR_CHANNEL_TYPES_REQUIRED = False
+    pipe.initialize_all_nodes()
+    assert branch.mne_info['ch_names'] == source.mne_info['ch_names']
+
+    pipe.update_all_nodes()
+    assert branch.output.shape == source.output.shape
@@ -0,0 +1,71 @@
+import numpy as np
+from numpy.testing import assert_allclose
+
+from cognigraph.utils.channel_quality import ChannelQualityTracker
+
+
+N_CHANNELS = 16
+WINDOW_SIZE = 500
+
+
+def eeg_like(n_times, n_channels=N_CHANNELS, seed=0):
+    return np.random.RandomState(seed).randn(n_channels, n_times)
+
+
+def feed(tracker, data, chunk_size=40):
+    changed = False
+    for start in range(0, data.shape[1], chunk_size):
+        changed |= tracker.update(data[:, start:start + chunk_size])
+    return changed
+
+
+def test_nothing_is_evaluated_before_the_window_is_full():
+    tracker = ChannelQualityTracker(N_CHANNELS, WINDOW_SIZE)
+    data = eeg_like(WINDOW_SIZE - 1)
+    data[3] *= 100
+    assert not feed(tracker, data)
+    assert not np.any(tracker.is_bad)
+
+
+def test_noisy_and_flat_channels_are_marked():
+    tracker = ChannelQualityTracker(N_CHANNELS, WINDOW_SIZE)
+    data = eeg_like(2 * WINDOW_SIZE)
+    data[0] *= 100  # outlier at index 0 must not be overlooked
+    data[5] = 0
+    assert feed(tracker, data)
+    assert np.flatnonzero(tracker.is_bad).tolist() == [0, 5]
+
+
+def test_channel_is_unmarked_when_it_recovers():
+    tracker = ChannelQualityTracker(N_CHANNELS, WINDOW_SIZE)
+    data = eeg_like(WINDOW_SIZE)
+    data[2] *= 100
+    feed(tracker, data)
+    assert tracker.is_bad[2]
+
+    feed(tracker, eeg_like(WINDOW_SIZE, seed=1))
+    assert not np.any(tracker.is_bad)
+
+
+def test_window_sums_match_the_window():
+    tracker = ChannelQualityTracker(N_CHANNELS, WINDOW_SIZE)
+    data = eeg_like(10 * WINDOW_SIZE) + 10
+    feed(tracker, data, chunk_size=37)
+
+    n = tracker._samples_in_window
+    window = data[:, -n:]
+    # Differences with the sample before the window are counted too
+    differences = np.diff(data, axis=1)[:, -n:]
+    sums, sums_of_squares, diff_sums_of_squares = tracker._window_sums
+    assert_allclose(sums, np.sum(window, axis=1))
+    assert_allclose(sums_of_squares, np.sum(window ** 2, axis=1))
+    assert_allclose(diff_sums_of_squares, np.sum(differences ** 2, axis=1))
+
+
+def test_reset_keeps_the_marks():
+    tracker = ChannelQualityTracker(N_CHANNELS, WINDOW_SIZE)
+    tracker.mark_bad([4])
+    tracker.reset()
+    assert tracker.is_bad[4]
+    assert tracker._samples_in_window == 0
+    assert not np.any(tracker._window_sums)
@@ -0,0 +1,70 @@
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from cognigraph.utils.make_lcmv import (_beam_loop, _beam_loop_parallel,
+                                        _source_power, compute_lcmv_weights,
+                                        stacked_power_iteration,
+                                        multiply_by_orientations_rowwise,
+                                        multiply_by_orientations_columnwise)
+
+
+N_CHANNELS = 16
+N_SOURCES = 50
+
+
+def beam_loop_per_source(n_sources, W, G, n_orient, TMP):
+    """The loop compute_lcmv_weights used to run source by source"""
+    tmp_prod = np.empty((n_orient * n_sources, n_orient))
+    for k in range(n_sources):
+        Wk = W[n_orient * k: n_orient * k + n_orient, :]
+        Gk = G[:, n_orient * k: n_orient * k + n_orient]
+        tmp = np.dot(TMP[n_orient * k: n_orient * k + n_orient, :], Gk)
+        tmp_1 = np.dot(Wk, Gk)
+        tmp_prod[n_orient * k: n_orient * (k + 1), :] = np.linalg.solve(
+            tmp, tmp_1)
+    return tmp_prod
+
+
+def lcmv_problem(n_orient):
+    rng = np.random.RandomState(0)
+    G = rng.randn(N_CHANNELS, n_orient * N_SOURCES)
+    Cm = rng.randn(N_CHANNELS, N_CHANNELS)
+    Cm_inv = np.linalg.inv(Cm.dot(Cm.T) + np.eye(N_CHANNELS))
+    W = np.dot(G.T, Cm_inv)
+    TMP = np.dot(G.T, np.dot(Cm_inv, Cm_inv))
+    return G, Cm_inv, W, TMP
+
+
+@pytest.mark.parametrize('n_orient', [1, 3])
+def test_beam_loops_agree(n_orient):
+    G, _, W, TMP = lcmv_problem(n_orient)
+    expected = beam_loop_per_source(N_SOURCES, W, G, n_orient, TMP)
+
+    assert_allclose(_beam_loop(N_SOURCES, W, G, n_orient, TMP),
+                    expected, rtol=1e-8)
+    assert_allclose(_beam_loop_parallel(N_SOURCES, W, np.asfortranarray(G),
+                                        n_orient, TMP),
+                    expected, rtol=1e-6)
+
+
+def test_source_power_matches_per_source_products():
+    G, _, W, TMP = lcmv_problem(3)
+    tmp_prod = beam_loop_per_source(N_SOURCES, W, G, 3, TMP)
+    max_ori = stacked_power_iteration(tmp_prod)
+    G_or = multiply_by_orientations_columnwise(G, max_ori)
+    TMP_or = multiply_by_orientations_rowwise(TMP, max_ori)
+
+    expected = np.array([TMP_or[k, :] @ G_or[:, k]
+                         for k in range(N_SOURCES)])
+    assert_allclose(_source_power(TMP_or, G_or), expected, rtol=1e-10)
+
+
+def test_parallel_weights_match_batched():
+    G, Cm_inv, _, _ = lcmv_problem(3)
+    # Power iterations start from a random vector
+    np.random.seed(0)
+    batched = compute_lcmv_weights(G, Cm_inv, 3)
+    np.random.seed(0)
+    parallel = compute_lcmv_weights(G, Cm_inv, 3, parallel=True)
+    assert_allclose(parallel, batched, rtol=1e-5, atol=1e-10)
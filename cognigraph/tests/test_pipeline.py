@@ -218,6 +218,111 @@ def test_add_child_on_the_fly(pipeline):
     assert(new_processor._root is pipeline.source)
 
 
+def test_chunk_times(pipeline):
+    pipeline.initialize_all_nodes()
+    pipeline.update_all_nodes()
+    pipeline.update_all_nodes()
+
+    nsamp = pipeline.source.nsamp
+    src = pipeline.source
+    out = pipeline._outputs[0]
+    assert_array_equal(src.sample_indices, np.arange(nsamp, 2 * nsamp))
+    # The newest sample is acquired right at the update
+    assert src.timestamps[-1] == src.enter_time
+    assert np.all(np.diff(src.timestamps) > 0)
+    assert out.timestamps is src.timestamps
+    assert out.sample_indices is src.sample_indices
+    assert out.exit_time >= out.enter_time >= src.exit_time
+
+
+def test_sample_indices_with_source_timestamps(pipeline):
+    """Sources that stamp their chunks themselves still number samples"""
+    src = pipeline.source
+    stamped_update = src._update
+
+    def _update():
+        stamped_update()
+        src.timestamps = np.arange(src.nsamp, dtype=float)
+
+    src._update = _update
+    pipeline.initialize_all_nodes()
+    pipeline.update_all_nodes()
+    pipeline.update_all_nodes()
+
+    assert_array_equal(src.timestamps, np.arange(src.nsamp))
+    assert_array_equal(src.sample_indices,
+                       np.arange(src.nsamp, 2 * src.nsamp))
+    assert pipeline._outputs[0].sample_indices is src.sample_indices
+
+
+def test_latency_report(pipeline):
+    pipeline.initialize_all_nodes()
+    pipeline.source.add_child(ConcreteProcessor(), initialize=True)
+    for i in range(3):
+        pipeline.update_all_nodes()
+
+    report = pipeline.latency_report(percentiles=(50, 90))
+    assert set(report) == {'Proxy', 'Proxy #2', 'Proxy #3', 'Proxy #4'}
+    # Nodes are numbered breadth-first: the output is the last one
+    output_report = report['Proxy #4']['update']
+    assert output_report['count'] == 3
+    assert 0 <= output_report['p50_ms'] <= output_report['max_ms']
+    assert 'p90_ms' in output_report
+
+
+class SummingProcessor(ProcessorNode):
+    """Outputs the running sum of the input over time"""
+    CHANGES_IN_THESE_REQUIRE_RESET = ()
+    UPSTREAM_CHANGES_IN_THESE_REQUIRE_REINITIALIZATION = ()
+
+    def _initialize(self):
+        self._sum = np.zeros(self.traverse_back_and_find('mne_info')['nchan'])
+
+    def _update(self):
+        self._sum += self.parent.output.sum(axis=1)
+        self.output = self._sum[:, np.newaxis]
+
+    def _get_state(self):
+        return {'sum': self._sum}
+
+    def _set_state(self, state):
+        self._sum[:] = state['sum']
+
+    def _check_value(self, key, value):
+        pass
+
+    def _reset(self):
+        return False
+
+    def _on_input_history_invalidation(self):
+        pass
+
+
+def test_save_and_load_state(pipeline, tmpdir):
+    file_path = str(tmpdir.join('state.npz'))
+    pipeline.source.add_child(SummingProcessor())
+    pipeline.initialize_all_nodes()
+    for i in range(3):
+        pipeline.update_all_nodes()
+    summing_processor = pipeline.source._children[-1]
+    saved_sum = summing_processor._sum.copy()
+    pipeline.save_state(file_path)
+
+    # A restarted session picks up where the previous one stopped
+    pipeline.initialize_all_nodes()
+    summing_processor.initialize()
+    assert not np.any(summing_processor._sum)
+    pipeline.load_state(file_path)
+    assert_array_equal(summing_processor._sum, saved_sum)
+
+    # State of a node the pipeline does not have
+    other_pipeline = Pipeline()
+    other_pipeline.source = ConcreteSource()
+    other_pipeline.initialize_all_nodes()
+    with pytest.raises(ValueError):
+        other_pipeline.load_state(file_path)
+
+
 # def test_pipeline_reintitalization(pipeline):
 #     """Check if changing critical attribute resets downstream nodes"""
 #     pipeline.initialize_all_nodes()
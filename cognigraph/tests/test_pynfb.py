@@ -0,0 +1,124 @@
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+from scipy.signal import upfirdn, resample_poly, sosfilt
+
+from cognigraph.utils.pynfb import (StreamingResampler, SOSFilterBank,
+                                    StreamingHilbert)
+
+
+N_CHANNELS = 3
+
+
+def random_signal(n_times, n_channels=N_CHANNELS, seed=0):
+    return np.random.RandomState(seed).randn(n_times, n_channels)
+
+
+def apply_in_chunks(pynfb_filter, x, chunk_sizes):
+    """Feed x chunk by chunk; chunk_sizes may contain zeros"""
+    bounds = np.r_[0, np.cumsum(chunk_sizes)]
+    assert bounds[-1] == len(x)
+    return np.concatenate([pynfb_filter.apply(x[start:stop])
+                           for start, stop in zip(bounds[:-1], bounds[1:])])
+
+
+def random_chunk_sizes(n_times, max_size=50, seed=1):
+    rng = np.random.RandomState(seed)
+    sizes = []
+    while sum(sizes) < n_times:
+        sizes.append(min(rng.randint(0, max_size), n_times - sum(sizes)))
+    return sizes
+
+
+@pytest.mark.parametrize('up, down', [(1, 2), (2, 5), (3, 4)])
+def test_resampler_matches_upfirdn(up, down):
+    x = random_signal(1000)
+    resampler = StreamingResampler(up, down, N_CHANNELS)
+    y = apply_in_chunks(resampler, x, random_chunk_sizes(len(x)))
+
+    assert len(y) == -(-len(x) * up // down)
+    h = resampler._phases.T.ravel()
+    expected = upfirdn(h, x, up, down, axis=0)[:len(y)]
+    assert_allclose(y, expected, atol=1e-12)
+
+
+def test_resampler_matches_resample_poly_after_delay():
+    up, down = 2, 5
+    x = random_signal(1000)
+    resampler = StreamingResampler(up, down, N_CHANNELS)
+    y = resampler.apply(x)
+
+    # The filter of 2 * 10 * max(up, down) + 1 taps is centered
+    delay = 10 * max(up, down) // down
+    expected = resample_poly(x, up, down, axis=0)
+    assert_allclose(y[delay:], expected[:len(y) - delay], atol=1e-12)
+
+
+def test_resampler_handles_empty_chunks():
+    x = random_signal(100)
+    resampler = StreamingResampler(1, 3, N_CHANNELS)
+    assert resampler.apply(x[:0]).shape == (0, N_CHANNELS)
+    y = apply_in_chunks(resampler, x, [0, 1, 0, 0, 2, 97, 0])
+
+    resampler.reset()
+    assert_allclose(y, resampler.apply(x), atol=1e-12)
+
+
+BANDS = [(8, 12), (None, 4), (30, None)]
+
+
+def test_filter_bank_matches_sosfilt():
+    x = random_signal(2000)
+    filter_bank = SOSFilterBank(BANDS, fs=250, n_channels=N_CHANNELS)
+    y = apply_in_chunks(filter_bank, x, random_chunk_sizes(len(x)))
+
+    assert y.shape == (len(x), len(BANDS) * N_CHANNELS)
+    for i_band, band in enumerate(BANDS):
+        sos = SOSFilterBank._design_sos(band, fs=250, order=4)
+        expected = sosfilt(sos, x, axis=0)
+        band_columns = slice(i_band * N_CHANNELS, (i_band + 1) * N_CHANNELS)
+        assert_allclose(y[:, band_columns], expected, atol=1e-10)
+
+
+def test_filter_bank_reset():
+    x = random_signal(300)
+    filter_bank = SOSFilterBank(BANDS, fs=250, n_channels=N_CHANNELS)
+    y = filter_bank.apply(x)
+    filter_bank.reset()
+    assert_allclose(filter_bank.apply(x), y)
+
+
+def test_hilbert_does_not_depend_on_chunking():
+    x = random_signal(1000)
+    hilbert = StreamingHilbert(N_CHANNELS)
+    y = apply_in_chunks(hilbert, x, random_chunk_sizes(len(x)))
+
+    hilbert.reset()
+    assert_allclose(y, hilbert.apply(x), atol=1e-12)
+    # Real part is the delayed input
+    assert_allclose(y[hilbert.delay:].real, x[:-hilbert.delay], atol=1e-12)
+
+
+def max_envelope_error(hilbert, sfreq, frequency):
+    amplitudes = np.array([1, 2, 0.5])
+    t = np.arange(hilbert.n_taps + 2 * sfreq) / sfreq
+    x = amplitudes * np.sin(2 * np.pi * frequency * t)[:, np.newaxis]
+    envelope = np.abs(apply_in_chunks(hilbert, x, random_chunk_sizes(len(x))))
+
+    # Skip the samples that the filter has not fully seen
+    steady = envelope[hilbert.n_taps:]
+    return np.max(np.abs(steady / amplitudes - 1))
+
+
+@pytest.mark.parametrize('frequency', [10, 50, 100, 200])
+def test_hilbert_envelope_of_sinusoid(frequency):
+    hilbert = StreamingHilbert(N_CHANNELS)
+    assert max_envelope_error(hilbert, 500, frequency) < 0.004
+
+
+@pytest.mark.parametrize('sfreq', [500, 1000, 2000])
+@pytest.mark.parametrize('frequency', [8, 10, 13])
+def test_hilbert_has_unit_gain_in_alpha_band(sfreq, frequency):
+    n_taps = StreamingHilbert.n_taps_for(sfreq, lowest_frequency=8)
+    hilbert = StreamingHilbert(N_CHANNELS, n_taps=n_taps)
+    assert max_envelope_error(hilbert, sfreq, frequency) < 0.004
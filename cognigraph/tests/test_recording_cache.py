@@ -0,0 +1,51 @@
+"""Tests for RecordingCache class"""
+import os
+
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from cognigraph.utils.brainvision import (read_fif_data, open_fif_raw,
+                                          LazyRawData)
+from cognigraph.utils.recording_cache import RecordingCache
+from cognigraph.tests.test_brainvision import fif_file_path  # noqa
+
+
+@pytest.fixture
+def cache(tmpdir):
+    cache = RecordingCache(str(tmpdir.join('cache')))
+    cache.BLOCK_SAMPLE_COUNT = 300  # more than one block per recording
+    return cache
+
+
+@pytest.mark.parametrize('time_axis', [0, 1])  # noqa
+def test_save_and_load(cache, fif_file_path, time_axis):  # noqa
+    data, info = read_fif_data(fif_file_path, time_axis=time_axis)
+    data = data.astype(np.float32)
+    assert cache.load(fif_file_path, time_axis) == (None, None)
+
+    cache.save(fif_file_path, data, info, time_axis)
+    cached_data, cached_info = cache.load(fif_file_path, time_axis)
+    assert isinstance(cached_data, np.memmap)
+    assert_array_equal(cached_data, data)
+    assert cached_info['ch_names'] == info['ch_names']
+    assert cached_info['sfreq'] == info['sfreq']
+    assert len(cached_info['projs']) == len(info['projs'])
+
+
+def test_save_lazy_data(cache, fif_file_path):  # noqa
+    raw = open_fif_raw(fif_file_path)
+    lazy_data = LazyRawData(raw, time_axis=1, dtype=np.float32)
+    cache.save(fif_file_path, lazy_data, raw.info, time_axis=1)
+    cached_data, _ = cache.load(fif_file_path, time_axis=1)
+    assert_array_equal(cached_data, lazy_data[:, :])
+
+
+def test_stale_entry_is_removed(cache, fif_file_path):  # noqa
+    data, info = read_fif_data(fif_file_path, time_axis=1)
+    cache.save(fif_file_path, data, info, time_axis=1)
+
+    stat = os.stat(fif_file_path)
+    os.utime(fif_file_path, (stat.st_atime, stat.st_mtime + 1))
+    assert cache.load(fif_file_path, time_axis=1) == (None, None)
+    assert not os.listdir(cache.cache_dir)
@@ -0,0 +1,37 @@
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from cognigraph.utils.ring_buffer import RingBuffer
+
+
+def samples(start, stop):
+    return np.vstack([np.arange(start, stop)] * 2).astype(float)
+
+
+def test_consume():
+    ring_buffer = RingBuffer(row_cnt=2, maxlen=10)
+    ring_buffer.extend(samples(0, 8))
+    ring_buffer.consume(5)
+    assert ring_buffer.sample_cnt == 3
+    assert_array_equal(ring_buffer.data, samples(5, 8))
+
+    # Wraps around the end of the storage
+    ring_buffer.extend(samples(8, 15))
+    assert_array_equal(ring_buffer.data, samples(5, 15))
+
+    ring_buffer.consume(20)
+    assert ring_buffer.sample_cnt == 0
+    ring_buffer.extend(samples(15, 17))
+    assert_array_equal(ring_buffer.data, samples(15, 17))
+
+
+def test_overrun_count():
+    ring_buffer = RingBuffer(row_cnt=2, maxlen=10)
+    ring_buffer.extend(samples(0, 8))
+    assert ring_buffer.overrun_sample_cnt == 0
+    ring_buffer.extend(samples(8, 12))
+    assert ring_buffer.overrun_sample_cnt == 2
+    ring_buffer.consume(4)
+    ring_buffer.extend(samples(12, 25))
+    assert ring_buffer.overrun_sample_cnt == 2 + 9
+    assert_array_equal(ring_buffer.data, samples(15, 25))
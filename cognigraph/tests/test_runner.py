@@ -0,0 +1,70 @@
+"""Tests for PipelineRunner class"""
+import pytest
+import numpy as np
+
+from cognigraph.runner import PipelineRunner
+from cognigraph.tests.test_pipeline import (pipeline,  # noqa
+                                            ConcreteProcessor)
+
+
+def test_each_node_updated_once_per_tick(pipeline):  # noqa
+    extra_processor = ConcreteProcessor()
+    pipeline._processors[0].add_child(extra_processor)
+    runner = PipelineRunner(pipeline, report_every_x_seconds=None)
+    runner.run(max_ticks=3)
+
+    assert runner.tick_count == 3
+    for node in runner.nodes_in_order():
+        assert node.n_updates == 3
+    nodes = runner.nodes_in_order()
+    for i, node in enumerate(nodes[1:]):
+        assert nodes.index(node.parent) < i + 1
+
+
+def test_stops_when_source_dies(pipeline):  # noqa
+    runner = PipelineRunner(pipeline, report_every_x_seconds=None)
+    source = pipeline.source
+    original_update = source._update
+
+    def dying_update():
+        original_update()
+        if source.n_updates == 4:
+            source.is_alive = False
+    source._update = dying_update
+
+    runner.run(duration=10)
+    assert runner.tick_count == 4
+    report = runner.report()
+    assert report['samples_per_s'] > 0
+    assert np.isfinite(report['latency_p95_ms'])
+
+
+def test_idle_source_is_not_propagated(pipeline):  # noqa
+    runner = PipelineRunner(pipeline, report_every_x_seconds=None)
+    pipeline.initialize_all_nodes()
+    pipeline.source.nsamp = 0
+    assert runner.tick() is False
+    assert pipeline._processors[0].n_updates == 0
+    assert runner.idle_tick_count == 1
+
+
+@pytest.mark.parametrize('kwargs', [{'max_ticks': 2}, {'duration': 0.05}])
+def test_pipeline_run_delegates(pipeline, kwargs):  # noqa
+    runner = pipeline.run(report_every_x_seconds=None, **kwargs)
+    assert runner.tick_count > 0
+    assert pipeline.source.is_alive
+
+
+def test_nodes_are_stopped_when_run_returns(pipeline):  # noqa
+    runner = PipelineRunner(pipeline, report_every_x_seconds=None)
+    stopped = []
+    for node in pipeline.all_nodes:
+        node.stop = lambda node=node: stopped.append(node)
+
+    runner.run(max_ticks=2)
+    assert stopped == pipeline.all_nodes
+    assert not any(node.initialized for node in pipeline.all_nodes)
+
+    # The next run starts them again
+    runner.run(max_ticks=4)
+    assert all(node.n_initializations == 2 for node in pipeline.all_nodes)
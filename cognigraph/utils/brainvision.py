@@ -1,6 +1,8 @@
 """Functions to read input from file"""
 import os
+
 import mne
+import numpy as np
 
 
 BRAINVISION_TIME_AXIS = 1
@@ -35,48 +37,24 @@ BRAINVISION_TIME_AXIS = 1
 #     brainvision._check_version_monkey_patched = True
 
 
-def read_brain_vision_data(file_path, time_axis, start_s=0, stop_s=None):
+def open_brain_vision_raw(file_path, preload=False):
     vhdr_file_path = os.path.splitext(file_path)[0] + '.vhdr'
     raw = mne.io.read_raw_brainvision(vhdr_fname=vhdr_file_path,
+                                      preload=preload,
                                       verbose='ERROR')  # type: mne.io.Raw
     raw.set_eeg_reference(ref_channels='average', projection=True)
-
-    # Get the required time slice.
-    # mne.io.Raw.get_data takes array indices, not time
-    start = 0 if start_s is None else raw.time_as_index(start_s)[0]
-    stop = min(raw.n_times if stop_s is None else raw.time_as_index(stop_s)[0],
-               raw.n_times)
-    data = raw.get_data(start=start, stop=stop)
-
-    mne_info = raw.info.copy()
-
-    if time_axis != BRAINVISION_TIME_AXIS:
-        data = data.T
-
-    return data, mne_info
+    return raw
 
 
-def read_fif_data(file_path, time_axis, start_s=0, stop_s=None):
-    raw = mne.io.Raw(fname=file_path, verbose='ERROR')  # type: mne.io.Raw
+def open_fif_raw(file_path, preload=False):
+    raw = mne.io.Raw(fname=file_path, preload=preload,
+                     verbose='ERROR')  # type: mne.io.Raw
     raw.set_eeg_reference(ref_channels='average', projection=True)
+    return raw
 
-    # Get the required time slice.
-    # mne.io.Raw.get_data takes array indices, not time
-    start = 0 if start_s is None else raw.time_as_index(start_s)[0]
-    stop = min(raw.n_times if stop_s is None else raw.time_as_index(stop_s)[0],
-               raw.n_times)
-    data = raw.get_data(start=start, stop=stop)
-
-    mne_info = raw.info.copy()
-
-    if time_axis != BRAINVISION_TIME_AXIS:
-        data = data.T
 
-    return data, mne_info
-
-
-def read_edf_data(file_path, time_axis, start_s=0, stop_s=None):
-    raw = mne.io.edf.read_raw_edf(input_fname=file_path, preload=True,
+def open_edf_raw(file_path, preload=False):
+    raw = mne.io.edf.read_raw_edf(input_fname=file_path, preload=preload,
                                   verbose='ERROR', stim_channel=-1,
                                   misc=[128, 129, 130])  # type: mne.io.Raw
     raw.set_eeg_reference(ref_channels='average', projection=True)
@@ -85,6 +63,10 @@ def read_edf_data(file_path, time_axis, start_s=0, stop_s=None):
     except Exception:
         pass
     raw.pick_types(meg=False, eeg=True)
+    return raw
+
+
+def _get_data_and_info(raw, time_axis, start_s, stop_s):
     # Get the required time slice.
     # mne.io.Raw.get_data takes array indices, not time
     start = 0 if start_s is None else raw.time_as_index(start_s)[0]
@@ -98,3 +80,80 @@ def read_edf_data(file_path, time_axis, start_s=0, stop_s=None):
         data = data.T
 
     return data, mne_info
+
+
+def read_brain_vision_data(file_path, time_axis, start_s=0, stop_s=None):
+    raw = open_brain_vision_raw(file_path)
+    return _get_data_and_info(raw, time_axis, start_s, stop_s)
+
+
+def read_fif_data(file_path, time_axis, start_s=0, stop_s=None):
+    raw = open_fif_raw(file_path)
+    return _get_data_and_info(raw, time_axis, start_s, stop_s)
+
+
+def read_edf_data(file_path, time_axis, start_s=0, stop_s=None):
+    raw = open_edf_raw(file_path, preload=True)
+    return _get_data_and_info(raw, time_axis, start_s, stop_s)
+
+
+class LazyRawData(object):
+    """
+    Read-only array-like access to the data of a raw that is not preloaded.
+    Only the samples in the requested time slice are read from the file.
+
+    Parameters
+    ----------
+    raw: mne.io.BaseRaw
+        Raw opened with preload=False
+    time_axis: int
+        Axis of the time dimension in the slices returned
+    dtype: np.dtype
+        Type the slices are converted to
+
+    Examples
+    --------
+    >>> data = LazyRawData(open_fif_raw('raw.fif'), time_axis=1,
+    ...                    dtype=np.float32)
+    >>> data.shape
+    (306, 1000000)
+    >>> data[:, 1000:2000].shape  # reads 1000 samples only
+    (306, 1000)
+
+    """
+    ndim = 2
+
+    def __init__(self, raw, time_axis, dtype):
+        self.raw = raw
+        self.time_axis = time_axis
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def shape(self):
+        shape = (len(self.raw.ch_names), self.raw.n_times)
+        if self.time_axis == BRAINVISION_TIME_AXIS:
+            return shape
+        return shape[::-1]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        if self.time_axis != BRAINVISION_TIME_AXIS:
+            key = key[::-1]
+        channel_key, time_key = key
+        if not isinstance(time_key, slice) or time_key.step not in (None, 1):
+            raise IndexError('Only contiguous time slices are supported')
+
+        start, stop, _ = time_key.indices(self.raw.n_times)
+        if start < stop:
+            data = self.raw.get_data(start=start, stop=stop)
+        else:  # mne refuses to read nothing
+            data = np.empty((len(self.raw.ch_names), 0))
+        data = data[channel_key].astype(self.dtype)
+
+        if self.time_axis != BRAINVISION_TIME_AXIS:
+            data = data.T
+        return data
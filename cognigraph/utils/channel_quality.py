@@ -0,0 +1,135 @@
+from collections import deque
+
+import numpy as np
+
+# Scales the median absolute deviation to the standard deviation
+# for normally distributed data
+MAD_TO_STD = 1.4826
+
+
+def robust_z_scores(values: np.ndarray):
+    """z-scores with median and median absolute deviation"""
+    median = np.median(values)
+    mad = np.median(np.abs(values - median)) * MAD_TO_STD
+    return (values - median) / max(mad, np.finfo(values.dtype).tiny)
+
+
+class ChannelQualityTracker(object):
+    """
+    Flags bad channels from the statistics of the last window_size samples.
+
+    A channel is scored by the robust z-scores (across channels) of its log
+    variance and of the ratio of the first difference variance to the
+    variance which grows with high-frequency noise. A channel with the
+    standard deviation below flat_ratio times the median one is flat.
+    To avoid flickering, a channel is marked bad when its score exceeds
+    z_to_mark and marked good again only when it drops below z_to_unmark.
+
+    Parameters
+    ----------
+    n_channels: int
+        Number of channels
+    window_size: int
+        Number of samples the statistics are computed over
+    z_to_mark: float
+        Score above which a good channel becomes bad
+    z_to_unmark: float
+        Score below which a bad channel becomes good
+    flat_ratio: float
+        Standard deviation relative to the median one below which
+        a channel is considered flat
+
+    """
+    def __init__(self, n_channels, window_size, z_to_mark=7, z_to_unmark=4,
+                 flat_ratio=1e-3):
+        self.n_channels = n_channels
+        self.window_size = window_size
+        self.z_to_mark = z_to_mark
+        self.z_to_unmark = z_to_unmark
+        self.flat_ratio = flat_ratio
+
+        self.is_bad = np.zeros(n_channels, dtype=bool)
+        self.scores = None  # type: np.ndarray
+        self.reset()
+
+    def reset(self):
+        """Forget the collected statistics but not the marks"""
+        # Per-chunk sample count and sums of samples, their squares
+        # and squared first differences
+        self._chunk_statistics = deque()
+        # Sums over the window, without the sample count
+        self._window_sums = np.zeros([3, self.n_channels])
+        self._removals_since_resync = 0
+        self._last_sample = None  # type: np.ndarray
+        self._samples_in_window = 0
+
+    def _resync_window_sums(self):
+        """Sum the window from scratch so rounding errors do not pile up"""
+        self._window_sums[:] = 0
+        for _, chunk_sums in self._chunk_statistics:
+            self._window_sums += chunk_sums
+        self._removals_since_resync = 0
+
+    def mark_bad(self, indices):
+        self.is_bad[indices] = True
+
+    def update(self, chunk: np.ndarray) -> bool:
+        """
+        Add CHANNELS x TIME chunk and reevaluate the marks
+
+        Returns
+        -------
+        changed: bool
+            Whether any channel has been marked or unmarked
+
+        """
+        chunk = chunk.astype(np.float64)
+        if self._last_sample is not None:
+            differences = np.diff(
+                np.c_[self._last_sample, chunk], axis=1)
+        else:
+            differences = np.diff(chunk, axis=1)
+        self._last_sample = chunk[:, -1:]
+
+        chunk_sums = np.array([np.sum(chunk, axis=1),
+                               np.sum(chunk ** 2, axis=1),
+                               np.sum(differences ** 2, axis=1)])
+        self._chunk_statistics.append((chunk.shape[1], chunk_sums))
+        self._window_sums += chunk_sums
+        self._samples_in_window += chunk.shape[1]
+        while (self._samples_in_window - self._chunk_statistics[0][0] >=
+               self.window_size):
+            sample_count, chunk_sums = self._chunk_statistics.popleft()
+            self._window_sums -= chunk_sums
+            self._samples_in_window -= sample_count
+            self._removals_since_resync += 1
+        # Amortized over as many chunks as the window holds
+        if self._removals_since_resync >= len(self._chunk_statistics):
+            self._resync_window_sums()
+
+        if self._samples_in_window < self.window_size:
+            return False
+
+        is_bad = self._evaluate()
+        changed = np.any(is_bad != self.is_bad)
+        self.is_bad = is_bad
+        return changed
+
+    def _evaluate(self):
+        n = self._samples_in_window
+        sums, sums_of_squares, diff_sums_of_squares = self._window_sums
+        means = sums / n
+        variances = np.maximum(sums_of_squares / n - means ** 2, 0)
+        diff_variances = diff_sums_of_squares / (n - 1)
+
+        tiny = np.finfo(variances.dtype).tiny
+        is_flat = (np.sqrt(variances) <
+                   self.flat_ratio * np.median(np.sqrt(variances)))
+        variance_scores = np.abs(robust_z_scores(np.log(variances + tiny)))
+        noise_scores = robust_z_scores(diff_variances / (variances + tiny))
+
+        self.scores = np.maximum(variance_scores, noise_scores)
+        self.scores[is_flat] = np.inf
+
+        return np.where(self.is_bad, self.scores > self.z_to_unmark,
+                        self.scores > self.z_to_mark)
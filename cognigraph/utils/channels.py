@@ -57,6 +57,10 @@ def channel_labels_saver(mne_info: mne.Info):
     return tuple(mne_info['ch_names'], )
 
 
+def channel_labels_and_sfreq_saver(mne_info: mne.Info):
+    return tuple(mne_info['ch_names'], ), mne_info['sfreq']
+
+
 def get_average_reference_projection(channel_count: int):
     """
     Calculates average-reference projection matrix assuming
@@ -3,6 +3,10 @@ import os
 import numpy as np
 import mne
 from mne.datasets import sample
+from mne.io.constants import FIFF
+from mne.minimum_norm.inverse import (_assemble_kernel,
+                                      _pick_channels_inverse_operator,
+                                      combine_xyz)
 
 from ..utils.misc import all_upper
 
@@ -68,6 +72,55 @@ def matrix_from_inverse_operator(
     return stc.data
 
 
+def get_inverse_kernel(inverse_operator, mne_info, method):
+    """
+    Extract everything apply_inverse_raw needs from a prepared
+    inverse operator so that it can be applied with a single matmul
+
+    Parameters
+    ----------
+    inverse_operator: dict
+        Inverse operator prepared with prepare_inverse_operator
+    mne_info: mne.Info
+        Info of the data the kernel will be applied to
+    method: str
+        One of 'MNE', 'dSPM', 'sLORETA'
+
+    Returns
+    -------
+    kernel: np.ndarray
+        (3 x) VERTICES x PICKED CHANNELS matrix
+    noise_norm: np.ndarray | None
+        Noise normalization for dSPM and sLORETA
+    picks: np.ndarray
+        Indices of the channels in mne_info the kernel is applied to
+    is_free_ori: bool
+        Whether the three orientations have to be combined
+
+    """
+    # mne 0.16 returns three values, later versions return four
+    kernel, noise_norm = _assemble_kernel(
+        inverse_operator, None, method, None)[:2]
+    picks = np.array(_pick_channels_inverse_operator(
+        mne_info['ch_names'], inverse_operator))
+    is_free_ori = inverse_operator['source_ori'] == FIFF.FIFFV_MNE_FREE_ORI
+    return kernel, noise_norm, picks, is_free_ori
+
+
+def apply_inverse_kernel(kernel, noise_norm, is_free_ori, data):
+    """
+    Same as apply_inverse_raw with pick_ori=None for the output
+    of get_inverse_kernel; data is PICKED CHANNELS x TIME
+
+    """
+    sol = kernel.dot(data)
+    if is_free_ori:
+        sol = combine_xyz(sol)
+    if noise_norm is not None:
+        sol *= noise_norm
+    return sol
+
+
 def get_mesh_data_from_forward_solution(forward_solution):
     """Get reduced source space for which the forward was computed"""
 
@@ -0,0 +1,65 @@
+"""Timing of chunks on their way from acquisition to the outputs"""
+from collections import deque
+
+import numpy as np
+from pylsl import local_clock  # clock of the LSL timestamps, in seconds
+
+__all__ = ['local_clock', 'LatencyTracker', 'match_chunk_times']
+
+
+class LatencyTracker(object):
+    """
+    Keeps the last history_length latencies and computes their statistics
+
+    Parameters
+    ----------
+    history_length: int
+        Number of the last latencies the statistics are computed over
+
+    """
+    def __init__(self, history_length=1000):
+        self._latencies = deque(maxlen=history_length)
+
+    def __len__(self):
+        return len(self._latencies)
+
+    def add(self, latency):
+        """Add latency in seconds"""
+        self._latencies.append(latency)
+
+    def clear(self):
+        self._latencies.clear()
+
+    def report(self, percentiles=(50, 95, 99)) -> dict:
+        """Count, mean, max and percentiles of the latencies in ms"""
+        latencies = np.array(self._latencies) * 1000
+        has_latencies = len(latencies) > 0
+        report = {
+            'count': len(latencies),
+            'mean_ms': np.mean(latencies) if has_latencies else np.nan,
+            'max_ms': np.max(latencies) if has_latencies else np.nan,
+        }
+        for q in percentiles:
+            report['p{}_ms'.format(q)] = (np.percentile(latencies, q)
+                                          if has_latencies else np.nan)
+        return report
+
+
+def match_chunk_times(timestamps, sample_indices, n_samples):
+    """
+    Stretch per-sample timestamps and sample indices of an input chunk
+    onto the n_samples samples of an output chunk (e.g. after resampling).
+    The first and the last samples are matched exactly.
+
+    """
+    n_input_samples = len(timestamps)
+    if n_input_samples == n_samples:
+        return timestamps, sample_indices
+    if n_input_samples == 0 or n_samples == 0:
+        return timestamps[:0], sample_indices[:0]
+
+    positions = np.linspace(0, n_input_samples - 1, n_samples)
+    input_positions = np.arange(n_input_samples)
+    return (np.interp(positions, input_positions, timestamps),
+            np.round(np.interp(positions, input_positions,
+                               sample_indices)).astype(np.int64))
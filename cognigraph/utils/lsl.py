@@ -1,15 +1,31 @@
+import time
 import uuid
+import logging
+import threading
 
 import pylsl as lsl
 import numpy as np
 from pylsl.pylsl import fmt2string, string2fmt
 
 from .. import TIME_AXIS
+from .ring_buffer import RingBuffer
 import xml.etree.ElementTree as ET
 
+logger = logging.getLogger(__name__)
+
 string2fmt['float64'] = string2fmt['double64']
 LSL_TIME_DIMENSION_ID = 0
 
+# Channel formats that liblsl can write straight into a numpy array
+NUMERIC_LSL_FORMATS_TO_NUMPY = {
+    lsl.cf_float32: np.dtype('float32'),
+    lsl.cf_double64: np.dtype('float64'),
+    lsl.cf_int8: np.dtype('int8'),
+    lsl.cf_int16: np.dtype('int16'),
+    lsl.cf_int32: np.dtype('int32'),
+    lsl.cf_int64: np.dtype('int64'),
+}
+
 
 def convert_lsl_format_to_numpy(lsl_channel_format: int):
     return fmt2string[lsl_channel_format]
@@ -62,6 +78,33 @@ def convert_lsl_chunk_to_numpy_array(lsl_chunk, dtype=None):
     return _transpose_if_need_be(ndarray)
 
 
+def pull_lsl_chunk_into_buffer(inlet: lsl.StreamInlet, buffer: np.ndarray):
+    """
+    Pull at most as many samples as fit into the buffer without any
+    intermediate python lists.
+
+    Parameters
+    ----------
+    inlet: lsl.StreamInlet
+        Inlet of a numeric stream
+    buffer: np.ndarray
+        C-contiguous TIME x CHANNELS array of the stream dtype
+        (see NUMERIC_LSL_FORMATS_TO_NUMPY) that liblsl writes into
+
+    Returns
+    -------
+    chunk: np.ndarray
+        View of the pulled samples in the buffer with time along TIME_AXIS.
+        It is overwritten by the next pull.
+    timestamps: list
+        Timestamps of the pulled samples
+
+    """
+    _, timestamps = inlet.pull_chunk(max_samples=buffer.shape[0],
+                                     dest_obj=buffer)
+    return _transpose_if_need_be(buffer[:len(timestamps)]), timestamps
+
+
 def convert_numpy_array_to_lsl_chunk(ndarray):
     ndarray = _transpose_if_need_be(ndarray)
     return ndarray.tolist()
@@ -71,6 +114,18 @@ convert_numpy_array_to_lsl_chunk.__doc__ = (
     convert_lsl_chunk_to_numpy_array.__doc__)
 
 
+def copy_numpy_array_to_lsl_buffer(ndarray: np.ndarray, buffer: np.ndarray):
+    """
+    Copy a chunk with time along TIME_AXIS into a C-contiguous TIME x CHANNELS
+    buffer of the outlet dtype. Returns the view of the buffer with the chunk
+    which StreamOutlet.push_chunk hands over to liblsl as is.
+
+    """
+    lsl_chunk = buffer[:ndarray.shape[TIME_AXIS]]
+    np.copyto(lsl_chunk, _transpose_if_need_be(ndarray), casting='unsafe')
+    return lsl_chunk
+
+
 def read_channel_labels_from_info(info: lsl.StreamInfo):
     info_xml = info.as_xml()
     rt = ET.fromstring(info_xml)
@@ -98,3 +153,176 @@ def read_channel_labels_from_info(info: lsl.StreamInfo):
         types.append('eeg')
     labels = [l[:-3] for l in labels]
     return labels, types
+
+
+class TimestampDejitterer(object):
+    """
+    Replaces timestamps of a regularly sampled stream with evenly spaced
+    ones. liblsl stamps samples when they are pushed, so all the samples
+    of a chunk get nearly the same timestamp and the chunks arrive late by
+    varying amounts. The dejittered timestamps lie on the grid
+    offset + sample_number / sfreq where the offset follows the observed
+    timestamps with exponential smoothing.
+
+    Parameters
+    ----------
+    sfreq: float
+        Nominal sampling rate of the stream
+    half_life_seconds: float
+        Amount of data after which an error in the offset is halved
+
+    """
+    def __init__(self, sfreq, half_life_seconds=10):
+        self.sfreq = sfreq
+        self.half_life_seconds = half_life_seconds
+        self._offset = None  # type: float
+        self._sample_count = 0
+
+    def dejitter(self, timestamps):
+        sample_numbers = self._sample_count + np.arange(len(timestamps))
+        self._sample_count += len(timestamps)
+        grid = sample_numbers / self.sfreq
+        if self._offset is None:
+            self._offset = np.mean(timestamps - grid)
+        else:
+            weight = 1 - 0.5 ** (
+                len(timestamps) / (self.half_life_seconds * self.sfreq))
+            self._offset += weight * np.mean(timestamps - grid - self._offset)
+        return self._offset + grid
+
+
+class LSLInletReader(object):
+    """
+    Pulls samples from an inlet in a background thread into a ring buffer
+    and keeps them there until they are taken, so that a slow consumer or
+    another stream never makes the inlet fall behind. Timestamps are mapped
+    onto local_clock() with the periodically updated time correction of the
+    inlet.
+
+    If the consumer falls behind by more than buffer_seconds, the oldest
+    samples are overwritten; their number is kept in overrun_sample_count.
+
+    Parameters
+    ----------
+    inlet: lsl.StreamInlet
+        Opened inlet of a numeric stream
+    stream_info: lsl.StreamInfo
+        Info of the stream
+    max_samples_in_chunk: int
+        Maximum number of samples pulled at a time
+    buffer_seconds: float
+        Capacity of the ring buffer. Streams with an irregular sampling
+        rate get room for MAX_SAMPLES_IN_CHUNKS_FOR_IRREGULAR_STREAMS chunks
+    dejitter: bool
+        If True and the stream has a regular sampling rate, timestamps are
+        smoothed with TimestampDejitterer
+
+    """
+    # How long to sleep when the inlet has no samples, in seconds
+    POLL_INTERVAL = 0.001
+    # The offset between the clocks of the stream and ours drifts slowly
+    SECONDS_BETWEEN_TIME_CORRECTIONS = 5
+    SECONDS_TO_WAIT_FOR_TIME_CORRECTION = 0.1
+    MAX_SAMPLES_IN_CHUNKS_FOR_IRREGULAR_STREAMS = 100
+
+    def __init__(self, inlet, stream_info, max_samples_in_chunk=1024,
+                 buffer_seconds=10, dejitter=False):
+        self.inlet = inlet
+        self._buffer = np.empty(
+            (max_samples_in_chunk, stream_info.channel_count()),
+            dtype=NUMERIC_LSL_FORMATS_TO_NUMPY[stream_info.channel_format()])
+        self.time_correction = 0.0
+        self.error = None  # type: Exception
+
+        sfreq = stream_info.nominal_srate()
+        if sfreq > 0:
+            maxlen = max(int(buffer_seconds * sfreq), max_samples_in_chunk)
+        else:
+            maxlen = (max_samples_in_chunk *
+                      self.MAX_SAMPLES_IN_CHUNKS_FOR_IRREGULAR_STREAMS)
+        self._samples = RingBuffer(row_cnt=stream_info.channel_count(),
+                                   maxlen=maxlen)
+        self._timestamps = RingBuffer(row_cnt=1, maxlen=maxlen)
+        self._dejitterer = (TimestampDejitterer(sfreq)
+                            if dejitter and sfreq > 0 else None)
+        self._lock = threading.Lock()
+        self._thread = None  # type: threading.Thread
+        self._should_stop = False
+
+    @property
+    def overrun_sample_count(self):
+        """Number of samples overwritten before they were taken"""
+        return self._samples.overrun_sample_cnt
+
+    @property
+    def available_sample_count(self):
+        return self._samples.sample_cnt
+
+    def start(self):
+        self._should_stop = False
+        self._thread = threading.Thread(
+            target=self._read, name='LSL inlet reader', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._should_stop = True
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def take(self, block_size=None):
+        """
+        The oldest samples read so far with time along TIME_AXIS and their
+        timestamps. If block_size is None, all the samples are taken.
+        Otherwise as many whole blocks of block_size samples as have been
+        read are taken and the rest is left for the next time; if fewer
+        than block_size samples have been read, empty arrays are returned.
+
+        """
+        with self._lock:
+            available = self._samples.sample_cnt
+            if block_size is None:
+                sample_count = available
+            else:
+                sample_count = available // block_size * block_size
+            data = self._samples.data[:, :sample_count].astype(
+                self._buffer.dtype)  # CHANNELS x TIME
+            timestamps = self._timestamps.data[0, :sample_count].copy()
+            self._samples.consume(sample_count)
+            self._timestamps.consume(sample_count)
+        return (data if TIME_AXIS == 1 else data.T), timestamps
+
+    def _read(self):
+        time_of_the_last_correction = None
+        try:
+            while not self._should_stop:
+                now = lsl.local_clock()
+                if (time_of_the_last_correction is None or
+                        now - time_of_the_last_correction >=
+                        self.SECONDS_BETWEEN_TIME_CORRECTIONS):
+                    self._update_time_correction()
+                    time_of_the_last_correction = now
+
+                _, timestamps = self.inlet.pull_chunk(
+                    max_samples=self._buffer.shape[0], dest_obj=self._buffer)
+                if len(timestamps) == 0:
+                    time.sleep(self.POLL_INTERVAL)
+                    continue
+                chunk = self._buffer[:len(timestamps)]
+                timestamps = np.array(timestamps) + self.time_correction
+                if self._dejitterer is not None:
+                    timestamps = self._dejitterer.dejitter(timestamps)
+                with self._lock:
+                    self._samples.extend(chunk.T)
+                    self._timestamps.extend(timestamps[np.newaxis, :])
+        except Exception as e:
+            self.error = e
+            logger.exception('Error while reading an LSL stream')
+
+    def _update_time_correction(self):
+        try:
+            self.time_correction = self.inlet.time_correction(
+                timeout=self.SECONDS_TO_WAIT_FOR_TIME_CORRECTION)
+        # Older pylsl versions raise their own RuntimeError subclass
+        except (TimeoutError, RuntimeError):
+            logger.debug('Time correction timed out. '
+                         'Using the previous value')
@@ -2,7 +2,7 @@ import numpy as np
 from copy import deepcopy
 from numpy import linalg  # works faster than scipy on anaconda
 from numpy.linalg import norm
-from numba import jit
+from numba import jit, prange
 
 from mne.io.pick import pick_channels_cov
 from mne.cov import compute_whitener
@@ -44,19 +44,41 @@ def stacked_power_iteration(A, n_iter=20, abs_tol=1e-6):
     return sol.flatten('F')
 
 
-@jit(nopython=True, cache=True, fastmath=True)
 def _beam_loop(n_sources, W, G, n_orient, TMP):
-    tmp_prod = np.empty((3 * n_sources, 3))
-    for k in range(n_sources):
+    """
+    Solve n_sources stacked n_orient x n_orient systems
+    (TMP_k G_k) X_k = W_k G_k at once.
+
+    """
+    n_chan = G.shape[0]
+    Gk = G.T.reshape([n_sources, n_orient, n_chan])
+    TMPk = TMP.reshape([n_sources, n_orient, n_chan])
+    Wk = W.reshape([n_sources, n_orient, n_chan])
+    tmp = np.matmul(TMPk, Gk.transpose([0, 2, 1]))
+    tmp_1 = np.matmul(Wk, Gk.transpose([0, 2, 1]))
+    tmp_prod = linalg.solve(tmp, tmp_1)
+    return tmp_prod.reshape([n_sources * n_orient, n_orient])
+
+
+@jit(nopython=True, cache=True, fastmath=True, parallel=True)
+def _beam_loop_parallel(n_sources, W, G, n_orient, TMP):
+    """Same as _beam_loop with sources distributed over all cores"""
+    tmp_prod = np.empty((n_orient * n_sources, n_orient))
+    for k in prange(n_sources):
         Wk = W[n_orient * k: n_orient * k + n_orient, :]
         Gk = G[:, n_orient * k: n_orient * k + n_orient]
         tmp = np.dot(TMP[n_orient * k: n_orient * k + n_orient, :], Gk)
         tmp_1 = np.dot(Wk, Gk)
-        tmp_prod_temp = linalg.solve(tmp, tmp_1)
-        tmp_prod[n_orient * k: n_orient * (k + 1), :] = tmp_prod_temp
+        tmp_prod[n_orient * k: n_orient * (k + 1), :] = linalg.solve(
+            tmp, tmp_1)
     return tmp_prod
 
 
+def _source_power(TMP_or, G_or):
+    """Diagonal of TMP_or.dot(G_or) without computing the whole product"""
+    return np.einsum('ij,ji->i', TMP_or, G_or)
+
+
 def multiply_by_orientations_rowwise(A, m):
     """
     For [3 * m, n] matrix A and [3 * m] vector m
@@ -184,7 +206,7 @@ def _setup_picks(info, forward, data_cov=None, noise_cov=None):
 
 def make_lcmv(info, forward, data_cov, reg=0.05, noise_cov=None, label=None,
               pick_ori=None, rank=None, weight_norm='unit-noise-gain',
-              reduce_rank=False, verbose=None):
+              reduce_rank=False, parallel=False, verbose=None):
     """Compute LCMV spatial filter.
 
     Parameters
@@ -226,6 +248,9 @@ def make_lcmv(info, forward, data_cov, reg=0.05, noise_cov=None, label=None,
         If True, the rank of the leadfield will be reduced by 1 for each
         spatial location. Setting reduce_rank to True is typically necessary
         if you use a single sphere model for MEG.
+    parallel : bool
+        If True, the per-source systems are solved on all cores with numba.
+        See compute_lcmv_weights.
     verbose : bool, str, int, or None
         If not None, override default verbose level (see :func:`mne.verbose`
         and :ref:`Logging documentation <tut_logging>` for more).
@@ -293,9 +318,6 @@ def make_lcmv(info, forward, data_cov, reg=0.05, noise_cov=None, label=None,
         # use either noise floor or regularization parameter d
         noise = max(noise, d)
 
-        # Compute square of Cm_inv used for weight normalization
-        Cm_inv_sq = np.dot(Cm_inv, Cm_inv)
-
     del Cm
 
     # leadfield rank and optional rank reduction
@@ -310,29 +332,95 @@ def make_lcmv(info, forward, data_cov, reg=0.05, noise_cov=None, label=None,
                              ' (got %s).' % reduce_rank)
 
     # Compute spatial filters
-    W = np.dot(G.T, Cm_inv)
     n_orient = 3 if is_free_ori else 1
+    W = compute_lcmv_weights(G, Cm_inv, n_orient, parallel=parallel)
+    is_free_ori = False
+
+    filters = dict(weights=W, data_cov=data_cov, noise_cov=noise_cov,
+                   whitener=whitener, weight_norm=weight_norm,
+                   pick_ori=pick_ori, ch_names=ch_names, proj=proj,
+                   is_ssp=is_ssp, vertices=vertno, is_free_ori=is_free_ori,
+                   nsource=forward['nsource'], src=deepcopy(forward['src']))
+
+    return filters
+
+
+def compute_lcmv_weights(G, Cm_inv, n_orient, parallel=False):
+    """
+    Compute unit-noise-gain max-power LCMV weights.
+
+    Parameters
+    ----------
+    G : np.ndarray
+        Leadfield with SSPs and whitening applied, CHANNELS x SOURCES
+        (times three for free orientation).
+    Cm_inv : np.ndarray
+        Inverse of the regularized data covariance in the same
+        (whitened) sensor space as G.
+    n_orient : int
+        Number of orientations per source.
+    parallel : bool
+        If True, per-source systems are solved by a numba loop running
+        on all cores instead of a single batched numpy solve.
+
+    Returns
+    -------
+    W : np.ndarray
+        SOURCES x CHANNELS weights.
+
+    """
+    Cm_inv_sq = np.dot(Cm_inv, Cm_inv)
+    W = np.dot(G.T, Cm_inv)
     n_sources = G.shape[1] // n_orient
     TMP = np.dot(G.T, Cm_inv_sq)
-    G = np.asfortranarray(G)
-    max_ori = np.empty(n_orient * n_sources, order='F')
-    pwr = np.empty(n_sources, order='F')
 
-    tmp_prod = _beam_loop(n_sources, W, G, n_orient, TMP)
+    if parallel:
+        tmp_prod = _beam_loop_parallel(
+            n_sources, W, np.asfortranarray(G), n_orient, TMP)
+    else:
+        tmp_prod = _beam_loop(n_sources, W, G, n_orient, TMP)
     max_ori = stacked_power_iteration(tmp_prod)
     W = multiply_by_orientations_rowwise(W, max_ori)
     G_or = multiply_by_orientations_columnwise(G, max_ori)
     TMP_or = multiply_by_orientations_rowwise(TMP, max_ori)
-    pwr = np.array([TMP_or[k, :] @ G_or[:, k] for k in range(n_sources)])
+    pwr = _source_power(TMP_or, G_or)
 
     denom = np.sqrt(pwr)
     W /= np.expand_dims(denom, axis=1)
-    is_free_ori = False
+    return W
 
-    filters = dict(weights=W, data_cov=data_cov, noise_cov=noise_cov,
-                   whitener=whitener, weight_norm=weight_norm,
-                   pick_ori=pick_ori, ch_names=ch_names, proj=proj,
-                   is_ssp=is_ssp, vertices=vertno, is_free_ori=is_free_ori,
-                   nsource=forward['nsource'], src=deepcopy(forward['src']))
 
-    return filters
+def prepare_lcmv_input(info, forward, noise_cov=None, label=None,
+                       pick_ori=None, rank=None):
+    """
+    Compute the data-independent part of the LCMV spatial filter.
+
+    Parameters are the same as for make_lcmv.
+
+    Returns
+    -------
+    G : np.ndarray
+        Leadfield restricted to good channels with SSPs and whitening
+        applied.
+    sensor_transform : np.ndarray
+        Matrix taking good channels data to the space of G, i.e.
+        whitener.dot(proj).
+    ch_names : list
+        Names of the good channels in the order used by G.
+    n_orient : int
+        Number of orientations per source.
+
+    """
+    picks = _setup_picks(info, forward, None, noise_cov)
+
+    is_free_ori, ch_names, proj, vertno, G = \
+        _prepare_beamformer_input(info, forward, label, picks, pick_ori)
+
+    sensor_transform = proj
+    if noise_cov is not None:
+        whitener, _ = compute_whitener(noise_cov, info, picks, rank=rank)
+        G = np.dot(whitener, G)
+        sensor_transform = np.dot(whitener, proj)
+
+    n_orient = 3 if is_free_ori else 1
+    return G, sensor_transform, ch_names, n_orient
@@ -70,3 +70,49 @@ def get_a_subset_of_channels(data, channel_indices):
         return data[:, channel_indices]
     elif TIME_AXIS == 1:
         return data[channel_indices, :]
+
+
+def woodbury_update(A_inv: np.ndarray, X: np.ndarray, a: float, b: float):
+    """
+    Compute inverse of (a * A + b * X.dot(X.T)) from A_inv
+    with the Sherman-Morrison-Woodbury identity.
+
+    Parameters
+    ----------
+    A_inv: np.ndarray
+        Inverse of a symmetric N x N matrix A
+    X: np.ndarray
+        N x K update, costs O(N^2 * K) instead of O(N^3) for K < N
+    a: float
+        Positive factor for the old matrix (e.g. forgetting factor)
+    b: float
+        Positive factor for the rank-K update
+
+    """
+    A_inv_X = A_inv.dot(X)
+    capacitance = (a / b) * np.eye(X.shape[1]) + X.T.dot(A_inv_X)
+    new_inv = A_inv - A_inv_X.dot(np.linalg.solve(capacitance, A_inv_X.T))
+    new_inv /= a
+    # Keep the result symmetric so that rounding errors do not accumulate
+    return (new_inv + new_inv.T) / 2
+
+
+def interpolate_in_time(data: np.ndarray, timestamps: np.ndarray,
+                        new_timestamps: np.ndarray):
+    """
+    Linearly interpolate CHANNELS x TIME data sampled at increasing
+    timestamps onto new_timestamps. Outside of the timestamps range the
+    first or the last sample is repeated.
+
+    """
+    if len(timestamps) == 1:
+        return np.repeat(data, len(new_timestamps), axis=1)
+    right = np.clip(np.searchsorted(timestamps, new_timestamps),
+                    1, len(timestamps) - 1)
+    left = right - 1
+    offsets = new_timestamps - timestamps[left]
+    intervals = timestamps[right] - timestamps[left]
+    weights = np.divide(offsets, intervals, out=np.zeros_like(offsets),
+                        where=intervals > 0)
+    weights = np.clip(weights, 0, 1)
+    return data[:, left] * (1 - weights) + data[:, right] * weights
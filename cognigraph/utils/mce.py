@@ -0,0 +1,143 @@
+"""Minimum current estimate (MCE) solvers"""
+import numpy as np
+from scipy.optimize import linprog
+
+from .aux_tools import nostdout
+
+
+def make_mce_equality_matrix(A_non_ori, Q):
+    """
+    Project free-orientation gain onto the source orientations.
+
+    Parameters
+    ----------
+    A_non_ori: np.ndarray
+        COMPONENTS x (3 x SOURCES) reduced gain matrix
+    Q: np.ndarray
+        SOURCES x 3 unit orientations
+
+    Returns
+    -------
+    A_eq: np.ndarray
+        COMPONENTS x SOURCES gain for the fixed orientations Q
+
+    """
+    n_comp = A_non_ori.shape[0]
+    n_src = Q.shape[0]
+    return np.einsum('csi,si->cs', A_non_ori.reshape([n_comp, n_src, 3]), Q)
+
+
+class MCESolver(object):
+    """
+    Minimizes the sum of source amplitudes x subject to A_eq x = b_eq
+    for a batch of b_eq's at once.
+
+    Parameters
+    ----------
+    solver: str
+        'interior-point' solves the linear program with scipy's linprog
+        with x >= 0 for each column of b_eq separately.
+        'irls' runs iteratively reweighted least squares for all
+        columns at once, warm-started from the previous solution.
+        Signs are not constrained so amplitudes are returned as
+        absolute values, which is a different problem from the
+        nonnegative one and gives different estimates. Opt-in only.
+    max_iter: int
+        Maximum number of irls iterations
+    tol: float
+        Relative change in the solution at which irls stops
+    eps: float
+        Regularization of irls weights relative to the largest amplitude
+
+    """
+    SUPPORTED_SOLVERS = ('interior-point', 'irls')
+
+    def __init__(self, A_non_ori, solver='interior-point', max_iter=20,
+                 tol=1e-4, eps=1e-6):
+        if solver not in self.SUPPORTED_SOLVERS:
+            raise ValueError('Solver {} is not supported. Use one of {}'
+                             .format(solver, self.SUPPORTED_SOLVERS))
+        self.A_non_ori = A_non_ori
+        self.solver = solver
+        self.max_iter = max_iter
+        self.tol = tol
+        self.eps = eps
+
+        self._A_eq = None  # type: np.ndarray
+        self._x_prev = None  # type: np.ndarray
+        self.n_iter = None  # type: int
+
+    def set_orientations(self, Q):
+        self._A_eq = make_mce_equality_matrix(self.A_non_ori, Q)
+
+    def reset(self):
+        """Forget the previous solution so that the next one starts cold"""
+        self._x_prev = None
+
+    def solve(self, b_eq):
+        """
+        Parameters
+        ----------
+        b_eq: np.ndarray
+            COMPONENTS x N_SOLVES data
+
+        Returns
+        -------
+        x: np.ndarray
+            SOURCES x N_SOLVES nonnegative amplitudes
+
+        """
+        if self.solver == 'interior-point':
+            return self._solve_interior_point(b_eq)
+        elif self.solver == 'irls':
+            return self._solve_irls(b_eq)
+
+    def _solve_interior_point(self, b_eq):
+        A_eq = self._A_eq
+        c = np.ones(A_eq.shape[1])
+        x = np.empty([A_eq.shape[1], b_eq.shape[1]])
+        for i in range(b_eq.shape[1]):
+            with nostdout():
+                sol = linprog(c, A_eq=A_eq, b_eq=b_eq[:, i],
+                              method='interior-point', bounds=(0, None),
+                              options={'disp': False})
+            x[:, i] = sol.x
+        self.n_iter = 1
+        return x
+
+    def _solve_irls(self, b_eq):
+        A_eq = self._A_eq
+        n_solves = b_eq.shape[1]
+
+        if self._x_prev is not None:
+            # Start from the last solution of the previous batch
+            x = np.repeat(self._x_prev[:, -1:], n_solves, axis=1)
+        else:
+            # Start from the minimum-norm solution
+            x = None
+
+        for self.n_iter in range(1, self.max_iter + 1):
+            if x is None:
+                weights = np.ones([n_solves, A_eq.shape[1]])
+            else:
+                weights = np.abs(x.T)
+                weights += (self.eps * weights.max(axis=1, keepdims=True) +
+                            np.finfo(weights.dtype).eps)
+
+            # x = W A^T (A W A^T)^-1 b for each of the stacked weights
+            AW = A_eq[np.newaxis, :, :] * weights[:, np.newaxis, :]
+            AWA = np.matmul(AW, A_eq.T)
+            y = np.linalg.solve(AWA, b_eq.T[:, :, np.newaxis])
+            x_new = np.matmul(AW.transpose([0, 2, 1]), y)[:, :, 0].T
+
+            if x is not None:
+                change = (np.linalg.norm(x_new - x, axis=0) /
+                          np.linalg.norm(x_new, axis=0))
+                x = x_new
+                if np.all(change < self.tol):
+                    break
+            else:
+                x = x_new
+
+        self._x_prev = x
+        return np.abs(x)
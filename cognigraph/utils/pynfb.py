@@ -1,5 +1,8 @@
+from math import gcd
+
 import numpy as np
-from scipy.signal import lfilter
+from numba import jit
+from scipy.signal import lfilter, firwin, butter, fftconvolve
 
 from vendor.nfb.pynfb.signal_processing.filters import BaseFilter
 
@@ -19,6 +22,31 @@ def pynfb_ndarray_function_wrapper(pynfb_function):
     return wrapped
 
 
+# Attributes that hold what the streaming filters remember of the past
+FILTER_STATE_ATTRIBUTES = ('zi', 'z', '_history', '_n_inputs', '_n_outputs')
+
+
+def get_filter_state(pynfb_filter) -> dict:
+    """Copies of the state attributes of a streaming filter"""
+    return {name: np.copy(getattr(pynfb_filter, name))
+            for name in FILTER_STATE_ATTRIBUTES
+            if hasattr(pynfb_filter, name)}
+
+
+def set_filter_state(pynfb_filter, state: dict):
+    """Restore the state returned by get_filter_state"""
+    for name, value in state.items():
+        current_value = getattr(pynfb_filter, name)
+        if np.shape(current_value) != np.shape(value):
+            raise ValueError(
+                'Saved {} of shape {} does not fit the filter: {}'.format(
+                    name, np.shape(value), np.shape(current_value)))
+        if isinstance(current_value, np.ndarray):
+            setattr(pynfb_filter, name, np.array(value))
+        else:
+            setattr(pynfb_filter, name, type(current_value)(value))
+
+
 class ExponentialMatrixSmoother(BaseFilter):
     def __init__(self, factor, column_count):
         self.a = [1, -factor]
@@ -33,3 +61,178 @@ class ExponentialMatrixSmoother(BaseFilter):
     def reset(self):
         self.zi = np.zeros([max(len(self.a), len(self.b)) - 1,
                             self.column_count])
+
+
+class StreamingResampler(BaseFilter):
+    """
+    Polyphase FIR resampler by a rational factor up / down that keeps
+    its state between chunks, so that a chunked signal is resampled
+    exactly as the whole one would be by scipy.signal.upfirdn.
+    Any number of samples can be passed to apply.
+
+    The antialiasing filter is designed as in scipy.signal.resample_poly
+    and delays the output by half its length.
+
+    """
+    def __init__(self, up, down, n_channels):
+        greatest_common_divisor = gcd(up, down)
+        self.up = up // greatest_common_divisor
+        self.down = down // greatest_common_divisor
+        self.n_channels = n_channels
+
+        max_rate = max(self.up, self.down)
+        if max_rate == 1:
+            h = np.ones(1)
+        else:
+            half_len = 10 * max_rate
+            h = firwin(2 * half_len + 1, 1 / max_rate,
+                       window=('kaiser', 5.0)) * self.up
+
+        # self._phases[p, j] = h[p + j * up]
+        self._n_taps = -(-len(h) // self.up)
+        h = np.r_[h, np.zeros(self._n_taps * self.up - len(h))]
+        self._phases = h.reshape([self._n_taps, self.up]).T
+        self.reset()
+
+    def apply(self, chunk: np.ndarray):
+        # x[0] is the input sample number self._n_inputs - self._n_taps + 1
+        x = np.concatenate([self._history, chunk])
+        n_inputs = self._n_inputs + chunk.shape[0]
+
+        # Output sample n is computed as soon as input sample
+        # n * down // up is available
+        n_outputs = -(-n_inputs * self.up // self.down)
+        n = np.arange(self._n_outputs, n_outputs)
+        newest = n * self.down // self.up - self._n_inputs + self._n_taps - 1
+        phase = n * self.down % self.up
+
+        y = np.zeros([len(n), self.n_channels])
+        for j in range(self._n_taps):
+            y += self._phases[phase, j][:, np.newaxis] * x[newest - j]
+
+        self._history = x[len(x) - self._n_taps + 1:]
+        self._n_inputs = n_inputs
+        self._n_outputs = n_outputs
+        return y
+
+    def reset(self):
+        self._history = np.zeros([self._n_taps - 1, self.n_channels])
+        self._n_inputs = 0
+        self._n_outputs = 0
+
+
+@jit(nopython=True, cache=True)
+def _sos_filter_bank_loop(sos, x, z):
+    """
+    Direct form II transposed cascades of sos[band] sections for all bands
+    reading each sample of x once; z is the state, modified in place.
+
+    """
+    n_times, n_channels = x.shape
+    n_bands, n_sections = sos.shape[:2]
+    y = np.empty((n_times, n_bands, n_channels))
+    v = np.empty(n_channels)
+    for t in range(n_times):
+        for b in range(n_bands):
+            v[:] = x[t]
+            for s in range(n_sections):
+                b0, b1, b2, _, a1, a2 = sos[b, s]
+                for c in range(n_channels):
+                    out = b0 * v[c] + z[b, s, 0, c]
+                    z[b, s, 0, c] = b1 * v[c] - a1 * out + z[b, s, 1, c]
+                    z[b, s, 1, c] = b2 * v[c] - a2 * out
+                    v[c] = out
+            y[t, b] = v
+    return y
+
+
+class SOSFilterBank(BaseFilter):
+    """
+    Butterworth filters for several bands applied in a single pass.
+
+    Bands are (low, high) tuples; None in place of either cutoff makes
+    a highpass or a lowpass filter. Output of apply is time x
+    (bands x channels) with the channels of each band grouped together.
+
+    """
+    # Section that passes the signal as is
+    IDENTITY_SECTION = (1, 0, 0, 1, 0, 0)
+
+    def __init__(self, bands, fs, n_channels, order=4):
+        self.n_channels = n_channels
+        sos_list = [self._design_sos(band, fs, order) for band in bands]
+        n_sections = max(len(sos) for sos in sos_list)
+        self.sos = np.array([
+            np.concatenate([sos, np.tile(self.IDENTITY_SECTION,
+                                         (n_sections - len(sos), 1))])
+            for sos in sos_list])
+        self.reset()
+
+    @staticmethod
+    def _design_sos(band, fs, order):
+        low, high = band
+        nyquist = fs / 2
+        if low is None:
+            return butter(order, high / nyquist, btype='lowpass',
+                          output='sos')
+        elif high is None:
+            return butter(order, low / nyquist, btype='highpass',
+                          output='sos')
+        else:
+            return butter(order, (low / nyquist, high / nyquist),
+                          btype='bandpass', output='sos')
+
+    def apply(self, chunk: np.ndarray):
+        y = _sos_filter_bank_loop(
+            self.sos, np.ascontiguousarray(chunk, dtype=np.float64), self.z)
+        n_bands = self.sos.shape[0]
+        return y.reshape([chunk.shape[0], n_bands * self.n_channels])
+
+    def reset(self):
+        n_bands, n_sections = self.sos.shape[:2]
+        self.z = np.zeros([n_bands, n_sections, 2, self.n_channels])
+
+
+class StreamingHilbert(BaseFilter):
+    """
+    Analytic signal computed with an FIR Hilbert transformer that keeps
+    its state between chunks, so the result does not depend on how the
+    signal is chunked.
+
+    The transformer is the ideal one truncated to n_taps with a Hamming
+    window. Its gain is within 0.3% of one for frequencies between
+    4 * fs / n_taps and fs / 2 minus that; use n_taps_for to choose
+    n_taps. The output lags the input by (n_taps - 1) / 2 samples.
+
+    """
+    def __init__(self, n_channels, n_taps=101):
+        self.n_channels = n_channels
+        # Odd length makes the delay a whole number of samples
+        self.n_taps = n_taps + 1 - n_taps % 2
+        self.delay = self.n_taps // 2
+
+        n = np.arange(self.n_taps) - self.delay
+        self.h = np.zeros(self.n_taps)
+        is_odd = n % 2 == 1
+        self.h[is_odd] = 2 / (np.pi * n[is_odd])
+        self.h *= np.hamming(self.n_taps)
+        self.reset()
+
+    @staticmethod
+    def n_taps_for(fs, lowest_frequency):
+        """Number of taps that keeps the gain at lowest_frequency"""
+        return int(np.ceil(4 * fs / lowest_frequency))
+
+    def apply(self, chunk: np.ndarray):
+        x = np.concatenate([self._history, chunk])
+        n_times = chunk.shape[0]
+        self._history = x[n_times:]
+        if n_times == 0:
+            return np.zeros([0, self.n_channels], dtype=np.complex128)
+        # Real part is the delayed input, imaginary part is its transform
+        y = 1j * fftconvolve(x, self.h[:, np.newaxis], mode='valid', axes=0)
+        y.real = x[self.delay:self.delay + n_times]
+        return y
+
+    def reset(self):
+        self._history = np.zeros([self.n_taps - 1, self.n_channels])
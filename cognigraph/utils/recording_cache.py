@@ -0,0 +1,114 @@
+"""On-disk cache of decoded recordings"""
+import os
+import json
+import logging
+from hashlib import md5
+
+import mne
+import numpy as np
+
+from .. import COGNIGRAPH_CACHE
+
+logger = logging.getLogger(__name__)
+
+
+class RecordingCache(object):
+    """
+    Stores the decoded data of recordings as .npy files that are opened as
+    memory maps and their mne_info as fif files.
+
+    An entry is found by the absolute path of the recording and is valid
+    as long as the modification time and the size of the recording stay the
+    same. Stale entries are removed on lookup.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Directory for the cache files; created when needed
+
+    """
+    # Number of samples copied to the cache at a time
+    BLOCK_SAMPLE_COUNT = 100000
+
+    def __init__(self, cache_dir=COGNIGRAPH_CACHE):
+        self.cache_dir = cache_dir
+
+    def _get_entry_paths(self, file_path):
+        key = md5(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+        prefix = os.path.join(self.cache_dir, key)
+        return {'data': prefix + '.npy', 'info': prefix + '-info.fif',
+                'meta': prefix + '.json'}
+
+    @staticmethod
+    def _get_file_stats(file_path):
+        stat = os.stat(file_path)
+        return {'file_path': os.path.abspath(file_path),
+                'mtime': stat.st_mtime, 'size': stat.st_size}
+
+    def load(self, file_path, time_axis):
+        """
+        Returns
+        -------
+        data: np.memmap | None
+            Memory-mapped data with time along time_axis
+            or None if there is no valid entry
+        mne_info: mne.Info | None
+
+        """
+        paths = self._get_entry_paths(file_path)
+        try:
+            with open(paths['meta']) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None, None
+
+        if meta != self._get_file_stats(file_path):
+            logger.info('Recording {} has changed. Removing its cache'
+                        .format(file_path))
+            self.remove(file_path)
+            return None, None
+
+        # Copy-on-write so that nodes modifying their input in place do not
+        # touch the cache
+        data = np.load(paths['data'], mmap_mode='c')  # CHANNELS x TIME
+        mne_info = mne.io.read_info(paths['info'], verbose='ERROR')
+        return (data if time_axis == 1 else data.T), mne_info
+
+    def save(self, file_path, data, mne_info, time_axis):
+        """
+        Cache data of a recording. data can be anything that supports
+        slicing along the time axis, e.g. LazyRawData; it is copied
+        block by block.
+
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        paths = self._get_entry_paths(file_path)
+        self.remove(file_path)
+
+        # Shapes of lazy data may hold numpy integers which the npy header
+        # cannot store
+        shape = tuple(int(n) for n in data.shape)
+        data_to_save = np.lib.format.open_memmap(
+            paths['data'], mode='w+', dtype=data.dtype,
+            shape=shape if time_axis == 1 else shape[::-1])
+        n_times = data.shape[time_axis]
+        for start in range(0, n_times, self.BLOCK_SAMPLE_COUNT):
+            stop = min(start + self.BLOCK_SAMPLE_COUNT, n_times)
+            if time_axis != 1:
+                data_to_save[:, start:stop] = data[start:stop].T
+            else:
+                data_to_save[:, start:stop] = data[:, start:stop]
+        data_to_save.flush()
+        del data_to_save
+
+        mne.io.write_info(paths['info'], mne_info)
+        # The entry becomes valid only once everything has been written
+        with open(paths['meta'], 'w') as meta_file:
+            json.dump(self._get_file_stats(file_path), meta_file)
+
+    def remove(self, file_path):
+        paths = self._get_entry_paths(file_path)
+        # Invalidate the entry first
+        for kind in ('meta', 'data', 'info'):
+            if os.path.exists(paths[kind]):
+                os.remove(paths[kind])
@@ -83,10 +83,18 @@ class RingBuffer(object):
         self._data = np.zeros((row_cnt, maxlen * 2))
         self._start = 0
         self._curr_samp_count = 0
+        # Number of samples overwritten before they were consumed
+        self.overrun_sample_cnt = 0
+
+    @property
+    def sample_cnt(self):
+        return self._curr_samp_count
 
     def extend(self, array):
         self._check_input_shape(array)
         new_sample_cnt = array.shape[self.TIME_AXIS]
+        self.overrun_sample_cnt += max(
+            self._curr_samp_count + new_sample_cnt - self.maxlen, 0)
 
         # If new data will take all the space, we can forget about the old data
         if new_sample_cnt >= self.maxlen:
@@ -129,6 +137,12 @@ class RingBuffer(object):
         self._curr_samp_count = 0
         self._start = 0
 
+    def consume(self, sample_cnt):
+        """Forget the sample_cnt oldest samples"""
+        sample_cnt = min(sample_cnt, self._curr_samp_count)
+        self._start = (self._start + sample_cnt) % self.maxlen
+        self._curr_samp_count -= sample_cnt
+
     @property
     def data(self):
         return self._data[:, self._start:(self._start + self._curr_samp_count)]
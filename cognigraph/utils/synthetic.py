@@ -0,0 +1,162 @@
+"""Deterministic synthetic signals for benchmarks and load tests"""
+import time
+import threading
+
+import numpy as np
+import mne
+import pylsl as lsl
+from mne.io.pick import channel_type
+
+from .. import TIME_AXIS, DTYPE
+from .lsl import create_lsl_outlet, copy_numpy_array_to_lsl_buffer
+
+
+def create_synthetic_info(n_channels, sfreq, ch_type='eeg'):
+    ch_names = ['Ch{}'.format(i + 1) for i in range(n_channels)]
+    return mne.create_info(ch_names, sfreq, ch_types=ch_type)
+
+
+def read_fixed_orientation_gain(forward_model_path, sfreq):
+    """
+    Gain matrix of the forward model with dipoles oriented normally to
+    the cortex and mne_info with the channels of the forward model
+
+    Returns
+    -------
+    gain: np.ndarray
+        CHANNELS x SOURCES
+    mne_info: mne.Info
+
+    """
+    forward = mne.read_forward_solution(forward_model_path, verbose='ERROR')
+    forward = mne.convert_forward_solution(
+        forward, surf_ori=True, force_fixed=True, use_cps=True,
+        verbose='ERROR')
+    fwd_info = forward['info']
+    ch_types = [channel_type(fwd_info, i) for i in range(fwd_info['nchan'])]
+    mne_info = mne.create_info(fwd_info['ch_names'], sfreq, ch_types=ch_types)
+    return forward['sol']['data'], mne_info
+
+
+class SyntheticSignalGenerator(object):
+    """
+    Generates sensor data: activity of a few dipoles oscillating at random
+    frequencies projected onto the sensors, plus white sensor noise.
+
+    Everything random is drawn from a RandomState seeded with seed, so
+    that the data depend only on the parameters and not on how they are
+    split into chunks.
+
+    Parameters
+    ----------
+    n_channels: int
+        Ignored if gain is given
+    sfreq: float
+    gain: np.ndarray | None
+        CHANNELS x SOURCES gain matrix from a forward model. The dipoles
+        are picked from its columns at random. If None, the dipoles are
+        mixed into the channels with random weights.
+    n_dipoles: int
+    dipole_frequency_range: tuple of float
+        Range of the dipole frequencies in Hz
+    dipole_amplitude: float
+        Root mean square over the channels of the topography of each dipole
+        multiplied by the amplitude of its oscillation
+    noise_std: float
+        Standard deviation of the sensor noise
+    seed: int
+
+    """
+    def __init__(self, n_channels, sfreq, gain=None, n_dipoles=2,
+                 dipole_frequency_range=(8, 12), dipole_amplitude=1,
+                 noise_std=1, seed=0):
+        self.sfreq = sfreq
+        self.noise_std = noise_std
+        self._random_state = np.random.RandomState(seed)
+
+        if gain is None:
+            self.dipole_indices = None
+            topographies = self._random_state.randn(n_channels, n_dipoles)
+        else:
+            self.dipole_indices = self._random_state.choice(
+                gain.shape[1], n_dipoles, replace=False)
+            topographies = gain[:, self.dipole_indices]
+        # Only the shapes of the topographies matter
+        topographies = topographies / np.sqrt(
+            np.mean(topographies ** 2, axis=0))
+        self.mixing_matrix = dipole_amplitude * topographies
+        self.n_channels = self.mixing_matrix.shape[0]
+
+        self.frequencies = self._random_state.uniform(
+            *dipole_frequency_range, size=n_dipoles)
+        self.phases = self._random_state.uniform(0, 2 * np.pi, size=n_dipoles)
+        self.samples_generated = 0
+
+    def generate(self, n_samples):
+        """The next n_samples samples with time along TIME_AXIS"""
+        times = (self.samples_generated + np.arange(n_samples)) / self.sfreq
+        self.samples_generated += n_samples
+
+        activity = np.sin(2 * np.pi * self.frequencies[:, np.newaxis] * times +
+                          self.phases[:, np.newaxis])  # DIPOLES x TIME
+        # Drawn time-major so that the noise does not depend on the chunking
+        noise = self._random_state.randn(n_samples, self.n_channels).T
+        data = self.mixing_matrix.dot(activity) + self.noise_std * noise
+        return (data if TIME_AXIS == 1 else data.T).astype(DTYPE)
+
+
+class SyntheticLSLStream(object):
+    """
+    Pushes the data of a SyntheticSignalGenerator to an LSL outlet in
+    chunks of chunk_size samples from a background thread, speed times
+    faster than real time.
+
+    Parameters
+    ----------
+    name: str
+        Name of the stream
+    generator: SyntheticSignalGenerator
+    mne_info: mne.Info
+        Channel names and types for the stream description
+    chunk_size: int
+    speed: float
+
+    """
+    def __init__(self, name, generator, mne_info, chunk_size=10, speed=1):
+        self.generator = generator
+        self.chunk_size = chunk_size
+        self.speed = speed
+        ch_types = [channel_type(mne_info, i)
+                    for i in range(mne_info['nchan'])]
+        self.outlet = create_lsl_outlet(
+            name=name, type='EEG', frequency=generator.sfreq,
+            channel_format=lsl.cf_float32,
+            channel_labels=mne_info['ch_names'], channel_types=ch_types)
+        self._buffer = np.empty((chunk_size, generator.n_channels),
+                                dtype=np.float32)
+        self._thread = None  # type: threading.Thread
+        self._should_stop = False
+
+    def start(self):
+        self._should_stop = False
+        self._thread = threading.Thread(
+            target=self._push, name='Synthetic LSL stream', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._should_stop = True
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _push(self):
+        seconds_per_chunk = (self.chunk_size / self.generator.sfreq /
+                             self.speed)
+        # Chunks are due on a fixed schedule so that sleeping inaccurately
+        # does not make the stream drift
+        next_push_time = lsl.local_clock()
+        while not self._should_stop:
+            chunk = self.generator.generate(self.chunk_size)
+            self.outlet.push_chunk(
+                copy_numpy_array_to_lsl_buffer(chunk, self._buffer))
+            next_push_time += seconds_per_chunk
+            time.sleep(max(next_push_time - lsl.local_clock(), 0))
@@ -0,0 +1,51 @@
+"""
+Compare per-chunk latency of InverseModel with and without
+the precomputed inverse kernel.
+
+Usage: python scripts/benchmark_inverse_model.py [n_samples_in_chunk]
+
+"""
+import sys
+import timeit
+
+import numpy as np
+from mne.io import Raw
+
+from cognigraph.nodes.processors import InverseModel
+from cognigraph.nodes.sources import FileSource
+from cognigraph.utils.io import DataDownloader
+
+
+N_REPEATS = 50
+
+n_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+dloader = DataDownloader()
+raw = Raw(dloader.get_file('Koleno_raw.fif'), preload=True, verbose='ERROR')
+raw.set_eeg_reference('average', projection=True)
+info = raw.info
+fwd_model_path = dloader.get_file('dmalt_custom_lr.fif')
+
+source = FileSource()
+source.mne_info = info
+source.output = np.random.rand(info['nchan'], n_samples)
+
+timings = {}
+outputs = {}
+for precompute_kernel in (False, True):
+    inverse = InverseModel(forward_model_path=fwd_model_path,
+                           precompute_kernel=precompute_kernel)
+    inverse.parent = source
+    inverse.initialize()
+    inverse.update()
+    outputs[precompute_kernel] = inverse.output
+    timings[precompute_kernel] = timeit.timeit(
+        inverse.update, number=N_REPEATS) / N_REPEATS
+
+print('Chunk: {} channels x {} samples, {} vertices'.format(
+    info['nchan'], n_samples, outputs[True].shape[0]))
+print('apply_inverse_raw: {:.2f} ms per chunk'.format(timings[False] * 1000))
+print('precomputed kernel: {:.2f} ms per chunk'.format(timings[True] * 1000))
+print('speedup: {:.1f}x'.format(timings[False] / timings[True]))
+print('max abs difference: {:.2e}'.format(
+    np.max(np.abs(outputs[True] - outputs[False]))))
@@ -0,0 +1,49 @@
+"""
+Time LCMV weights computation for oct-6 and ico-4 sized source spaces:
+batched numpy solve vs numba parallel loop over 1..all cores.
+
+The cost only depends on the leadfield shape, so a random free-orientation
+leadfield of the source space size is used.
+
+Usage: python scripts/benchmark_lcmv_weights.py [n_channels]
+
+"""
+import sys
+import timeit
+
+import numba
+import numpy as np
+
+from cognigraph.utils.make_lcmv import compute_lcmv_weights
+
+
+N_REPEATS = 5
+SOURCE_SPACES = {'oct-6': 8196, 'ico-4': 5124}
+
+n_channels = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+max_threads = numba.config.NUMBA_NUM_THREADS
+thread_counts = sorted(set([1, 2, 4, 8, max_threads]))
+thread_counts = [n for n in thread_counts if n <= max_threads]
+
+Cm = np.random.randn(n_channels, n_channels)
+Cm = Cm.dot(Cm.T) + np.eye(n_channels)
+Cm_inv = np.linalg.inv(Cm)
+
+for spacing, n_sources in SOURCE_SPACES.items():
+    G = np.random.randn(n_channels, 3 * n_sources)
+    compute_lcmv_weights(G, Cm_inv, 3, parallel=True)  # jit compilation
+
+    print('{}: {} channels x {} sources'.format(
+        spacing, n_channels, n_sources))
+    numpy_time = timeit.timeit(
+        lambda: compute_lcmv_weights(G, Cm_inv, 3),
+        number=N_REPEATS) / N_REPEATS
+    print('  batched numpy: {:.1f} ms'.format(numpy_time * 1000))
+    for n_threads in thread_counts:
+        numba.set_num_threads(n_threads)
+        numba_time = timeit.timeit(
+            lambda: compute_lcmv_weights(G, Cm_inv, 3, parallel=True),
+            number=N_REPEATS) / N_REPEATS
+        print('  numba, {} threads: {:.1f} ms'.format(
+            n_threads, numba_time * 1000))
+    numba.set_num_threads(max_threads)
@@ -0,0 +1,67 @@
+"""
+Time pulling an LSL stream of 256 channels at 2 kHz: python lists converted
+with convert_lsl_chunk_to_numpy_array vs pulling into a preallocated buffer.
+
+A local outlet pushes 1 s of data (2000 samples), which is then pulled in
+chunks of at most 1024 samples as LSLStreamSource does.
+
+Usage: python scripts/benchmark_lsl_inlet.py [n_channels] [sfreq]
+
+"""
+import sys
+import time
+
+import numpy as np
+import pylsl as lsl
+
+from cognigraph import DTYPE
+from cognigraph.utils.lsl import (create_lsl_outlet,
+                                  convert_lsl_chunk_to_numpy_array,
+                                  pull_lsl_chunk_into_buffer)
+
+
+N_REPEATS = 20
+MAX_SAMPLES_IN_CHUNK = 1024
+
+n_channels = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+sfreq = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+outlet = create_lsl_outlet(
+    name='cognigraph-benchmark-stream', frequency=sfreq,
+    channel_format=lsl.cf_float32,
+    channel_labels=['ch{}'.format(i) for i in range(n_channels)],
+    channel_types=['eeg'] * n_channels)
+inlet = lsl.StreamInlet(lsl.resolve_byprop(
+    'name', 'cognigraph-benchmark-stream', timeout=5)[0])
+inlet.open_stream()
+data = np.random.randn(sfreq, n_channels).astype(np.float32)
+buffer = np.empty((MAX_SAMPLES_IN_CHUNK, n_channels), dtype=np.float32)
+
+
+def pull_as_lists():
+    lsl_chunk, timestamps = inlet.pull_chunk(max_samples=MAX_SAMPLES_IN_CHUNK)
+    return convert_lsl_chunk_to_numpy_array(lsl_chunk, dtype=DTYPE)
+
+
+def pull_into_buffer():
+    chunk, timestamps = pull_lsl_chunk_into_buffer(inlet, buffer)
+    return chunk
+
+
+def time_one_second_of_data(pull):
+    outlet.push_chunk(data)
+    time.sleep(0.1)  # let the samples reach the inlet
+    samples_pulled = 0
+    t1 = time.perf_counter()
+    while samples_pulled < sfreq:
+        samples_pulled += pull().shape[1]
+    return time.perf_counter() - t1
+
+
+print('{} channels at {} Hz, pull time for 1 s of data:'.format(
+    n_channels, sfreq))
+for name, pull in (('lists', pull_as_lists),
+                   ('preallocated buffer', pull_into_buffer)):
+    time_one_second_of_data(pull)  # warm-up
+    durations = [time_one_second_of_data(pull) for _ in range(N_REPEATS)]
+    print('  {}: {:.2f} ms'.format(name, np.median(durations) * 1000))
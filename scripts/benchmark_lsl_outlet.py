@@ -0,0 +1,49 @@
+"""
+Time pushing source-space chunks to an LSL outlet: python lists from
+convert_numpy_array_to_lsl_chunk vs a reused time-major numpy buffer.
+
+Payloads have as many channels as there are vertices in the usual
+source spaces.
+
+Usage: python scripts/benchmark_lsl_outlet.py [samples_in_chunk]
+
+"""
+import sys
+import timeit
+
+import numpy as np
+import pylsl as lsl
+
+from cognigraph.utils.lsl import (create_lsl_outlet,
+                                  convert_numpy_array_to_lsl_chunk,
+                                  copy_numpy_array_to_lsl_buffer)
+
+
+N_REPEATS = 20
+SOURCE_SPACES = {'ico-4': 5124, 'oct-6': 8196, 'ico-5': 20484}
+
+samples_in_chunk = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+for spacing, n_vertices in SOURCE_SPACES.items():
+    outlet = create_lsl_outlet(
+        name='cognigraph-benchmark-{}'.format(spacing), frequency=500,
+        channel_format=lsl.cf_float32,
+        channel_labels=['v{}'.format(i) for i in range(n_vertices)],
+        channel_types=['misc'] * n_vertices)
+    # VERTICES x TIME as the nodes output it
+    chunk = np.random.randn(n_vertices, samples_in_chunk)
+    buffer = np.empty((samples_in_chunk, n_vertices), dtype=np.float32)
+
+    def push_lists(outlet=outlet):
+        outlet.push_chunk(convert_numpy_array_to_lsl_chunk(chunk))
+
+    def push_buffer(outlet=outlet):
+        outlet.push_chunk(copy_numpy_array_to_lsl_buffer(chunk, buffer))
+
+    print('{}: {} vertices x {} samples'.format(
+        spacing, n_vertices, samples_in_chunk))
+    for name, push in (('lists', push_lists), ('numpy buffer', push_buffer)):
+        push()  # warm-up
+        duration = timeit.timeit(push, number=N_REPEATS) / N_REPEATS
+        print('  {}: {:.2f} ms'.format(name, duration * 1000))
+    del outlet, push_lists, push_buffer
@@ -0,0 +1,57 @@
+"""
+Measure MCE solver throughput in solves per second for the interior-point
+linear program and warm-started irls over a range of batch sizes.
+
+Usage: python scripts/benchmark_mce.py [n_samples_in_chunk]
+
+"""
+import sys
+import time
+
+import numpy as np
+from mne.io import Raw
+
+from cognigraph.nodes.processors import MCE
+from cognigraph.nodes.sources import FileSource
+from cognigraph.utils.mce import MCESolver
+from cognigraph.utils.io import DataDownloader
+
+
+DURATION = 5  # seconds per configuration
+
+n_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+dloader = DataDownloader()
+raw = Raw(dloader.get_file('Koleno_raw.fif'), preload=True, verbose='ERROR')
+raw.set_eeg_reference('average', projection=True)
+info = raw.info
+fwd_model_path = dloader.get_file('dmalt_custom_lr.fif')
+data = raw.get_data()
+
+source = FileSource()
+source.mne_info = info
+
+print('Chunk: {} channels x {} samples'.format(info['nchan'], n_samples))
+for solver in MCESolver.SUPPORTED_SOLVERS:
+    for samples_per_solve in (None, 5, 1):
+        mce = MCE(forward_model_path=fwd_model_path, solver=solver,
+                  samples_per_solve=samples_per_solve)
+        mce.parent = source
+        mce.initialize()
+        solves_per_chunk = int(np.ceil(n_samples / (samples_per_solve or
+                                                    n_samples)))
+
+        chunk_count = 0
+        start = 0
+        t1 = time.time()
+        while time.time() - t1 < DURATION:
+            source.output = data[:, start: start + n_samples]
+            start = (start + n_samples) % (data.shape[1] - n_samples)
+            mce.update()
+            chunk_count += 1
+        elapsed = time.time() - t1
+
+        print('{}, samples_per_solve={}: {:.1f} solves/s, {:.1f} chunks/s'
+              .format(solver, samples_per_solve,
+                      chunk_count * solves_per_chunk / elapsed,
+                      chunk_count / elapsed))
@@ -0,0 +1,42 @@
+"""
+Drive a SyntheticSource -> LinearFilter -> EnvelopeExtractor pipeline
+faster than real time and print the latency report of its nodes.
+
+Usage: python scripts/benchmark_synthetic_pipeline.py [n_channels] [speed]
+                                                      [seconds]
+
+"""
+import sys
+import time
+
+from cognigraph import TIME_AXIS
+from cognigraph.pipeline import Pipeline
+from cognigraph.nodes.sources import SyntheticSource
+from cognigraph.nodes.processors import LinearFilter, EnvelopeExtractor
+
+
+n_channels = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+speed = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+pipeline = Pipeline()
+pipeline.source = SyntheticSource(
+    n_channels=n_channels, sfreq=1000,
+    replay_mode=SyntheticSource.REPLAY_MODES.ACCELERATED, speed=speed)
+pipeline.add_processor(LinearFilter(lower_cutoff=8, upper_cutoff=12))
+pipeline.add_processor(EnvelopeExtractor())
+pipeline.initialize_all_nodes()
+
+samples_produced = 0
+t1 = time.time()
+while time.time() - t1 < seconds:
+    pipeline.update_all_nodes()
+    if pipeline.source.output is not None:
+        samples_produced += pipeline.source.output.shape[TIME_AXIS]
+print('{} channels at {}x real time: {} samples in {} s'.format(
+    n_channels, speed, samples_produced, seconds))
+for node_name, report in pipeline.latency_report().items():
+    print('  {}:'.format(node_name))
+    for tracker_name, stats in report.items():
+        print('    {}: {}'.format(tracker_name, ', '.join(
+            '{} {:.2f}'.format(key, value) for key, value in stats.items())))
@@ -126,6 +126,7 @@ def main():
         thread.wait(100)
         app.processEvents()
         thread.quit()
+        pipeline.stop_all_nodes()
         try:
             logger.info('Deleting main window ...')
             window.deleteLater()